@@ -6,9 +6,11 @@ import { AIAgentConfig } from '@wardline/types';
 export class VoiceOrchestratorClient {
     private readonly logger = new Logger(VoiceOrchestratorClient.name);
     private readonly orchestratorUrl: string;
+    private readonly internalToken: string;
 
     constructor(private readonly configService: ConfigService) {
         this.orchestratorUrl = this.configService.get<string>('VOICE_ORCHESTRATOR_URL') || 'http://localhost:3002';
+        this.internalToken = this.configService.get<string>('ORCHESTRATOR_INTERNAL_TOKEN') || '';
     }
 
     /**
@@ -257,4 +259,31 @@ export class VoiceOrchestratorClient {
             throw error;
         }
     }
+
+    /**
+     * Tell the orchestrator a hospital's call config changed so it refetches
+     * its snapshot. Best effort: failures are logged and never thrown, since
+     * the orchestrator also refreshes snapshots once they reach a maximum age.
+     */
+    async notifyConfigChanged(hospitalId: string, workflowId?: string): Promise<void> {
+        if (!this.internalToken) {
+            return;
+        }
+        try {
+            const response = await fetch(`${this.orchestratorUrl}/internal/config-changed`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    Authorization: `Bearer ${this.internalToken}`,
+                },
+                body: JSON.stringify({ hospitalId, workflowId }),
+            });
+
+            if (!response.ok) {
+                throw new Error(`Failed to push config change: ${response.statusText}`);
+            }
+        } catch (error: any) {
+            this.logger.warn(`Error pushing config change for hospital ${hospitalId}: ${error.message}`);
+        }
+    }
 }
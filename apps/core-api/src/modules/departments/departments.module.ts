@@ -1,8 +1,10 @@
 import { Module } from '@nestjs/common';
 import { DepartmentsService } from './departments.service';
 import { DepartmentsController } from './departments.controller';
+import { CallsModule } from '../calls/calls.module';
 
 @Module({
+    imports: [CallsModule],
     controllers: [DepartmentsController],
     providers: [DepartmentsService],
     exports: [DepartmentsService],
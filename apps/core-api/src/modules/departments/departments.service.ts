@@ -7,12 +7,16 @@ import {
     UpdateDirectoryInquiryDto,
 } from './dto/department.dto';
 import { Logger } from '@wardline/utils';
+import { VoiceOrchestratorClient } from '../calls/clients/voice-orchestrator.client';
 
 @Injectable()
 export class DepartmentsService {
     private readonly logger = new Logger(DepartmentsService.name);
 
-    constructor(private prisma: PrismaService) { }
+    constructor(
+        private prisma: PrismaService,
+        private orchestrator: VoiceOrchestratorClient,
+    ) { }
 
     // Department CRUD operations
     async createDepartment(createDepartmentDto: CreateDepartmentDto): Promise<any> {
@@ -22,6 +26,8 @@ export class DepartmentsService {
             data: createDepartmentDto,
         });
 
+        void this.orchestrator.notifyConfigChanged(department.hospitalId);
+
         this.logger.info('Department created', { id: department.id });
         return department;
     }
@@ -89,6 +95,8 @@ export class DepartmentsService {
             data: updateDepartmentDto,
         });
 
+        void this.orchestrator.notifyConfigChanged(department.hospitalId);
+
         this.logger.info('Department updated', { id });
         return department;
     }
@@ -103,6 +111,8 @@ export class DepartmentsService {
             data: { isActive: false },
         });
 
+        void this.orchestrator.notifyConfigChanged(department.hospitalId);
+
         this.logger.warn('Department deactivated', { id });
         return department;
     }
@@ -1,8 +1,10 @@
 import { Module } from '@nestjs/common';
 import { HospitalsService } from './hospitals.service';
 import { HospitalsController } from './hospitals.controller';
+import { CallsModule } from '../calls/calls.module';
 
 @Module({
+    imports: [CallsModule],
     controllers: [HospitalsController],
     providers: [HospitalsService],
     exports: [HospitalsService],
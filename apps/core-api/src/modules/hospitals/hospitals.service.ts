@@ -2,6 +2,7 @@ import { Injectable, NotFoundException, ConflictException } from '@nestjs/common
 import { PrismaService } from '../../prisma/prisma.service';
 import { CacheService, CacheKeys, CacheTTL } from '../../cache/cache.service';
 import { CreateHospitalDto, UpdateHospitalDto } from './dto/hospital.dto';
+import { VoiceOrchestratorClient } from '../calls/clients/voice-orchestrator.client';
 import { Logger } from '@wardline/utils';
 
 @Injectable()
@@ -11,6 +12,7 @@ export class HospitalsService {
     constructor(
         private prisma: PrismaService,
         private cache: CacheService,
+        private orchestrator: VoiceOrchestratorClient,
     ) {}
 
     async create(createHospitalDto: CreateHospitalDto): Promise<any> {
@@ -49,6 +51,7 @@ export class HospitalsService {
 
         // Invalidate hospitals list cache
         this.cache.delete(CacheKeys.hospitals());
+        void this.orchestrator.notifyConfigChanged(hospital.id);
 
         this.logger.info('Hospital created', { id: hospital.id });
         return hospital;
@@ -177,6 +180,7 @@ export class HospitalsService {
         // Invalidate caches
         this.cache.delete(CacheKeys.hospital(id));
         this.cache.delete(CacheKeys.hospitals());
+        void this.orchestrator.notifyConfigChanged(id);
 
         this.logger.info('Hospital updated', { id });
         return hospital;
@@ -197,6 +201,7 @@ export class HospitalsService {
         // Invalidate all caches for this hospital
         this.cache.invalidateByTag(`hospital:${id}`);
         this.cache.delete(CacheKeys.hospitals());
+        void this.orchestrator.notifyConfigChanged(id);
 
         this.logger.warn('Hospital suspended (soft delete)', { id });
         return hospital;
@@ -214,6 +219,7 @@ export class HospitalsService {
 
         // Invalidate hospital cache
         this.cache.delete(CacheKeys.hospital(id));
+        void this.orchestrator.notifyConfigChanged(id);
 
         return result;
     }
@@ -1,8 +1,10 @@
 import { Module } from '@nestjs/common';
 import { InsuranceService } from './insurance.service';
 import { InsuranceController } from './insurance.controller';
+import { CallsModule } from '../calls/calls.module';
 
 @Module({
+    imports: [CallsModule],
     controllers: [InsuranceController],
     providers: [InsuranceService],
     exports: [InsuranceService],
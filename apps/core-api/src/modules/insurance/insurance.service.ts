@@ -11,12 +11,16 @@ import {
     InsuranceInquiryType,
 } from './dto/insurance.dto';
 import { Logger } from '@wardline/utils';
+import { VoiceOrchestratorClient } from '../calls/clients/voice-orchestrator.client';
 
 @Injectable()
 export class InsuranceService {
     private readonly logger = new Logger(InsuranceService.name);
 
-    constructor(private prisma: PrismaService) { }
+    constructor(
+        private prisma: PrismaService,
+        private orchestrator: VoiceOrchestratorClient,
+    ) { }
 
     // Insurance Plan operations
     async createPlan(createDto: CreateInsurancePlanDto): Promise<any> {
@@ -30,6 +34,8 @@ export class InsuranceService {
             },
         });
 
+        void this.orchestrator.notifyConfigChanged(plan.hospitalId);
+
         this.logger.info('Insurance plan created', { id: plan.id });
         return plan;
     }
@@ -120,6 +126,8 @@ export class InsuranceService {
             },
         });
 
+        void this.orchestrator.notifyConfigChanged(plan.hospitalId);
+
         this.logger.info('Insurance plan updated', { id });
         return plan;
     }
@@ -129,9 +137,10 @@ export class InsuranceService {
 
         await this.findPlanById(id);
 
-        await this.prisma.insurancePlan.delete({
+        const plan = await this.prisma.insurancePlan.delete({
             where: { id },
         });
+        void this.orchestrator.notifyConfigChanged(plan.hospitalId);
 
         this.logger.warn('Insurance plan deleted', { id });
         return { success: true };
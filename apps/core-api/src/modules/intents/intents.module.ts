@@ -1,8 +1,10 @@
 import { Module } from '@nestjs/common';
 import { IntentsService } from './intents.service';
 import { IntentsController } from './intents.controller';
+import { CallsModule } from '../calls/calls.module';
 
 @Module({
+    imports: [CallsModule],
     controllers: [IntentsController],
     providers: [IntentsService],
     exports: [IntentsService],
@@ -1,17 +1,23 @@
 import { Injectable, NotFoundException } from '@nestjs/common';
 import { PrismaService } from '../../prisma/prisma.service';
+import { VoiceOrchestratorClient } from '../calls/clients/voice-orchestrator.client';
 
 @Injectable()
 export class IntentsService {
-    constructor(private prisma: PrismaService) { }
+    constructor(
+        private prisma: PrismaService,
+        private orchestrator: VoiceOrchestratorClient,
+    ) { }
 
     async create(hospitalId: string, data: any): Promise<any> {
-        return this.prisma.intent.create({
+        const intent = await this.prisma.intent.create({
             data: {
                 ...data,
                 hospitalId,
             },
         });
+        void this.orchestrator.notifyConfigChanged(hospitalId);
+        return intent;
     }
 
     async findAllByHospital(hospitalId: string): Promise<any[]> {
@@ -29,11 +35,15 @@ export class IntentsService {
 
     async update(id: string, data: any): Promise<any> {
         await this.findOne(id);
-        return this.prisma.intent.update({ where: { id }, data });
+        const intent = await this.prisma.intent.update({ where: { id }, data });
+        void this.orchestrator.notifyConfigChanged(intent.hospitalId);
+        return intent;
     }
 
     async remove(id: string): Promise<any> {
         await this.findOne(id);
-        return this.prisma.intent.delete({ where: { id } });
+        const intent = await this.prisma.intent.delete({ where: { id } });
+        void this.orchestrator.notifyConfigChanged(intent.hospitalId);
+        return intent;
     }
 }
@@ -61,6 +61,16 @@ export class AssignCallDto {
     priority?: number;
 }
 
+export class DirectAssignCallDto {
+    @ApiProperty()
+    @IsUUID()
+    callId: string;
+
+    @ApiProperty()
+    @IsUUID()
+    agentId: string;
+}
+
 export class AcceptAssignmentDto {
     @ApiProperty()
     @IsUUID()
@@ -150,6 +150,31 @@ export class QueueAssignmentService {
         return agents[0];
     }
 
+    /**
+     * Assign a call directly to a specific agent, outside any queue.
+     * Both must belong to the hospital.
+     */
+    async assignCallDirect(hospitalId: string, callId: string, agentId: string) {
+        const [call, agent] = await Promise.all([
+            this.prisma.callSession.findFirst({ where: { id: callId, hospitalId }, select: { id: true } }),
+            this.prisma.agent.findFirst({ where: { id: agentId, hospitalId }, select: { id: true } }),
+        ]);
+
+        if (!call) {
+            throw new NotFoundException(`Call not found: ${callId}`);
+        }
+        if (!agent) {
+            throw new NotFoundException(`Agent not found: ${agentId}`);
+        }
+
+        return this.createAssignment({
+            callId,
+            agentId,
+            status: CallAssignmentStatus.ASSIGNED,
+            assignedAt: new Date(),
+        });
+    }
+
     /**
      * Create a call assignment
      */
@@ -17,6 +17,7 @@ import {
     CreateQueueDto,
     UpdateQueueDto,
     AssignCallDto,
+    DirectAssignCallDto,
     AcceptAssignmentDto,
     QueueQueryDto,
     AssignmentQueryDto,
@@ -129,6 +130,18 @@ export class QueuesController {
         );
     }
 
+    @Post('assignments')
+    @HttpCode(HttpStatus.CREATED)
+    @ApiOperation({ summary: 'Assign a call directly to an agent, outside any queue' })
+    @ApiResponse({ status: 201, description: 'Call assigned' })
+    @ApiResponse({ status: 404, description: 'Call or agent not found in this hospital' })
+    async assignCallDirect(
+        @Param('hospitalId') hospitalId: string,
+        @Body() dto: DirectAssignCallDto,
+    ): Promise<any> {
+        return this.assignmentService.assignCallDirect(hospitalId, dto.callId, dto.agentId);
+    }
+
     @Get('assignments')
     @ApiOperation({ summary: 'List all assignments (for agent dashboard)' })
     @ApiResponse({ status: 200, description: 'Assignments retrieved' })
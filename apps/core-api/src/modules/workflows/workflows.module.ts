@@ -4,9 +4,10 @@ import { WorkflowsController } from './workflows.controller';
 import { WorkflowExecutionService } from './services/workflow-execution.service';
 import { WorkflowValidatorService } from './services/workflow-validator.service';
 import { QueuesModule } from '../queues/queues.module';
+import { CallsModule } from '../calls/calls.module';
 
 @Module({
-    imports: [QueuesModule],
+    imports: [QueuesModule, CallsModule],
     controllers: [WorkflowsController],
     providers: [
         WorkflowsService,
@@ -1,12 +1,16 @@
 import { Injectable, NotFoundException } from '@nestjs/common';
 import { PrismaService } from '../../prisma/prisma.service';
 import { Logger } from '@wardline/utils';
+import { VoiceOrchestratorClient } from '../calls/clients/voice-orchestrator.client';
 
 @Injectable()
 export class WorkflowsService {
     private readonly logger = new Logger(WorkflowsService.name);
 
-    constructor(private prisma: PrismaService) { }
+    constructor(
+        private prisma: PrismaService,
+        private orchestrator: VoiceOrchestratorClient,
+    ) { }
 
     async create(hospitalId: string, userId: string, data: any): Promise<any> {
         const workflow = await this.prisma.workflow.create({
@@ -103,6 +107,8 @@ export class WorkflowsService {
             },
         });
 
+        void this.orchestrator.notifyConfigChanged(version.workflow.hospitalId, version.workflowId);
+
         this.logger.info('Workflow version published', { versionId });
         return published;
     }
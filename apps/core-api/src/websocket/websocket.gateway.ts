@@ -3,13 +3,34 @@ import {
     WebSocketServer,
     SubscribeMessage,
     MessageBody,
+    ConnectedSocket,
     OnGatewayConnection,
     OnGatewayDisconnect,
 } from '@nestjs/websockets';
 import { Logger } from '@nestjs/common';
+import { timingSafeEqual } from 'crypto';
 import { Server, Socket } from 'socket.io';
 import { AgentSessionStatus, CallAssignmentStatus } from '@wardline/types';
 import { AgentsService } from '../modules/agents/agents.service';
+import { ClerkService } from '../auth/clerk.service';
+import { PrismaService } from '../prisma/prisma.service';
+
+/**
+ * Latest state of one call, as published by the voice orchestrator
+ */
+interface LiveCallEvent {
+    callSid: string;
+    callId?: string | null;
+    hospitalId?: string;
+    state?: string;
+    isEmergency?: boolean;
+    emergencyRaised?: boolean;
+    intent?: string | null;
+    sentiment?: { frustration: number; urgency: number; escalationNeeded: boolean };
+    escalationReason?: string | null;
+    workflowNodeId?: string | null;
+    ended: boolean;
+}
 
 @WebSocketGateway({
     cors: {
@@ -27,28 +48,79 @@ export class AgentWebSocketGateway implements OnGatewayConnection, OnGatewayDisc
 
     private readonly logger = new Logger(AgentWebSocketGateway.name);
     private agentSessions = new Map<string, string>(); // socketId -> agentId
+    private orchestrators = new Set<string>(); // socketIds of voice orchestrators
 
-    constructor(private readonly agentsService: AgentsService) { }
+    constructor(
+        private readonly agentsService: AgentsService,
+        private readonly clerkService: ClerkService,
+        private readonly prisma: PrismaService,
+    ) { }
 
     /**
      * Handle client connection
+     * Voice orchestrators authenticate with the shared internal token; every
+     * other client must send a Clerk session token and joins a room per
+     * hospital it belongs to. Anyone else is disconnected.
      */
     async handleConnection(client: Socket) {
         this.logger.log(`Client connected: ${client.id}`);
-        
+
+        const orchestratorToken = client.handshake.auth?.orchestratorToken;
+        if (orchestratorToken && this.isOrchestratorToken(orchestratorToken)) {
+            this.orchestrators.add(client.id);
+            this.logger.log(`Voice orchestrator connected: ${client.id}`);
+            return;
+        }
+
+        const user = await this.authenticate(client.handshake.auth?.token);
+        if (!user) {
+            this.logger.warn(`Rejecting unauthenticated client: ${client.id}`);
+            client.disconnect(true);
+            return;
+        }
+        client.data.user = user;
+        client.join(`user:${user.id}`);
+        for (const membership of user.hospitals) {
+            client.join(`hospital:${membership.hospitalId}`);
+        }
+
         // Extract agent ID from handshake auth
         const agentId = client.handshake.auth?.agentId;
-        const userId = client.handshake.auth?.userId;
-
         if (agentId) {
             this.agentSessions.set(client.id, agentId);
             client.join(`agent:${agentId}`);
             this.logger.log(`Agent ${agentId} connected`);
         }
+    }
+
+    /**
+     * Resolve a Clerk session token to a user with their hospital memberships
+     */
+    private async authenticate(token: unknown): Promise<any | null> {
+        if (typeof token !== 'string' || !token) {
+            return null;
+        }
+        try {
+            const payload = await this.clerkService.verifyToken(token);
+            if (!payload?.sub) {
+                return null;
+            }
+            return await this.prisma.user.findUnique({
+                where: { clerkUserId: payload.sub },
+                include: { hospitals: true },
+            });
+        } catch (error: any) {
+            this.logger.warn(`WebSocket authentication failed: ${error.message}`);
+            return null;
+        }
+    }
 
-        if (userId) {
-            client.join(`user:${userId}`);
+    private isOrchestratorToken(token: string): boolean {
+        const expected = process.env.ORCHESTRATOR_INTERNAL_TOKEN;
+        if (!expected || typeof token !== 'string' || token.length !== expected.length) {
+            return false;
         }
+        return timingSafeEqual(Buffer.from(token), Buffer.from(expected));
     }
 
     /**
@@ -56,6 +128,7 @@ export class AgentWebSocketGateway implements OnGatewayConnection, OnGatewayDisc
      */
     async handleDisconnect(client: Socket) {
         this.logger.log(`Client disconnected: ${client.id}`);
+        this.orchestrators.delete(client.id);
 
         const agentId = this.agentSessions.get(client.id);
         if (agentId) {
@@ -156,12 +229,13 @@ export class AgentWebSocketGateway implements OnGatewayConnection, OnGatewayDisc
 
     /**
      * Notify supervisors about emergency
+     * Goes to the call's hospital when known, otherwise to every signed-in user
      */
-    notifyEmergency(callId: string, reason: string, keywords?: string[]) {
+    notifyEmergency(callId: string, reason: string, keywords?: string[], hospitalId?: string) {
         this.logger.warn(`EMERGENCY: Call ${callId} - ${reason}`);
 
-        // Broadcast to all supervisors
-        this.server.emit('emergency:alert', {
+        const target = hospitalId ? this.server.to(`hospital:${hospitalId}`) : this.server;
+        target.emit('emergency:alert', {
             callId,
             reason,
             keywords,
@@ -194,6 +268,50 @@ export class AgentWebSocketGateway implements OnGatewayConnection, OnGatewayDisc
         });
     }
 
+    /**
+     * Batched live call-state events from a voice orchestrator
+     */
+    @SubscribeMessage('calls:events')
+    handleCallEvents(
+        @ConnectedSocket() client: Socket,
+        @MessageBody() data: { worker?: string; events: LiveCallEvent[] },
+    ) {
+        if (!this.orchestrators.has(client.id)) {
+            return { success: false, error: 'Unauthorized' };
+        }
+
+        const events = Array.isArray(data?.events) ? data.events : [];
+        const byHospital = new Map<string, LiveCallEvent[]>();
+        for (const event of events) {
+            if (event.emergencyRaised) {
+                this.notifyEmergency(
+                    event.callId || event.callSid,
+                    event.escalationReason || 'Emergency detected by voice AI',
+                    undefined,
+                    event.hospitalId,
+                );
+            }
+            // Calls not yet tied to a hospital have no dashboard to show them on
+            if (event.hospitalId) {
+                const batch = byHospital.get(event.hospitalId) || [];
+                batch.push(event);
+                byHospital.set(event.hospitalId, batch);
+            }
+        }
+
+        // Relay one message per hospital so dashboard traffic follows the
+        // batch window and each hospital only sees its own calls
+        const timestamp = new Date();
+        for (const [hospitalId, batch] of byHospital) {
+            this.server.to(`hospital:${hospitalId}`).emit('calls:live:updated', {
+                events: batch,
+                timestamp,
+            });
+        }
+
+        return { success: true, received: events.length };
+    }
+
     /**
      * Send message to specific agent
      */
@@ -0,0 +1,239 @@
+"""
+Token and cost accounting
+
+Records what each turn consumed:
+- LLM prompt, cached and completion tokens
+- TTS characters
+- STT audio seconds
+
+These roll up per call and per hospital in fixed-size counters (no
+per-turn lists), so memory grows with the number of active calls and
+hospitals, not with call length. Rollups are appended to a JSONL file
+every USAGE_FLUSH_INTERVAL_SECONDS:
+- one record per hospital for the interval
+- one record per call when it ends
+
+Cost is estimated from the configured prices.
+"""
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+from loguru import logger
+
+from config import settings
+from call_context import CallContext
+from metrics import metrics
+from task_runtime import runtime
+
+
+_llm_tokens = metrics.counter("usage_llm_tokens_total", "LLM tokens by hospital and kind")
+_tts_chars = metrics.counter("usage_tts_characters_total", "TTS characters by hospital")
+_stt_seconds = metrics.counter("usage_stt_seconds_total", "STT audio seconds by hospital")
+_prompt_size = metrics.histogram(
+    "usage_prompt_tokens",
+    "Prompt tokens per LLM request",
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000),
+)
+
+
+class UsageCounters:
+    """Running totals for one call or one hospital"""
+
+    __slots__ = (
+        "llm_requests",
+        "prompt_tokens",
+        "cached_tokens",
+        "completion_tokens",
+        "max_prompt_tokens",
+        "tts_chars",
+        "stt_seconds",
+    )
+
+    def __init__(self):
+        self.llm_requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+        self.max_prompt_tokens = 0
+        self.tts_chars = 0
+        self.stt_seconds = 0.0
+
+    def add(self, other: "UsageCounters"):
+        for name in self.__slots__:
+            if name == "max_prompt_tokens":
+                self.max_prompt_tokens = max(self.max_prompt_tokens, other.max_prompt_tokens)
+            else:
+                setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def cost(self) -> float:
+        """Estimated USD from the configured unit prices"""
+        uncached = self.prompt_tokens - self.cached_tokens
+        return (
+            uncached * settings.price_prompt_per_million_tokens
+            + self.cached_tokens * settings.price_cached_per_million_tokens
+            + self.completion_tokens * settings.price_completion_per_million_tokens
+            + self.tts_chars * settings.price_tts_per_million_chars
+        ) / 1_000_000 + self.stt_seconds / 3600 * settings.price_stt_per_hour
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data["stt_seconds"] = round(self.stt_seconds, 2)
+        data["cost_usd"] = round(self.cost(), 6)
+        return data
+
+
+class _CallUsage:
+    __slots__ = ("hospital_id", "started", "counters")
+
+    def __init__(self, hospital_id: str):
+        self.hospital_id = hospital_id
+        self.started = time.time()
+        self.counters = UsageCounters()
+
+
+class UsageAccounting:
+    """Per-call and per-hospital usage rollups with periodic flush"""
+
+    def __init__(self):
+        self._path = Path(settings.usage_file)
+        self._calls: Dict[str, _CallUsage] = {}
+        # Usage since the last flush, per hospital
+        self._interval: Dict[str, UsageCounters] = {}
+        # Usage since startup, per hospital
+        self.totals: Dict[str, UsageCounters] = {}
+        self._ended: List[Dict[str, Any]] = []
+        self._interval_started = time.time()
+
+    def _charge(self, context: CallContext) -> List[UsageCounters]:
+        """The counters a turn of this call adds to"""
+        hospital_id = context.hospital_id or "unknown"
+        call = self._calls.get(context.call_sid)
+        if call is None:
+            call = self._calls[context.call_sid] = _CallUsage(hospital_id)
+        interval = self._interval.get(hospital_id)
+        if interval is None:
+            interval = self._interval[hospital_id] = UsageCounters()
+        return [call.counters, interval]
+
+    # -------------------------------------------------------------------------
+    # Recording
+    # -------------------------------------------------------------------------
+
+    def record_llm(
+        self,
+        context: CallContext,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cached_tokens: int = 0,
+    ):
+        """One LLM request's usage, as reported by the API"""
+        hospital = context.hospital_id or "unknown"
+        for counters in self._charge(context):
+            counters.llm_requests += 1
+            counters.prompt_tokens += prompt_tokens
+            counters.cached_tokens += cached_tokens
+            counters.completion_tokens += completion_tokens
+            counters.max_prompt_tokens = max(counters.max_prompt_tokens, prompt_tokens)
+        _llm_tokens.inc(prompt_tokens - cached_tokens, hospital=hospital, kind="prompt")
+        _llm_tokens.inc(cached_tokens, hospital=hospital, kind="cached")
+        _llm_tokens.inc(completion_tokens, hospital=hospital, kind="completion")
+        _prompt_size.observe(prompt_tokens, hospital=hospital)
+
+    def record_llm_response(self, context: CallContext, response: Any):
+        """Record the `usage` of an OpenAI chat completion, if it has one"""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.record_llm(
+            context,
+            prompt_tokens=usage.prompt_tokens or 0,
+            completion_tokens=usage.completion_tokens or 0,
+            cached_tokens=getattr(details, "cached_tokens", None) or 0,
+        )
+
+    def record_tts(self, context: CallContext, chars: int):
+        for counters in self._charge(context):
+            counters.tts_chars += chars
+        _tts_chars.inc(chars, hospital=context.hospital_id or "unknown")
+
+    def record_stt(self, context: CallContext, seconds: float):
+        for counters in self._charge(context):
+            counters.stt_seconds += seconds
+        _stt_seconds.inc(seconds, hospital=context.hospital_id or "unknown")
+
+    def end_call(self, call_sid: str):
+        """Close out a call; its rollup goes out with the next flush"""
+        call = self._calls.pop(call_sid, None)
+        if call:
+            self._ended.append(self._call_record(call_sid, call, ended=True))
+
+    def _call_record(self, call_sid: str, call: _CallUsage, ended: bool) -> Dict[str, Any]:
+        return {
+            "type": "call",
+            "call_sid": call_sid,
+            "hospital_id": call.hospital_id,
+            "started_at": call.started,
+            "ended": ended,
+            **call.counters.as_dict(),
+        }
+
+    # -------------------------------------------------------------------------
+    # Flushing
+    # -------------------------------------------------------------------------
+
+    async def run(self):
+        """Flush on an interval until cancelled"""
+        while True:
+            await asyncio.sleep(settings.usage_flush_interval_seconds)
+            await self.flush()
+
+    async def flush(self, include_active: bool = False):
+        """
+        Append the interval's hospital rollups and ended calls to the usage
+        file. `include_active` also writes calls still in progress, for
+        shutdown; the process taking them over starts new counters.
+        """
+        now = time.time()
+        records = [
+            {
+                "type": "hospital",
+                "hospital_id": hospital_id,
+                "interval_start": self._interval_started,
+                "interval_end": now,
+                **counters.as_dict(),
+            }
+            for hospital_id, counters in self._interval.items()
+        ]
+        records.extend(self._ended)
+        if include_active:
+            records.extend(
+                self._call_record(call_sid, call, ended=False)
+                for call_sid, call in self._calls.items()
+            )
+        for hospital_id, counters in self._interval.items():
+            self.totals.setdefault(hospital_id, UsageCounters()).add(counters)
+        self._interval = {}
+        self._ended = []
+        self._interval_started = now
+        if records:
+            await runtime.run_in_thread(self._write, records)
+
+    def _write(self, records: List[Dict[str, Any]]):
+        worker = settings.worker_id or str(os.getpid())
+        body = "".join(
+            json.dumps({"worker": worker, **r}, separators=(",", ":")) + "\n" for r in records
+        )
+        try:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self._path, "a") as f:
+                f.write(body)
+        except OSError as e:
+            logger.warning(f"Could not write {len(records)} usage records to {self._path}: {e}")
+
+
+# Global usage accounting
+accounting = UsageAccounting()
@@ -0,0 +1,173 @@
+"""
+Admission control and load shedding
+
+Caps concurrent AI calls and in-flight LLM requests. Each cap adapts to
+observed latency (additive increase, multiplicative decrease) between a
+floor and the configured maximum, so a slow Azure deployment sheds load
+before every turn times out. Callers over the limit get a fast degraded
+path instead of queueing unbounded coroutines. LLM requests take their
+slots through llm_scheduler, which decides the order they're served in.
+With an LLM token budget set, the call cap is lowered to what that budget
+can serve (LLM_CALL_TOKENS_PER_MINUTE per call).
+
+A call's slot is released by its final status callback or when its media
+stream closes. If neither arrives, the slot is reclaimed after
+CALL_SLOT_IDLE_SECONDS without activity.
+"""
+import asyncio
+import time
+from typing import Dict, List, Optional
+from loguru import logger
+
+from config import settings
+from metrics import metrics
+
+
+# Multiplicative decrease applied when a request is slower than target
+DECREASE_FACTOR = 0.9
+# Never adapt below this fraction of the configured maximum
+MIN_LIMIT_FRACTION = 0.1
+
+
+class OverloadedError(Exception):
+    """Raised when a request can't be admitted"""
+
+    def __init__(self, kind: str):
+        super().__init__(f"{kind} over capacity")
+        self.kind = kind
+
+
+_in_flight = metrics.gauge("admission_in_flight", "Admitted work currently in flight")
+_limit = metrics.gauge("admission_limit", "Current adaptive concurrency limit")
+_rejected = metrics.counter("admission_rejected_total", "Work rejected by admission control")
+_latency = metrics.histogram("admission_latency_seconds", "Latency of admitted work")
+_reaped = metrics.counter("admission_reaped_calls_total", "Idle call slots reclaimed without a release")
+
+
+class AdaptiveLimiter:
+    """Concurrency limit that tracks observed latency against a target"""
+
+    def __init__(self, name: str, max_limit: int, target_latency: float):
+        self.name = name
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, int(self.max_limit * MIN_LIMIT_FRACTION))
+        self.target_latency = target_latency
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self._released = asyncio.Event()
+        self._publish()
+
+    def _publish(self):
+        _in_flight.set(self.in_flight, kind=self.name)
+        _limit.set(int(self.limit), kind=self.name)
+
+    def try_acquire(self) -> bool:
+        """Take a slot if one is free right now"""
+        if self.in_flight >= int(self.limit):
+            return False
+        self.in_flight += 1
+        self._publish()
+        return True
+
+    async def acquire(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for a slot"""
+        deadline = time.monotonic() + timeout
+        while not self.try_acquire():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._released.clear()
+            try:
+                await asyncio.wait_for(self._released.wait(), remaining)
+            except asyncio.TimeoutError:
+                return self.try_acquire()
+        return True
+
+    def release(self, latency: Optional[float] = None):
+        """Free a slot and adapt the limit to how long the work took"""
+        self.in_flight = max(0, self.in_flight - 1)
+        if latency is not None:
+            self.adapt(latency)
+        self._publish()
+        self._released.set()
+
+    def adapt(self, latency: float):
+        """AIMD: shrink the limit when slower than target, grow it slowly otherwise"""
+        _latency.observe(latency, kind=self.name)
+        if latency > self.target_latency:
+            self.limit = max(self.min_limit, self.limit * DECREASE_FACTOR)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+        self._publish()
+
+    def reject(self):
+        _rejected.inc(kind=self.name)
+        logger.warning(
+            f"Admission rejected {self.name}: {self.in_flight}/{int(self.limit)} in flight"
+        )
+
+
+def max_calls() -> int:
+    """The configured call cap, lowered to what the LLM token budget can serve"""
+    limit = settings.max_concurrent_calls
+    if settings.llm_tokens_per_minute > 0 and settings.llm_call_tokens_per_minute > 0:
+        limit = min(limit, settings.llm_tokens_per_minute // settings.llm_call_tokens_per_minute)
+    return max(1, limit)
+
+
+class AdmissionController:
+    """Admission for AI-handled calls and LLM requests"""
+
+    def __init__(self):
+        self.calls = AdaptiveLimiter(
+            "calls",
+            max_calls(),
+            settings.turn_target_latency_seconds,
+        )
+        self.llm = AdaptiveLimiter(
+            "llm",
+            settings.max_concurrent_llm_requests,
+            settings.llm_target_latency_seconds,
+        )
+        # call_sid -> last activity (monotonic)
+        self._admitted_calls: Dict[str, float] = {}
+
+    def admit_call(self, call_sid: str) -> bool:
+        """Admit a new call to the AI path; False means send it to the degraded path"""
+        if call_sid in self._admitted_calls:
+            self._admitted_calls[call_sid] = time.monotonic()
+            return True
+        if not self.calls.try_acquire():
+            self.calls.reject()
+            return False
+        self._admitted_calls[call_sid] = time.monotonic()
+        return True
+
+    def touch_call(self, call_sid: str):
+        """Note activity on an admitted call so its slot isn't reclaimed"""
+        if call_sid in self._admitted_calls:
+            self._admitted_calls[call_sid] = time.monotonic()
+
+    def release_call(self, call_sid: str):
+        """Release a call's slot; safe to call more than once"""
+        if self._admitted_calls.pop(call_sid, None) is not None:
+            self.calls.release()
+
+    def reap_idle_calls(self, max_idle: float) -> List[str]:
+        """Release slots idle for longer than `max_idle` seconds; returns their call SIDs"""
+        cutoff = time.monotonic() - max_idle
+        idle = [sid for sid, seen in self._admitted_calls.items() if seen < cutoff]
+        for call_sid in idle:
+            self.release_call(call_sid)
+        if idle:
+            _reaped.inc(len(idle))
+            logger.warning(f"Reclaimed {len(idle)} idle call slots with no final status")
+        return idle
+
+    def observe_turn(self, latency: float):
+        """Feed end-to-end turn latency into the call limit"""
+        self.calls.adapt(latency)
+
+
+# Global admission controller
+admission = AdmissionController()
@@ -0,0 +1,272 @@
+"""
+Paced outbound audio for Twilio Media Streams
+
+Sending TTS audio back over /media/{call_sid} as one JSON+base64 message
+per small chunk costs CPU and syscalls and causes jitter. Sending it all at
+once means a barge-in has seconds of queued speech to throw away.
+
+Each call gets an OutboundAudioWriter:
+- TTS output (8 kHz mu-law, handed over by the pipeline's BargeInController)
+  is appended to the call's buffer, whatever the chunk size.
+- The writer re-chunks it into fixed 20 ms frames and coalesces
+  MEDIA_FRAMES_PER_MESSAGE of them into each media message.
+- Sends are paced against a playout clock, so Twilio is never more than
+  MEDIA_MAX_LEAD_MS ahead of what the caller has heard.
+
+A mark goes out every MEDIA_MARK_INTERVAL_MS of audio. Twilio echoes each
+mark back once it has been played, so the position the caller has heard is
+known. On barge-in, clear() drops the buffered audio and tells Twilio to
+stop; the pipeline reads played() first, so the conversation history keeps
+only what the caller heard.
+"""
+import asyncio
+import base64
+import json
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from loguru import logger
+
+from config import settings
+from metrics import metrics
+
+
+# Twilio plays 8 kHz mu-law: one byte per sample
+BYTES_PER_SECOND = 8000
+FRAME_MS = 20
+FRAME_BYTES = BYTES_PER_SECOND * FRAME_MS // 1000
+# Mu-law silence, used to pad the last frame of an utterance
+SILENCE_FRAME = b"\xff" * FRAME_BYTES
+
+_messages = metrics.counter("media_out_messages_total", "Outbound media messages sent")
+_frames = metrics.counter("media_out_frames_total", "Outbound 20 ms audio frames sent")
+_underruns = metrics.counter(
+    "media_out_underruns_total", "Times playout caught up with the writer mid-utterance"
+)
+_lead = metrics.histogram(
+    "media_out_lead_seconds",
+    "Audio already queued at Twilio when a message is sent",
+    buckets=(0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0),
+)
+_cleared = metrics.histogram(
+    "media_out_cleared_seconds",
+    "Unplayed audio discarded on barge-in",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0),
+)
+
+
+def heard_prefix(text: str, share: float) -> str:
+    """The start of `text` spoken in the first `share` of its audio, in whole words"""
+    if share >= 1.0:
+        return text
+    if share <= 0.0:
+        return ""
+    # Don't claim a half-spoken word
+    return text[:int(len(text) * share)].rsplit(" ", 1)[0]
+
+
+@dataclass
+class Utterance:
+    """One spoken response, as a span of the call's outbound byte stream"""
+    start: int
+    end: int
+    finished: bool = False
+
+
+class OutboundAudioWriter:
+    """Re-chunks, paces and marks one call's outbound audio"""
+
+    def __init__(self, send: Callable[[str], Awaitable[None]], stream_sid: str, call_sid: str = ""):
+        self._send = send
+        self.stream_sid = stream_sid
+        self.call_sid = call_sid
+        self._frames_per_message = max(1, settings.media_frames_per_message)
+        self._message_bytes = FRAME_BYTES * self._frames_per_message
+        # Reused to pad a short final frame, instead of allocating per send
+        self._tail = bytearray(SILENCE_FRAME)
+        # The constant parts of every media message
+        self._media_prefix = (
+            '{"event":"media","streamSid":' + json.dumps(stream_sid) + ',"media":{"payload":"'
+        )
+        self._buffer = bytearray()
+        self._read = 0
+        # Positions in the outbound byte stream: accepted, sent, heard
+        self.written = 0
+        self.sent = 0
+        self.heard = 0
+        self._next_mark = 0
+        # A clear() starts a new epoch, so late marks for dropped audio are ignored
+        self._epoch = 0
+        # When everything sent so far will have finished playing
+        self._play_end = 0.0
+        self._utterances: List[Utterance] = []
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.closed = False
+
+    # -------------------------------------------------------------------------
+    # Producer side
+    # -------------------------------------------------------------------------
+
+    def start_utterance(self):
+        """Begin a new response; audio written after this belongs to it"""
+        self.finish_utterance()
+        self._utterances.append(Utterance(self.written, self.written))
+        # Only the latest few can still be unsent or playing
+        del self._utterances[:-8]
+
+    def write(self, audio: bytes):
+        """Queue mu-law audio of any length"""
+        if self.closed or not audio:
+            return
+        self._buffer += audio
+        self.written += len(audio)
+        if self._utterances and not self._utterances[-1].finished:
+            self._utterances[-1].end = self.written
+        if self.written - self.sent >= self._message_bytes:
+            self._ready.set()
+
+    def finish_utterance(self):
+        """Mark the end of a response so its last partial frame is sent padded"""
+        if self._utterances and not self._utterances[-1].finished:
+            self._utterances[-1].finished = True
+        if self.written > self.sent:
+            self._ready.set()
+
+    # -------------------------------------------------------------------------
+    # Pacing
+    # -------------------------------------------------------------------------
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        self.closed = True
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self):
+        max_lead = settings.media_max_lead_ms / 1000
+        message_seconds = self._message_bytes / BYTES_PER_SECOND
+        while True:
+            await self._ready.wait()
+            now = time.monotonic()
+            lead = self._play_end - now
+            if lead > max_lead - message_seconds:
+                # Twilio has enough queued; wake when there's room for a message
+                await asyncio.sleep(lead - (max_lead - message_seconds))
+                continue
+            continuing = self._mid_utterance()
+            taken = self._take()
+            if taken is None:
+                self._ready.clear()
+                continue
+            if lead < 0 and continuing:
+                _underruns.inc()
+            _lead.observe(max(0.0, lead))
+            payload, frames = taken
+            epoch = self._epoch
+            try:
+                await self._send_media(payload, frames)
+            except Exception as e:
+                logger.warning(f"Outbound audio send failed for {self.call_sid}: {e}")
+                self.closed = True
+                return
+            if epoch == self._epoch:
+                self._play_end = max(self._play_end, now) + frames * FRAME_MS / 1000
+
+    def _mid_utterance(self) -> bool:
+        """Whether the next audio continues an utterance already playing (a gap there is audible)"""
+        return any(u.start < self.sent < u.end for u in self._utterances)
+
+    def _take(self) -> Optional[Tuple[str, int]]:
+        """
+        Base64 payload and frame count for up to one message of whole
+        frames; pads the tail of a finished utterance. Encodes straight from
+        the buffer, which must not be resized while the view is alive.
+        """
+        pending = self.written - self.sent
+        if pending >= self._message_bytes:
+            size = self._message_bytes
+        elif pending >= FRAME_BYTES:
+            size = pending - pending % FRAME_BYTES
+        elif pending > 0 and self._tail_finished():
+            size = pending
+        else:
+            return None
+        if self._read > (1 << 16) and self._read * 2 > len(self._buffer):
+            # Compact now and then rather than on every send
+            del self._buffer[:self._read]
+            self._read = 0
+        if size < FRAME_BYTES:
+            self._tail[:size] = self._buffer[self._read:self._read + size]
+            self._tail[size:] = SILENCE_FRAME[size:]
+            payload = base64.b64encode(self._tail)
+        else:
+            with memoryview(self._buffer) as view:
+                payload = base64.b64encode(view[self._read:self._read + size])
+        self._read += size
+        self.sent += size
+        return payload.decode("ascii"), max(1, size // FRAME_BYTES)
+
+    def _tail_finished(self) -> bool:
+        return not self._utterances or self._utterances[-1].finished
+
+    async def _send_media(self, payload: str, frames: int):
+        await self._send(self._media_prefix + payload + '"}}')
+        _messages.inc()
+        _frames.inc(frames)
+        if self.sent >= self._next_mark or (self._tail_finished() and self.sent == self.written):
+            await self._send(json.dumps({
+                "event": "mark",
+                "streamSid": self.stream_sid,
+                "mark": {"name": f"{self._epoch}:{self.sent}"},
+            }))
+            self._next_mark = self.sent + settings.media_mark_interval_ms * BYTES_PER_SECOND // 1000
+
+    # -------------------------------------------------------------------------
+    # Playback position
+    # -------------------------------------------------------------------------
+
+    def on_mark(self, name: str):
+        """Twilio played everything up to a mark we sent"""
+        epoch, _, position = name.partition(":")
+        try:
+            if int(epoch) == self._epoch:
+                self.heard = max(self.heard, int(position))
+        except ValueError:
+            logger.debug(f"Ignoring foreign mark {name!r} on {self.call_sid}")
+
+    def played(self) -> int:
+        """
+        Best estimate of the stream position the caller has heard: the
+        playout clock, never behind the last acknowledged mark
+        """
+        queued = max(0.0, self._play_end - time.monotonic())
+        return max(self.heard, self.sent - int(queued * BYTES_PER_SECOND))
+
+    async def clear(self):
+        """
+        Barge-in: drop unsent audio and tell Twilio to drop what it has
+        queued
+        """
+        position = self.played()
+        dropped = self.written - position
+        _cleared.observe(dropped / BYTES_PER_SECOND)
+        self._buffer = bytearray()
+        self._read = 0
+        self._epoch += 1
+        for utterance in self._utterances:
+            utterance.end = min(utterance.end, position)
+            utterance.finished = True
+        self.written = self.sent = self.heard = self._next_mark = position
+        self._play_end = 0.0
+        self._ready.clear()
+        if not self.closed:
+            await self._send(json.dumps({"event": "clear", "streamSid": self.stream_sid}))
+
+
+# Writers for calls with an open media stream, by call SID
+audio_writers: Dict[str, OutboundAudioWriter] = {}
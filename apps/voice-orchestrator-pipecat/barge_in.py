@@ -0,0 +1,356 @@
+"""
+Barge-in handling for the Pipecat pipeline
+
+With allow_interruptions, a caller talking over the bot stops playback, but
+work already in flight carries on:
+- the LLM stream's HTTP response stays open, so Azure OpenAI keeps
+  generating (and billing) tokens nobody will hear
+- Azure TTS keeps synthesizing the current sentence, and its leftover audio
+  is read by the next response as if it were its own
+
+The services here close the LLM stream and stop the synthesizer as soon as
+the interruption arrives. The pipeline's VAD has already confirmed speech
+by then.
+
+BargeInController sits after TTS. It maps each response's sentences onto
+its audio and follows how much of that the caller has heard: the writer's
+mark-acknowledged playback position when there is a media stream, the time
+the bot has been speaking otherwise. On a barge-in it:
+- trims the assistant turn in CallContext to the words that were played
+- counts what the cancellation saved (LLM tokens, TTS characters, audio
+  seconds)
+
+When the call has a Twilio media stream, the controller hands the TTS audio
+to the call's OutboundAudioWriter (as 8 kHz mu-law, one utterance per
+response) instead of passing it on, and a barge-in clears the writer.
+
+Imported lazily, like the service SDKs it extends.
+"""
+import asyncio
+import threading
+import time
+from typing import List, Optional, Tuple
+from loguru import logger
+
+from pipecat.audio.utils import pcm_to_ulaw
+from pipecat.frames.frames import (
+    BotStartedSpeakingFrame,
+    BotStoppedSpeakingFrame,
+    Frame,
+    LLMFullResponseEndFrame,
+    LLMFullResponseStartFrame,
+    LLMTextFrame,
+    StartInterruptionFrame,
+    TTSAudioRawFrame,
+    TTSTextFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from pipecat.services.azure import AzureTTSService
+from pipecat.services.openai import OpenAILLMService
+
+from audio_writer import BYTES_PER_SECOND, OutboundAudioWriter, heard_prefix
+from call_context import CallContext, ConversationTurn
+from conversation_rules import DEFAULT_RULES, RulesConfig, apply_assistant_turn
+from llm_scheduler import CHARS_PER_TOKEN
+from metrics import metrics
+
+
+# Typical speaking rate, to turn unsynthesized text into audio seconds
+SPOKEN_CHARS_PER_SECOND = 15.0
+# Weight of each finished response in the typical response length
+RESPONSE_LENGTH_ALPHA = 0.3
+# How long a new sentence waits for a stopped synthesis to finish
+STOP_WAIT_STEPS = 20
+STOP_WAIT_STEP_SECONDS = 0.01
+
+_barge_ins = metrics.counter("barge_in_total", "Caller barge-ins that cancelled a response")
+_saved = metrics.counter(
+    "barge_in_saved_total",
+    "Work cancelled by barge-ins, by kind (llm_tokens, tts_chars, audio_seconds); partly estimated",
+)
+_heard_share = metrics.histogram(
+    "barge_in_heard_ratio",
+    "Share of the interrupted response the caller heard",
+    buckets=(0.1, 0.25, 0.5, 0.75, 0.9, 1.0),
+)
+
+
+class InterruptibleOpenAILLMService(OpenAILLMService):
+    """Closes the streaming response on interruption so generation stops"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._stream = None
+        # The current response, for barge-in accounting
+        self.generating = False
+        self.response_chars = 0
+
+    async def _stream_chat_completions(self, context):
+        self._stream = await super()._stream_chat_completions(context)
+        return self._stream
+
+    async def push_frame(self, frame: Frame, direction: FrameDirection = FrameDirection.DOWNSTREAM):
+        if isinstance(frame, LLMFullResponseStartFrame):
+            self.generating = True
+            self.response_chars = 0
+        elif isinstance(frame, LLMTextFrame):
+            self.response_chars += len(frame.text)
+        elif isinstance(frame, LLMFullResponseEndFrame):
+            self.generating = False
+            self._stream = None
+        await super().push_frame(frame, direction)
+
+    async def _start_interruption(self):
+        # Cancels the task reading the stream; the response itself stays open
+        await super()._start_interruption()
+        stream, self._stream = self._stream, None
+        self.generating = False
+        if stream is not None:
+            try:
+                await stream.close()
+            except Exception as e:
+                logger.debug(f"Closing interrupted LLM stream: {e}")
+
+
+class InterruptibleAzureTTSService(AzureTTSService):
+    """Stops Azure synthesis on interruption and discards its late audio"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # The _handle_* callbacks run on the Speech SDK's threads; the lock
+        # keeps the flags and the audio queue consistent with the event loop
+        self._lock = threading.Lock()
+        self._synthesizing = False
+        # Set while a stopped synthesis may still deliver audio
+        self._stopping = False
+        self._discarded_bytes = 0
+
+    async def run_tts(self, text: str):
+        # Give a stopped synthesis a moment to wind down so its audio isn't mixed in
+        for _ in range(STOP_WAIT_STEPS):
+            with self._lock:
+                if not self._stopping:
+                    break
+            await asyncio.sleep(STOP_WAIT_STEP_SECONDS)
+        with self._lock:
+            self._stopping = False
+            self._synthesizing = True
+        async for frame in super().run_tts(text):
+            yield frame
+
+    def _handle_synthesizing(self, evt):
+        with self._lock:
+            if self._stopping:
+                if evt.result and evt.result.audio_data:
+                    self._discarded_bytes += len(evt.result.audio_data)
+                return
+            super()._handle_synthesizing(evt)
+
+    def _handle_completed(self, evt):
+        with self._lock:
+            self._synthesizing = False
+            if self._stopping:
+                self._stopping = False
+                return
+            super()._handle_completed(evt)
+
+    def _handle_canceled(self, evt):
+        with self._lock:
+            self._synthesizing = False
+            if self._stopping:
+                self._stopping = False
+                return
+            super()._handle_canceled(evt)
+
+    async def _handle_interruption(self, frame: StartInterruptionFrame, direction: FrameDirection):
+        await super()._handle_interruption(frame, direction)
+        with self._lock:
+            stop = self._synthesizing
+            if stop:
+                self._stopping = True
+            # Audio already delivered for the interrupted sentence
+            while not self._audio_queue.empty():
+                chunk = self._audio_queue.get_nowait()
+                if chunk is not None:
+                    self._discarded_bytes += len(chunk)
+        if stop:
+            # Outside the lock: the SDK may call back into _handle_canceled
+            self._speech_synthesizer.stop_speaking_async()
+
+    def take_discarded_bytes(self) -> int:
+        """Audio dropped since the last call, for barge-in accounting"""
+        with self._lock:
+            discarded, self._discarded_bytes = self._discarded_bytes, 0
+        return discarded
+
+    @property
+    def bytes_per_second(self) -> int:
+        return self._settings["sample_rate"] * 2  # 16-bit mono PCM
+
+
+class BargeInController(FrameProcessor):
+    """
+    Follows each response from TTS to playback and, when the caller barges
+    in, trims the assistant turn to what was heard and counts the savings
+    """
+
+    def __init__(
+        self,
+        context: CallContext,
+        llm: InterruptibleOpenAILLMService,
+        tts: InterruptibleAzureTTSService,
+        rules: RulesConfig = DEFAULT_RULES,
+        writer: Optional[OutboundAudioWriter] = None,
+    ):
+        super().__init__()
+        self.context = context
+        self.llm = llm
+        self.tts = tts
+        self.rules = rules
+        # The call's media stream writer; plays the audio instead of the transport
+        self.writer = writer
+        # Synthesized sentences of the current response as (text, start, end)
+        # spans of its audio: writer stream bytes, or seconds without a writer
+        self._sentences: List[Tuple[str, float, float]] = []
+        self._unit = BYTES_PER_SECOND if writer is not None else 1.0
+        self._audio = 0.0
+        self._sentence_start = 0.0
+        self._turn: Optional[ConversationTurn] = None
+        self._active = False
+        self._ended = False
+        self._speaking_since: Optional[float] = None
+        self._played = 0.0
+        self._typical_chars = 0.0
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, StartInterruptionFrame):
+            # Read the position before clear() rewinds the writer to it
+            position = self._position()
+            if self._active and not (self._ended and position >= self._end()):
+                self._barge_in(position)
+            self._active = False
+            if self.writer is not None:
+                await self.writer.clear()
+        elif isinstance(frame, LLMFullResponseStartFrame):
+            self._start_response()
+        elif isinstance(frame, TTSAudioRawFrame):
+            if self.writer is not None:
+                self.writer.write(pcm_to_ulaw(frame.audio, frame.sample_rate, BYTES_PER_SECOND))
+                return
+            bytes_per_second = frame.sample_rate * frame.num_channels * 2  # 16-bit PCM
+            if bytes_per_second:
+                self._audio += len(frame.audio) / bytes_per_second
+        elif isinstance(frame, TTSTextFrame):
+            # pipecat sends a sentence's text after its audio
+            end = self._written()
+            self._sentences.append((frame.text, self._sentence_start, end))
+            self._sentence_start = end
+        elif isinstance(frame, LLMFullResponseEndFrame):
+            self._end_response()
+        elif isinstance(frame, BotStartedSpeakingFrame) and direction == FrameDirection.UPSTREAM:
+            self._speaking_since = time.monotonic()
+        elif isinstance(frame, BotStoppedSpeakingFrame) and direction == FrameDirection.UPSTREAM:
+            self._played += self._speaking_seconds()
+            self._speaking_since = None
+
+        await self.push_frame(frame, direction)
+
+    def _start_response(self):
+        if self.writer is not None:
+            self.writer.start_utterance()
+        self._sentences = []
+        self._audio = 0.0
+        self._sentence_start = self._written()
+        self._turn = None
+        self._active = True
+        self._ended = False
+        self._played = 0.0
+        if self._speaking_since is not None:
+            self._speaking_since = time.monotonic()
+
+    def _end_response(self):
+        """Record the full response; a later barge-in trims it"""
+        if self.writer is not None:
+            self.writer.finish_utterance()
+        self._ended = True
+        text = self._text()
+        if apply_assistant_turn(self.context, text, self.rules):
+            self._turn = self.context.conversation_history[-1]
+        if self._typical_chars:
+            self._typical_chars += RESPONSE_LENGTH_ALPHA * (len(text) - self._typical_chars)
+        else:
+            self._typical_chars = float(len(text))
+
+    def _barge_in(self, position: float):
+        self._speaking_since = None
+        start = self._sentences[0][1] if self._sentences else self._sentence_start
+        audio = max(0.0, self._end() - start) / self._unit
+        played = min(audio, max(0.0, position - start) / self._unit)
+        heard = self._heard_text(position)
+        full = self._text()
+        _barge_ins.inc()
+        _heard_share.observe(len(heard) / len(full) if full else 0.0)
+
+        if self._turn is not None:
+            # Already recorded at the end of generation; keep only what was heard
+            if len(heard) > self.rules.min_assistant_chars:
+                self._turn.content = heard
+            elif self._turn in self.context.conversation_history:
+                self.context.conversation_history.remove(self._turn)
+        else:
+            apply_assistant_turn(self.context, heard, self.rules)
+        self._turn = None
+
+        # Text the LLM produced that never reached synthesis, plus what it
+        # would typically still have generated
+        unsynthesized = max(0, self.llm.response_chars - len(full))
+        ungenerated = 0.0
+        if self.llm.generating or self.llm.response_chars == 0:
+            ungenerated = max(0.0, self._typical_chars - self.llm.response_chars)
+        tts_chars = unsynthesized + ungenerated
+        unplayed = max(0.0, audio - played) + self.tts.take_discarded_bytes() / self.tts.bytes_per_second
+        _saved.inc(round(ungenerated / CHARS_PER_TOKEN), kind="llm_tokens")
+        _saved.inc(round(tts_chars), kind="tts_chars")
+        _saved.inc(unplayed + tts_chars / SPOKEN_CHARS_PER_SECOND, kind="audio_seconds")
+        logger.info(
+            f"Barge-in on {self.context.call_sid}: heard {played:.1f}s of {audio:.1f}s, "
+            f"kept {len(heard)}/{len(full)} chars"
+        )
+
+    def _speaking_seconds(self) -> float:
+        if self._speaking_since is None:
+            return 0.0
+        return time.monotonic() - self._speaking_since
+
+    def _written(self) -> float:
+        """End of the audio received so far, in sentence span units"""
+        if self.writer is not None:
+            return float(self.writer.written)
+        return self._audio
+
+    def _position(self) -> float:
+        """How far the caller has heard, in sentence span units"""
+        if self.writer is not None:
+            return float(self.writer.played())
+        return self._played + self._speaking_seconds()
+
+    def _end(self) -> float:
+        return self._sentences[-1][2] if self._sentences else self._sentence_start
+
+    def _text(self) -> str:
+        return " ".join(text.strip() for text, _, _ in self._sentences)
+
+    def _heard_text(self, position: float) -> str:
+        heard = []
+        for text, start, end in self._sentences:
+            text = text.strip()
+            if position >= end:
+                heard.append(text)
+                continue
+            partial = heard_prefix(text, (position - start) / (end - start) if end > start else 0.0)
+            if partial:
+                heard.append(partial)
+            break
+        return " ".join(heard)
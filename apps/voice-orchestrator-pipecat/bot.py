@@ -13,22 +13,37 @@ from pipecat.frames.frames import (
     TranscriptionFrame,
     LLMMessagesFrame,
     EndFrame,
+    InputAudioRawFrame,
+    MetricsFrame,
+    ErrorFrame,
 )
+from pipecat.metrics.metrics import LLMUsageMetricsData, TTFBMetricsData, TTSUsageMetricsData
 from pipecat.pipeline.pipeline import Pipeline
 from pipecat.pipeline.runner import PipelineRunner
 from pipecat.pipeline.task import PipelineTask, PipelineParams
 from pipecat.processors.aggregators.llm_response import LLMResponseAggregator
 from pipecat.processors.aggregators.sentence import SentenceAggregator
 from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
-from pipecat.services.azure import AzureLLMService, AzureTTSService
-from pipecat.services.openai import OpenAILLMService
-from pipecat.transports.network.websocket_server import WebSocketServerTransport
-from pipecat.transports.services.daily import DailyTransport
 
 from config import settings
 from call_context import CallContext, CallState, IntentType, context_manager
 from core_api_client import api_client
+from accounting import accounting
+from audio_writer import OutboundAudioWriter, audio_writers
+from endpoint_router import Endpoint, llm_endpoints, speech_endpoints
+from sentiment_service import sentiment_service
+from task_runtime import runtime
 from prompts import get_system_prompt, get_greeting_prompt
+from conversation_rules import (
+    DEFAULT_RULES,
+    RulesConfig,
+    apply_assistant_turn,
+    apply_user_turn,
+    is_sentiment_turn,
+)
+
+# Sentiment is re-scored every few turns on every call; sampled by category
+sentiment_log = logger.bind(category="sentiment")
 
 
 class ConversationProcessor(FrameProcessor):
@@ -40,15 +55,10 @@ class ConversationProcessor(FrameProcessor):
     - Analyze sentiment
     """
     
-    def __init__(self, context: CallContext):
+    def __init__(self, context: CallContext, rules: RulesConfig = DEFAULT_RULES):
         super().__init__()
         self.context = context
-        self._emergency_keywords = [
-            "chest pain", "can't breathe", "difficulty breathing",
-            "stroke", "heart attack", "bleeding", "unconscious",
-            "not breathing", "overdose", "suicide", "kill myself",
-            "severe pain", "allergic reaction", "anaphylaxis"
-        ]
+        self.rules = rules
     
     async def process_frame(self, frame: Frame, direction: FrameDirection):
         """Process frames in the pipeline"""
@@ -58,28 +68,17 @@ class ConversationProcessor(FrameProcessor):
         if isinstance(frame, TranscriptionFrame):
             text = frame.text.strip()
             if text:
-                logger.info(f"🎤 User said: {text}")
-                self.context.add_user_message(text)
-                
-                # Check for emergency
-                if self._check_emergency(text):
-                    self.context.is_emergency = True
-                    self.context.state = CallState.ESCALATING
+                logger.debug("🎤 User said: {!r}", text)
+                if apply_user_turn(self.context, text, self.rules):
                     logger.warning(f"🚨 Emergency detected: {text}")
         
-        # Handle assistant response
+        # Handle assistant response (partial fragments are skipped)
         if isinstance(frame, TextFrame):
             text = frame.text.strip()
-            if text and len(text) > 10:  # Filter out partial responses
-                logger.info(f"🤖 Assistant: {text[:100]}...")
-                self.context.add_assistant_message(text)
+            if text and apply_assistant_turn(self.context, text, self.rules):
+                logger.debug("🤖 Assistant: {!r}", text[:100])
         
         await self.push_frame(frame, direction)
-    
-    def _check_emergency(self, text: str) -> bool:
-        """Check if text contains emergency keywords"""
-        text_lower = text.lower()
-        return any(keyword in text_lower for keyword in self._emergency_keywords)
 
 
 class SentimentAnalyzer(FrameProcessor):
@@ -87,12 +86,14 @@ class SentimentAnalyzer(FrameProcessor):
     Analyze conversation sentiment periodically
     """
     
-    def __init__(self, context: CallContext, llm_service):
+    def __init__(self, context: CallContext, llm_service, rules: RulesConfig = DEFAULT_RULES):
         super().__init__()
         self.context = context
         self.llm = llm_service
+        self.rules = rules
         self._turn_count = 0
-        self._analyze_every_n_turns = 3
+        # Cancelled with the rest of the call's background work when it ends
+        self._tasks = runtime.group(context.call_sid)
     
     async def process_frame(self, frame: Frame, direction: FrameDirection):
         await super().process_frame(frame, direction)
@@ -102,57 +103,102 @@ class SentimentAnalyzer(FrameProcessor):
             self._turn_count += 1
             
             # Analyze sentiment every N turns
-            if self._turn_count % self._analyze_every_n_turns == 0:
-                asyncio.create_task(self._analyze_sentiment())
+            if is_sentiment_turn(self._turn_count, self.rules):
+                self._tasks.spawn("sentiment", self._analyze_sentiment())
         
         await self.push_frame(frame, direction)
     
     async def _analyze_sentiment(self):
         """Run sentiment analysis in background"""
         try:
-            conversation = self.context.get_conversation_text(last_n=6)
-            if not conversation:
+            # Scored by the LLM together with other calls' pending requests
+            if not await sentiment_service.score(self.context, self.rules):
                 return
             
-            # Simple heuristic-based sentiment for now
-            # In production, use LLM for more accurate analysis
-            text_lower = conversation.lower()
-            
-            # Frustration indicators
-            frustration_words = ["frustrated", "angry", "upset", "ridiculous", 
-                               "unacceptable", "terrible", "worst", "hate", "stupid"]
-            frustration = sum(1 for word in frustration_words if word in text_lower) / 10
-            self.context.sentiment.frustration_level = min(frustration, 1.0)
-            
-            # Urgency indicators
-            urgency_words = ["urgent", "emergency", "immediately", "asap", 
-                          "right now", "can't wait", "hurry"]
-            urgency = sum(1 for word in urgency_words if word in text_lower) / 5
-            self.context.sentiment.urgency_level = min(urgency, 1.0)
-            
-            # Check if escalation needed
-            self.context.sentiment.escalation_needed = (
-                self.context.sentiment.frustration_level > 0.6 or
-                self.context.sentiment.urgency_level > 0.8 or
-                "speak to a human" in text_lower or
-                "talk to someone" in text_lower or
-                "real person" in text_lower
+            sentiment_log.debug(
+                "Sentiment: frustration={:.2f}, urgency={:.2f}, escalate={}",
+                self.context.sentiment.frustration_level,
+                self.context.sentiment.urgency_level,
+                self.context.sentiment.escalation_needed,
             )
             
-            logger.debug(f"Sentiment: frustration={self.context.sentiment.frustration_level:.2f}, "
-                        f"urgency={self.context.sentiment.urgency_level:.2f}, "
-                        f"escalate={self.context.sentiment.escalation_needed}")
-            
         except Exception as e:
             logger.error(f"Sentiment analysis error: {e}")
 
 
+class UsageCollector(FrameProcessor):
+    """
+    Feed the pipeline's usage metrics and the caller's audio duration
+    (what streaming STT bills for) into usage accounting
+    """
+    
+    def __init__(self, context: CallContext):
+        super().__init__()
+        self.context = context
+    
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+        
+        if isinstance(frame, InputAudioRawFrame):
+            bytes_per_second = frame.sample_rate * frame.num_channels * 2  # 16-bit PCM
+            if bytes_per_second:
+                accounting.record_stt(self.context, len(frame.audio) / bytes_per_second)
+        elif isinstance(frame, MetricsFrame):
+            for data in frame.data:
+                if isinstance(data, LLMUsageMetricsData):
+                    accounting.record_llm(
+                        self.context,
+                        prompt_tokens=data.value.prompt_tokens,
+                        completion_tokens=data.value.completion_tokens,
+                        cached_tokens=getattr(data.value, "cache_read_input_tokens", None) or 0,
+                    )
+                elif isinstance(data, TTSUsageMetricsData):
+                    accounting.record_tts(self.context, data.value)
+        
+        await self.push_frame(frame, direction)
+
+
+class SpeechEndpointMonitor(FrameProcessor):
+    """
+    Report the TTS service's time to first byte, and its errors, to the
+    speech endpoint router. Metrics travel downstream and errors upstream,
+    so one instance sits on each side of the TTS service; only the one
+    above it (`record_errors=True`) counts errors, so each is counted once.
+    """
+    
+    def __init__(self, endpoint: Endpoint, tts_name: str, record_errors: bool = False):
+        super().__init__()
+        self.endpoint = endpoint
+        self.tts_name = tts_name
+        self.record_errors = record_errors
+    
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+        
+        if isinstance(frame, MetricsFrame):
+            for data in frame.data:
+                if isinstance(data, TTFBMetricsData) and data.processor == self.tts_name:
+                    speech_endpoints.record(self.endpoint, data.value, ok=True)
+        elif (
+            self.record_errors
+            and isinstance(frame, ErrorFrame)
+            and direction == FrameDirection.UPSTREAM
+            # ErrorFrame has no source field; pipecat's TTS errors start with the service name
+            and frame.error.startswith(self.tts_name)
+        ):
+            speech_endpoints.record(self.endpoint, 0.0, ok=False)
+        
+        await self.push_frame(frame, direction)
+
+
 async def create_bot_pipeline(
     context: CallContext,
     transport,
+    writer: Optional[OutboundAudioWriter] = None,
 ) -> Pipeline:
     """
-    Create the Pipecat pipeline for voice conversation
+    Create the Pipecat pipeline for voice conversation. With a media stream
+    writer, the bot's speech goes to the caller through it.
     """
     
     # Load hospital data
@@ -168,27 +214,35 @@ async def create_bot_pipeline(
     system_prompt = get_system_prompt(
         hospital_name=context.hospital_name,
         intents=context.intents,
-        departments=context.departments
+        departments=context.departments,
+        caller_name=context.caller_name,
+        caller_summary=context.caller_summary,
     )
     
     # Initial greeting
     greeting = get_greeting_prompt(context.hospital_name)
     
-    # Initialize Azure OpenAI LLM
-    llm = OpenAILLMService(
-        api_key=settings.azure_openai_key,
-        base_url=f"{settings.azure_openai_endpoint}/openai/deployments/{settings.azure_openai_deployment}",
+    # Service SDKs are imported here rather than at module load so the
+    # console test bot and cold starts don't pay for them
+    from barge_in import BargeInController, InterruptibleAzureTTSService, InterruptibleOpenAILLMService
+    
+    # Initialize Azure OpenAI LLM on the best endpoint at call start
+    llm_endpoint = llm_endpoints.choose()
+    llm = InterruptibleOpenAILLMService(
+        api_key=llm_endpoint.key,
+        base_url=f"{llm_endpoint.target}/openai/deployments/{settings.azure_openai_deployment}",
         model=settings.azure_openai_deployment,
         params={
-            "extra_headers": {"api-key": settings.azure_openai_key},
+            "extra_headers": {"api-key": llm_endpoint.key},
             "extra_query": {"api-version": settings.azure_openai_api_version}
         }
     )
     
-    # Initialize Azure TTS
-    tts = AzureTTSService(
-        api_key=settings.azure_speech_key,
-        region=settings.azure_speech_region,
+    # Initialize Azure TTS in the best speech region
+    speech_endpoint = speech_endpoints.choose()
+    tts = InterruptibleAzureTTSService(
+        api_key=speech_endpoint.key,
+        region=speech_endpoint.target,
         voice=settings.tts_voice,
     )
     
@@ -196,6 +250,8 @@ async def create_bot_pipeline(
     conversation_processor = ConversationProcessor(context)
     sentiment_analyzer = SentimentAnalyzer(context, llm)
     sentence_aggregator = SentenceAggregator()
+    usage_collector = UsageCollector(context)
+    barge_in = BargeInController(context, llm, tts, writer=writer)
     llm_response_aggregator = LLMResponseAggregator()
     
     # Initial messages for LLM
@@ -211,7 +267,11 @@ async def create_bot_pipeline(
         sentiment_analyzer,           # Analyze sentiment
         llm,                          # Generate response
         sentence_aggregator,          # Aggregate sentences
+        SpeechEndpointMonitor(speech_endpoint, tts.name, record_errors=True),  # TTS errors
         tts,                          # Convert to speech
+        SpeechEndpointMonitor(speech_endpoint, tts.name),  # TTS latency
+        barge_in,                     # Cancel and trim on caller barge-in; feeds the media stream
+        usage_collector,              # Token, character and audio usage
         transport.output(),           # Audio to caller
     ])
     
@@ -240,6 +300,8 @@ async def run_bot(
     context.state = CallState.GREETING
     
     try:
+        from pipecat.transports.network.websocket_server import WebSocketServerTransport
+        
         # For now, we'll use a simple WebSocket transport
         # In production, use Twilio's Media Streams or Daily.co
         transport = WebSocketServerTransport(
@@ -247,7 +309,9 @@ async def run_bot(
             port=settings.port + 1,  # Separate port for WebSocket
         )
         
-        pipeline, initial_messages = await create_bot_pipeline(context, transport)
+        pipeline, initial_messages = await create_bot_pipeline(
+            context, transport, writer=audio_writers.get(call_sid)
+        )
         
         # Create and run pipeline task
         task = PipelineTask(
@@ -255,6 +319,7 @@ async def run_bot(
             params=PipelineParams(
                 allow_interruptions=True,  # Allow barge-in
                 enable_metrics=True,
+                enable_usage_metrics=True,
             )
         )
         
@@ -274,6 +339,8 @@ async def run_bot(
     finally:
         context.state = CallState.COMPLETED
         context.ended_at = datetime.now()
+        accounting.end_call(call_sid)
+        runtime.close_group(call_sid)
         logger.info(f"🏁 Call {call_sid} completed")
 
 
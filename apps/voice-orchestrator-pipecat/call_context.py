@@ -1,7 +1,7 @@
 """
 Call context management for tracking conversation state
 """
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 from enum import Enum
@@ -75,6 +75,7 @@ class CallContext:
     # Caller info
     caller_phone: str = ""
     caller_name: Optional[str] = None
+    caller_summary: Optional[str] = None  # From caller_cache, for returning callers
     
     # Hospital info
     hospital_id: str = ""
@@ -96,11 +97,17 @@ class CallContext:
     # Configuration loaded from DB
     intents: List[Dict[str, Any]] = field(default_factory=list)
     departments: List[Dict[str, Any]] = field(default_factory=list)
-    workflow: Optional[Dict[str, Any]] = None
+    workflow: Optional[Dict[str, Any]] = None  # Published workflow version
+    
+    # Workflow position (see workflow_engine)
+    workflow_node_id: Optional[str] = None
+    workflow_node_turns: int = 0
     
     # Timestamps
     started_at: datetime = field(default_factory=datetime.now)
     ended_at: Optional[datetime] = None
+    # Epoch time the webhook path's current <Gather> began listening
+    listening_since: Optional[float] = None
     
     # Escalation
     escalation_reason: Optional[str] = None
@@ -152,10 +159,84 @@ class CallContext:
             for key in required
         )
     
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Compact, JSON-safe snapshot for handing a live call to another
+        process. Hospital config and the workflow graph are left out; only
+        the workflow id is kept and they are reloaded on restore.
+        """
+        return {
+            "call_sid": self.call_sid,
+            "stream_sid": self.stream_sid,
+            "call_id": self.call_id,
+            "caller_phone": self.caller_phone,
+            "caller_name": self.caller_name,
+            "caller_summary": self.caller_summary,
+            "hospital_id": self.hospital_id,
+            "hospital_name": self.hospital_name,
+            "to_phone": self.to_phone,
+            "state": self.state.value,
+            "detected_intent": self.detected_intent.value if self.detected_intent else None,
+            "is_emergency": self.is_emergency,
+            "history": [
+                [turn.role, turn.content, turn.timestamp.isoformat(), turn.intent, turn.sentiment]
+                for turn in self.conversation_history
+            ],
+            "fields": [
+                [f.key, f.value, f.confirmed] for f in self.collected_fields.values()
+            ],
+            "sentiment": asdict(self.sentiment),
+            "workflow_id": (self.workflow or {}).get("workflowId"),
+            "workflow_node_id": self.workflow_node_id,
+            "workflow_node_turns": self.workflow_node_turns,
+            "started_at": self.started_at.isoformat(),
+            "escalation_reason": self.escalation_reason,
+            "transfer_target": self.transfer_target,
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CallContext":
+        """Rebuild a context from to_dict(); config and workflow are reloaded separately"""
+        context = cls(
+            call_sid=data["call_sid"],
+            stream_sid=data.get("stream_sid"),
+            call_id=data.get("call_id"),
+            caller_phone=data.get("caller_phone", ""),
+            caller_name=data.get("caller_name"),
+            caller_summary=data.get("caller_summary"),
+            hospital_id=data.get("hospital_id", ""),
+            hospital_name=data.get("hospital_name", "Wardline Medical Center"),
+            to_phone=data.get("to_phone", ""),
+            state=CallState(data.get("state", CallState.LISTENING.value)),
+            detected_intent=IntentType(data["detected_intent"]) if data.get("detected_intent") else None,
+            is_emergency=data.get("is_emergency", False),
+            sentiment=SentimentData(**data.get("sentiment", {})),
+            workflow_node_id=data.get("workflow_node_id"),
+            workflow_node_turns=data.get("workflow_node_turns", 0),
+            started_at=datetime.fromisoformat(data["started_at"]),
+            escalation_reason=data.get("escalation_reason"),
+            transfer_target=data.get("transfer_target"),
+        )
+        context.conversation_history = [
+            ConversationTurn(
+                role=role,
+                content=content,
+                timestamp=datetime.fromisoformat(timestamp),
+                intent=intent,
+                sentiment=sentiment,
+            )
+            for role, content, timestamp, intent, sentiment in data.get("history", [])
+        ]
+        for key, value, confirmed in data.get("fields", []):
+            context.collect_field(key, value, confirmed)
+        return context
+    
     def should_escalate(self) -> bool:
         """Determine if call should be escalated to human"""
         if self.is_emergency:
             return True
+        if self.state == CallState.ESCALATING:
+            return True
         if self.sentiment.escalation_needed:
             return True
         if self.sentiment.frustration_level > 0.7:
@@ -189,6 +270,10 @@ class CallContextManager:
     def get_all_active(self) -> List[CallContext]:
         """Get all active call contexts"""
         return list(self._contexts.values())
+    
+    def restore_context(self, context: CallContext):
+        """Register a context handed over from another process"""
+        self._contexts.setdefault(context.call_sid, context)
 
 
 # Global context manager
@@ -0,0 +1,191 @@
+"""
+Live call-state event stream to core-api
+
+Publishes each call's state, emergency flag, intent and sentiment to the
+core-api socket.io gateway, which relays them to the live dashboards.
+
+Every window (CALL_EVENTS_WINDOW_SECONDS) the active calls are compared
+against what was last acknowledged. Each call that changed contributes one
+event carrying its latest values, and a call that went away contributes an
+`ended` event. All of them go out as one batch over a single persistent
+connection.
+
+Changes are coalesced per call, so a call that changes many times within a
+window still sends one event. Only one batch is in flight at a time. While
+core-api is slow or unreachable, changes keep coalescing into the call's
+current state rather than queueing, and a reconnect resends every call.
+"""
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+from loguru import logger
+
+import socketio
+
+from config import settings
+from call_context import CallContext, context_manager
+from metrics import metrics
+
+
+_events = metrics.counter("call_events_sent_total", "Call-state events acknowledged by core-api")
+_batches = metrics.counter("call_events_batches_total", "Call-state event batches by outcome")
+_batch_seconds = metrics.histogram(
+    "call_events_batch_seconds", "Time from sending a call-state batch to its ack"
+)
+
+# Comparable view of everything the dashboards show for a call
+CallView = Tuple[Any, ...]
+
+
+def _view(context: CallContext) -> CallView:
+    sentiment = context.sentiment
+    return (
+        context.state.value,
+        context.is_emergency,
+        context.detected_intent.value if context.detected_intent else None,
+        round(sentiment.frustration_level, 2),
+        round(sentiment.urgency_level, 2),
+        sentiment.escalation_needed,
+        context.escalation_reason,
+        context.workflow_node_id,
+    )
+
+
+def _event(context: CallContext, view: CallView, previous: Optional[CallView]) -> Dict[str, Any]:
+    state, is_emergency, intent, frustration, urgency, escalation_needed, reason, node_id = view
+    return {
+        "callSid": context.call_sid,
+        "callId": context.call_id,
+        "hospitalId": context.hospital_id,
+        "state": state,
+        "isEmergency": is_emergency,
+        # Set once, when the flag flips, so core-api raises one alert
+        "emergencyRaised": is_emergency and not (previous and previous[1]),
+        "intent": intent,
+        "sentiment": {
+            "frustration": frustration,
+            "urgency": urgency,
+            "escalationNeeded": escalation_needed,
+        },
+        "escalationReason": reason,
+        "workflowNodeId": node_id,
+        "ended": False,
+    }
+
+
+class CallEventStream:
+    """Diffs call state on a short window and ships changes in batches"""
+
+    def __init__(self):
+        self._sio = socketio.AsyncClient(reconnection=True, logger=False)
+        self._sio.on("connect", self._on_connect)
+        self._sio.on("disconnect", self._on_disconnect)
+        # call_sid -> (hospital_id, call_id, last acknowledged view)
+        self._sent: Dict[str, Tuple[str, Optional[str], CallView]] = {}
+        # Calls to resend even if unchanged
+        self._stale: Set[str] = set()
+
+    async def _on_connect(self):
+        logger.info("Call event stream connected to core-api")
+        # Dashboards may have missed changes while we were away
+        self._stale = set(self._sent)
+
+    async def _on_disconnect(self):
+        logger.warning("Call event stream disconnected from core-api")
+
+    async def run(self):
+        """Connect and publish until cancelled"""
+        if not settings.internal_api_token:
+            # The gateway only accepts orchestrators that present the shared token
+            logger.info("ORCHESTRATOR_INTERNAL_TOKEN not set; call event stream disabled")
+            return
+        try:
+            await self._connect()
+            while True:
+                await asyncio.sleep(settings.call_events_window_seconds)
+                if self._sio.connected:
+                    await self._publish()
+        finally:
+            if self._sio.connected:
+                await self._sio.disconnect()
+
+    async def _connect(self):
+        """First connection; the client reconnects on its own after that"""
+        delay = 1.0
+        while True:
+            try:
+                await self._sio.connect(
+                    settings.core_api_url,
+                    auth={"orchestratorToken": settings.internal_api_token},
+                    transports=["websocket"],
+                    wait_timeout=settings.core_api_timeout_seconds,
+                )
+                return
+            except socketio.exceptions.ConnectionError as e:
+                logger.warning(f"Call event stream can't reach core-api ({e}); retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+
+    def _collect(self) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Events for calls that changed since their last ack, capped at one
+        batch; returns the events and the entries to record once acked.
+        """
+        events, pending = [], {}
+        active = set()
+        for context in context_manager.get_all_active():
+            active.add(context.call_sid)
+            view = _view(context)
+            sent = self._sent.get(context.call_sid)
+            previous = sent[2] if sent else None
+            if view == previous and context.call_sid not in self._stale:
+                continue
+            if len(events) >= settings.call_events_max_batch:
+                return events, pending
+            events.append(_event(context, view, previous))
+            pending[context.call_sid] = (context.hospital_id, context.call_id, view)
+        for call_sid, (hospital_id, call_id, _) in self._sent.items():
+            if call_sid in active:
+                continue
+            if len(events) >= settings.call_events_max_batch:
+                break
+            events.append({
+                "callSid": call_sid,
+                "callId": call_id,
+                "hospitalId": hospital_id,
+                "ended": True,
+            })
+            pending[call_sid] = None
+        return events, pending
+
+    async def _publish(self):
+        events, pending = self._collect()
+        if not events:
+            return
+        started = time.monotonic()
+        try:
+            ack = await self._sio.call(
+                "calls:events",
+                {"worker": settings.worker_id, "events": events},
+                timeout=settings.call_events_ack_timeout_seconds,
+            )
+        except socketio.exceptions.SocketIOError as e:
+            ack = {"error": str(e) or type(e).__name__}
+        if not (isinstance(ack, dict) and ack.get("success")):
+            # Nothing is marked sent, so the next window retries with fresher state
+            _batches.inc(outcome="failed")
+            logger.warning(f"Call event batch of {len(events)} not acknowledged: {ack}")
+            return
+        _batch_seconds.observe(time.monotonic() - started)
+        _batches.inc(outcome="acked")
+        _events.inc(len(events))
+        for call_sid, entry in pending.items():
+            self._stale.discard(call_sid)
+            if entry is None:
+                self._sent.pop(call_sid, None)
+            else:
+                self._sent[call_sid] = entry
+
+
+# Global call event stream
+call_events = CallEventStream()
@@ -0,0 +1,140 @@
+"""
+Caller recognition cache
+
+Remembers a repeat caller's name, last intent and a short summary per
+hospital so the assistant doesn't re-collect them every call. Entries are
+keyed by a salted hash of the caller's phone number, bounded in size (LRU)
+and hard-expire a fixed time after the caller's name was last confirmed.
+Raw utterances and unconfirmed names are never stored; workflows read a
+collected name back to the caller and mark it confirmed on a yes.
+
+The cache is per process. The dispatcher routes each caller's webhooks by
+their number, so a repeat caller reaches the worker that remembers them.
+"""
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from loguru import logger
+
+from config import settings
+from call_context import CallContext
+
+
+# Collected field keys that may hold the caller's name
+NAME_FIELDS = ("name", "patient_name", "full_name", "caller_name")
+
+MAX_SUMMARY_CHARS = 200
+
+
+@dataclass
+class CallerProfile:
+    """What we remember about a caller between calls"""
+    name: Optional[str]
+    last_intent: Optional[str]
+    summary: str
+    written_at: float
+
+
+class CallerCache:
+    """Bounded LRU cache of caller profiles with absolute TTL expiry"""
+
+    def __init__(self):
+        self._max_entries = settings.caller_cache_max_entries
+        self._ttl = settings.caller_cache_ttl_seconds
+        # Salted so keys can't be reversed into phone numbers
+        self._salt = settings.caller_cache_salt.encode() or os.urandom(16)
+        self._entries: "OrderedDict[Tuple[str, str], CallerProfile]" = OrderedDict()
+
+    def _key(self, hospital_id: str, caller_phone: str) -> Tuple[str, str]:
+        digits = ''.join(filter(str.isdigit, caller_phone))[-10:]
+        digest = hashlib.sha256(self._salt + digits.encode()).hexdigest()
+        return hospital_id, digest
+
+    def lookup(self, hospital_id: str, caller_phone: str) -> Optional[CallerProfile]:
+        """Get a caller's profile if present and not expired"""
+        if not hospital_id or not caller_phone:
+            return None
+        key = self._key(hospital_id, caller_phone)
+        profile = self._entries.get(key)
+        if profile is None:
+            return None
+        if time.monotonic() - profile.written_at >= self._ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return profile
+
+    def remember(self, context: CallContext):
+        """
+        Store what this call learned about the caller. Only a confirmed name
+        is stored, and only a newly collected name restarts the entry's TTL,
+        so frequent callers still expire and an unverified name isn't
+        carried from call to call.
+        """
+        if not context.hospital_id or not context.caller_phone:
+            return
+        name = None
+        for field_key in NAME_FIELDS:
+            collected = context.collected_fields.get(field_key)
+            if collected and collected.confirmed and collected.value:
+                name = str(collected.value)
+                break
+        intent = context.detected_intent.value if context.detected_intent else None
+
+        key = self._key(context.hospital_id, context.caller_phone)
+        previous = self._entries.get(key)
+        if previous and time.monotonic() - previous.written_at >= self._ttl:
+            previous = None
+        written_at = time.monotonic()
+        if name is None and previous:
+            name, written_at = previous.name, previous.written_at
+        if not name and not intent:
+            return
+
+        self._entries[key] = CallerProfile(
+            name=name,
+            last_intent=intent,
+            summary=summarize_call(context),
+            written_at=written_at,
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def forget(self, hospital_id: str, caller_phone: str):
+        """Drop a caller's profile (e.g. on request)"""
+        self._entries.pop(self._key(hospital_id, caller_phone), None)
+
+    def purge_expired(self) -> int:
+        """Remove every expired entry; returns how many were dropped"""
+        cutoff = time.monotonic() - self._ttl
+        expired = [k for k, p in self._entries.items() if p.written_at <= cutoff]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            logger.debug(f"Purged {len(expired)} expired caller profiles")
+        return len(expired)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def summarize_call(context: CallContext) -> str:
+    """Short, non-verbatim summary of how a call went"""
+    parts = []
+    if context.detected_intent:
+        parts.append(f"called about {context.detected_intent.value}")
+    if context.escalation_reason or context.is_emergency:
+        parts.append("was escalated to staff")
+    elif context.transfer_target:
+        parts.append("was transferred")
+    if context.started_at:
+        parts.append(f"on {context.started_at.strftime('%b %d')}")
+    return ("Last call: " + ", ".join(parts))[:MAX_SUMMARY_CHARS] if parts else ""
+
+
+# Global caller cache
+caller_cache = CallerCache()
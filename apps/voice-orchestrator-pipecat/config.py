@@ -25,16 +25,159 @@ class Settings(BaseSettings):
     # Azure Speech (STT/TTS)
     azure_speech_key: str = Field(..., env="AZURE_SPEECH_KEY")
     azure_speech_region: str = Field(default="eastus2", env="AZURE_SPEECH_REGION")
+    # Several regions, "region|key,region|key" (key defaults to AZURE_SPEECH_KEY)
+    azure_speech_regions: str = Field(default="", env="AZURE_SPEECH_REGIONS")
     
     # Azure OpenAI
     azure_openai_key: str = Field(..., env="AZURE_OPENAI_KEY")
     azure_openai_endpoint: str = Field(..., env="AZURE_OPENAI_ENDPOINT")
+    # Several endpoints, "url|key,url|key" (key defaults to AZURE_OPENAI_KEY)
+    azure_openai_endpoints: str = Field(default="", env="AZURE_OPENAI_ENDPOINTS")
     azure_openai_deployment: str = Field(default="o4-mini", env="AZURE_OPENAI_DEPLOYMENT")
     azure_openai_api_version: str = Field(default="2024-12-01-preview", env="AZURE_OPENAI_API_VERSION")
     
     # Core API
     core_api_url: str = Field(default="http://localhost:3001", env="CORE_API_BASE_URL")
     
+    # Workflow engine
+    workflow_refresh_seconds: float = Field(default=300.0, env="WORKFLOW_REFRESH_SECONDS")
+    # Hosts webhook/integration nodes may post collected fields to over HTTPS,
+    # comma separated; paths starting with "/" always go to core-api
+    workflow_webhook_hosts: str = Field(default="", env="WORKFLOW_WEBHOOK_HOSTS")
+    workflow_webhook_timeout_seconds: float = Field(default=5.0, env="WORKFLOW_WEBHOOK_TIMEOUT_SECONDS")
+    
+    # Insurance carrier index
+    insurance_index_ttl_seconds: float = Field(default=900.0, env="INSURANCE_INDEX_TTL_SECONDS")
+    insurance_match_threshold: float = Field(default=0.7, env="INSURANCE_MATCH_THRESHOLD")
+    
+    # Caller recognition cache (PHI: keep bounded and short-lived)
+    caller_cache_max_entries: int = Field(default=5000, env="CALLER_CACHE_MAX_ENTRIES")
+    caller_cache_ttl_seconds: float = Field(default=86400.0, env="CALLER_CACHE_TTL_SECONDS")
+    # Salt for the cache's phone number hashes; the dispatcher shares one with
+    # its workers when unset (a lone server uses a random one per process)
+    caller_cache_salt: str = Field(default="", env="CALLER_CACHE_SALT")
+    
+    # Admission control / load shedding
+    max_concurrent_calls: int = Field(default=200, env="MAX_CONCURRENT_CALLS")
+    max_concurrent_llm_requests: int = Field(default=50, env="MAX_CONCURRENT_LLM_REQUESTS")
+    llm_target_latency_seconds: float = Field(default=2.5, env="LLM_TARGET_LATENCY_SECONDS")
+    turn_target_latency_seconds: float = Field(default=4.0, env="TURN_TARGET_LATENCY_SECONDS")
+    llm_queue_timeout_seconds: float = Field(default=1.0, env="LLM_QUEUE_TIMEOUT_SECONDS")
+    overflow_transfer_number: str = Field(default="", env="OVERFLOW_TRANSFER_NUMBER")
+    # A call slot with no webhook or media activity for this long is reclaimed
+    call_slot_idle_seconds: float = Field(default=1800.0, env="CALL_SLOT_IDLE_SECONDS")
+    
+    # Resilience: deadlines, circuit breakers, hedging
+    turn_deadline_seconds: float = Field(default=10.0, env="TURN_DEADLINE_SECONDS")
+    core_api_timeout_seconds: float = Field(default=5.0, env="CORE_API_TIMEOUT_SECONDS")
+    llm_timeout_seconds: float = Field(default=8.0, env="LLM_TIMEOUT_SECONDS")
+    breaker_failure_threshold: int = Field(default=5, env="BREAKER_FAILURE_THRESHOLD")
+    breaker_reset_seconds: float = Field(default=15.0, env="BREAKER_RESET_SECONDS")
+    llm_hedging_enabled: bool = Field(default=False, env="LLM_HEDGING_ENABLED")
+    
+    # Per-turn model tiers (see model_tiers); empty deployments use AZURE_OPENAI_DEPLOYMENT
+    llm_tiering_enabled: bool = Field(default=True, env="LLM_TIERING_ENABLED")
+    llm_max_completion_tokens: int = Field(default=100, env="LLM_MAX_COMPLETION_TOKENS")
+    llm_fast_deployment: str = Field(default="", env="LLM_FAST_DEPLOYMENT")
+    llm_fast_max_completion_tokens: int = Field(default=60, env="LLM_FAST_MAX_COMPLETION_TOKENS")
+    llm_strong_deployment: str = Field(default="", env="LLM_STRONG_DEPLOYMENT")
+    llm_strong_max_completion_tokens: int = Field(default=250, env="LLM_STRONG_MAX_COMPLETION_TOKENS")
+    # Caller frustration at which turns go to the strong tier
+    llm_strong_frustration: float = Field(default=0.6, env="LLM_STRONG_FRUSTRATION")
+    
+    # Hospital config snapshots
+    config_snapshot_dir: str = Field(default="data/config_snapshots", env="CONFIG_SNAPSHOT_DIR")
+    config_snapshot_max_age_seconds: float = Field(default=300.0, env="CONFIG_SNAPSHOT_MAX_AGE_SECONDS")
+    # Shared secret core-api sends as a bearer token on /internal/* requests
+    internal_api_token: str = Field(default="", env="ORCHESTRATOR_INTERNAL_TOKEN")
+    
+    # Logging (sinks are queued and written off the event loop)
+    log_level: str = Field(default="DEBUG", env="LOG_LEVEL")
+    log_file: str = Field(default="logs/voice_orchestrator.log", env="LOG_FILE")
+    log_file_level: str = Field(default="DEBUG", env="LOG_FILE_LEVEL")
+    log_retention_days: int = Field(default=7, env="LOG_RETENTION_DAYS")
+    log_queue_size: int = Field(default=10000, env="LOG_QUEUE_SIZE")
+    log_batch_size: int = Field(default=256, env="LOG_BATCH_SIZE")
+    log_flush_interval_seconds: float = Field(default=0.5, env="LOG_FLUSH_INTERVAL_SECONDS")
+    # Fraction of records kept per high-volume category
+    log_sample_rates: str = Field(default="media=0.01,sentiment=0.1", env="LOG_SAMPLE_RATES")
+    
+    # Graceful drain and call handoff between processes
+    drain_timeout_seconds: float = Field(default=20.0, env="DRAIN_TIMEOUT_SECONDS")
+    call_snapshot_dir: str = Field(default="data/active_calls", env="CALL_SNAPSHOT_DIR")
+    call_snapshot_max_age_seconds: float = Field(default=300.0, env="CALL_SNAPSHOT_MAX_AGE_SECONDS")
+    
+    # Multi-process mode (dispatcher.py); 0 workers means one per CPU
+    orchestrator_workers: int = Field(default=0, env="ORCHESTRATOR_WORKERS")
+    worker_base_port: int = Field(default=3100, env="WORKER_BASE_PORT")
+    # Set by the dispatcher on each worker it starts
+    worker_id: str = Field(default="", env="ORCHESTRATOR_WORKER_ID")
+    
+    # Weighted fair LLM scheduling across hospitals (0 disables a budget).
+    # Budgets are opt-in: set them from the deployment's real TPM quota
+    llm_tokens_per_minute: int = Field(default=0, env="LLM_TOKENS_PER_MINUTE")
+    llm_hospital_tokens_per_minute: int = Field(default=0, env="LLM_HOSPITAL_TOKENS_PER_MINUTE")
+    # Tokens a typical call uses per minute; caps admitted calls at what the budget can serve
+    llm_call_tokens_per_minute: int = Field(default=2000, env="LLM_CALL_TOKENS_PER_MINUTE")
+    # "hospitalId=2,otherId=0.5"; unlisted hospitals weigh 1
+    llm_hospital_weights: str = Field(default="", env="LLM_HOSPITAL_WEIGHTS")
+    # Share of the deployment quota only emergency/escalation turns may use
+    llm_priority_reserve_fraction: float = Field(default=0.1, env="LLM_PRIORITY_RESERVE_FRACTION")
+    
+    # Usage accounting (rollups appended to USAGE_FILE; prices in USD)
+    usage_file: str = Field(default="logs/usage.jsonl", env="USAGE_FILE")
+    usage_flush_interval_seconds: float = Field(default=60.0, env="USAGE_FLUSH_INTERVAL_SECONDS")
+    price_prompt_per_million_tokens: float = Field(default=0.15, env="PRICE_PROMPT_PER_MILLION_TOKENS")
+    price_cached_per_million_tokens: float = Field(default=0.075, env="PRICE_CACHED_PER_MILLION_TOKENS")
+    price_completion_per_million_tokens: float = Field(default=0.60, env="PRICE_COMPLETION_PER_MILLION_TOKENS")
+    price_tts_per_million_chars: float = Field(default=15.0, env="PRICE_TTS_PER_MILLION_CHARS")
+    price_stt_per_hour: float = Field(default=1.0, env="PRICE_STT_PER_HOUR")
+    
+    # Live call-state events to the core-api socket.io gateway
+    call_events_window_seconds: float = Field(default=0.25, env="CALL_EVENTS_WINDOW_SECONDS")
+    call_events_max_batch: int = Field(default=500, env="CALL_EVENTS_MAX_BATCH")
+    call_events_ack_timeout_seconds: float = Field(default=5.0, env="CALL_EVENTS_ACK_TIMEOUT_SECONDS")
+    
+    # Micro-batched LLM sentiment (falls back to keyword heuristics)
+    sentiment_llm_enabled: bool = Field(default=True, env="SENTIMENT_LLM_ENABLED")
+    sentiment_batch_size: int = Field(default=16, env="SENTIMENT_BATCH_SIZE")
+    sentiment_batch_max_wait_seconds: float = Field(default=0.5, env="SENTIMENT_BATCH_MAX_WAIT_SECONDS")
+    sentiment_max_concurrent_batches: int = Field(default=2, env="SENTIMENT_MAX_CONCURRENT_BATCHES")
+    sentiment_timeout_seconds: float = Field(default=10.0, env="SENTIMENT_TIMEOUT_SECONDS")
+    
+    # Supervised background work (see task_runtime)
+    background_max_concurrent: int = Field(default=64, env="BACKGROUND_MAX_CONCURRENT")
+    background_max_queued: int = Field(default=1000, env="BACKGROUND_MAX_QUEUED")
+    background_thread_workers: int = Field(default=4, env="BACKGROUND_THREAD_WORKERS")
+    # 0 runs process-pool work on the thread pool instead
+    background_process_workers: int = Field(default=0, env="BACKGROUND_PROCESS_WORKERS")
+    
+    # Latency-aware routing across Azure endpoints/regions
+    endpoint_ewma_alpha: float = Field(default=0.2, env="ENDPOINT_EWMA_ALPHA")
+    endpoint_failure_threshold: int = Field(default=3, env="ENDPOINT_FAILURE_THRESHOLD")
+    endpoint_cooldown_seconds: float = Field(default=30.0, env="ENDPOINT_COOLDOWN_SECONDS")
+    endpoint_explore_fraction: float = Field(default=0.05, env="ENDPOINT_EXPLORE_FRACTION")
+    endpoint_failover_attempts: int = Field(default=2, env="ENDPOINT_FAILOVER_ATTEMPTS")
+    
+    # Outbound media stream audio (20 ms frames per message, lead kept at Twilio)
+    media_frames_per_message: int = Field(default=5, env="MEDIA_FRAMES_PER_MESSAGE")
+    media_max_lead_ms: int = Field(default=300, env="MEDIA_MAX_LEAD_MS")
+    media_mark_interval_ms: int = Field(default=200, env="MEDIA_MARK_INTERVAL_MS")
+    
+    # Twilio webhook retries answered from the original result
+    webhook_idempotency_ttl_seconds: float = Field(default=300.0, env="WEBHOOK_IDEMPOTENCY_TTL_SECONDS")
+    webhook_idempotency_max_entries: int = Field(default=10000, env="WEBHOOK_IDEMPOTENCY_MAX_ENTRIES")
+    
+    # Runtime introspection (/debug/runtime)
+    loop_lag_interval_seconds: float = Field(default=0.5, env="LOOP_LAG_INTERVAL_SECONDS")
+    tracemalloc_frames: int = Field(default=1, env="TRACEMALLOC_FRAMES")
+    
+    # Startup warmup (/ready turns true once core-api and hospital config have loaded)
+    warmup_timeout_seconds: float = Field(default=20.0, env="WARMUP_TIMEOUT_SECONDS")
+    warmup_retry_seconds: float = Field(default=5.0, env="WARMUP_RETRY_SECONDS")
+    # Share of hospitals whose config must refresh before /ready; the rest retry in the background
+    warmup_min_hospital_ratio: float = Field(default=0.9, env="WARMUP_MIN_HOSPITAL_RATIO")
+    
     # Webhook URL (ngrok for local dev)
     webhook_base_url: str = Field(default="", env="WEBHOOK_BASE_URL")
     
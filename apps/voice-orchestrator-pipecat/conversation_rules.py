@@ -0,0 +1,107 @@
+"""
+Conversation rules shared by the live pipeline and offline replay
+
+Emergency detection and heuristic sentiment scoring, free of pipecat,
+audio and network, so bot.py's processors and replay.py apply exactly the
+same logic to a CallContext.
+"""
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, List
+
+from call_context import CallContext, CallState
+
+
+@dataclass
+class RulesConfig:
+    """Tunable keywords and thresholds; replay compares two of these"""
+    emergency_keywords: List[str] = field(default_factory=lambda: [
+        "chest pain", "can't breathe", "difficulty breathing",
+        "stroke", "heart attack", "bleeding", "unconscious",
+        "not breathing", "overdose", "suicide", "kill myself",
+        "severe pain", "allergic reaction", "anaphylaxis",
+    ])
+    frustration_words: List[str] = field(default_factory=lambda: [
+        "frustrated", "angry", "upset", "ridiculous",
+        "unacceptable", "terrible", "worst", "hate", "stupid",
+    ])
+    urgency_words: List[str] = field(default_factory=lambda: [
+        "urgent", "emergency", "immediately", "asap",
+        "right now", "can't wait", "hurry",
+    ])
+    human_request_phrases: List[str] = field(default_factory=lambda: [
+        "speak to a human", "talk to someone", "real person",
+    ])
+    # Each matched word adds 1/divisor to the score
+    frustration_divisor: float = 10.0
+    urgency_divisor: float = 5.0
+    frustration_threshold: float = 0.6
+    urgency_threshold: float = 0.8
+    analyze_every_n_turns: int = 3
+    sentiment_window_turns: int = 6
+    # Shorter assistant text frames are partial responses
+    min_assistant_chars: int = 10
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RulesConfig":
+        """Build from a JSON object; unknown keys are rejected so typos don't pass silently"""
+        known = {f.name for f in fields(cls)}
+        unknown = set(data) - known
+        if unknown:
+            raise ValueError(f"Unknown rules config keys: {', '.join(sorted(unknown))}")
+        return cls(**data)
+
+
+DEFAULT_RULES = RulesConfig()
+
+
+def is_emergency(text: str, rules: RulesConfig = DEFAULT_RULES) -> bool:
+    """Check if text contains emergency keywords"""
+    text_lower = text.lower()
+    return any(keyword in text_lower for keyword in rules.emergency_keywords)
+
+
+def apply_user_turn(context: CallContext, text: str, rules: RulesConfig = DEFAULT_RULES) -> bool:
+    """Record a caller utterance; returns True if it flagged an emergency"""
+    context.add_user_message(text)
+    if is_emergency(text, rules):
+        context.is_emergency = True
+        context.state = CallState.ESCALATING
+        return True
+    return False
+
+
+def apply_assistant_turn(context: CallContext, text: str, rules: RulesConfig = DEFAULT_RULES) -> bool:
+    """Record an assistant response unless it's a partial fragment"""
+    if len(text) > rules.min_assistant_chars:
+        context.add_assistant_message(text)
+        return True
+    return False
+
+
+def is_sentiment_turn(turn_count: int, rules: RulesConfig = DEFAULT_RULES) -> bool:
+    """Whether sentiment is re-scored after the `turn_count`-th caller turn"""
+    return turn_count % rules.analyze_every_n_turns == 0
+
+
+def score_sentiment(context: CallContext, rules: RulesConfig = DEFAULT_RULES) -> bool:
+    """
+    Heuristic sentiment over the recent conversation, written to
+    context.sentiment. Returns False when there was nothing to score.
+    """
+    conversation = context.get_conversation_text(last_n=rules.sentiment_window_turns)
+    if not conversation:
+        return False
+    text_lower = conversation.lower()
+
+    frustration = sum(1 for word in rules.frustration_words if word in text_lower)
+    context.sentiment.frustration_level = min(frustration / rules.frustration_divisor, 1.0)
+
+    urgency = sum(1 for word in rules.urgency_words if word in text_lower)
+    context.sentiment.urgency_level = min(urgency / rules.urgency_divisor, 1.0)
+
+    context.sentiment.escalation_needed = (
+        context.sentiment.frustration_level > rules.frustration_threshold or
+        context.sentiment.urgency_level > rules.urgency_threshold or
+        any(phrase in text_lower for phrase in rules.human_request_phrases)
+    )
+    return True
@@ -5,6 +5,8 @@ import httpx
 from typing import Optional, Dict, Any, List
 from loguru import logger
 from config import settings
+from resilience import CircuitBreaker, remaining
+from singleflight import SingleFlight
 
 
 class CoreAPIClient:
@@ -12,12 +14,55 @@ class CoreAPIClient:
     
     def __init__(self):
         self.base_url = settings.core_api_url
-        self.client = httpx.AsyncClient(timeout=10.0)
+        self.client = httpx.AsyncClient(timeout=settings.core_api_timeout_seconds)
+        self.breaker = CircuitBreaker(
+            "core_api",
+            failure_threshold=settings.breaker_failure_threshold,
+            reset_timeout=settings.breaker_reset_seconds,
+        )
+        self._reads = SingleFlight("core_api")
     
     async def close(self):
         """Close the HTTP client"""
         await self.client.aclose()
     
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """
+        Send a request through the core-api circuit breaker, bounded by what's
+        left of the current turn's deadline. 5xx responses count as failures.
+        """
+        timeout = remaining(settings.core_api_timeout_seconds)
+        
+        async def send() -> httpx.Response:
+            response = await self.client.request(
+                method, f"{self.base_url}{path}", timeout=timeout, **kwargs
+            )
+            if response.status_code >= 500:
+                response.raise_for_status()
+            return response
+        
+        return await self.breaker.call(send)
+    
+    async def _get_json(self, path: str, params: Optional[Dict[str, str]] = None) -> Any:
+        """
+        GET and parse JSON, or None for a non-200 response. Concurrent
+        identical reads share one request and one parsed body, so callers
+        must not mutate what they get back.
+        """
+        key = (path, tuple(sorted((params or {}).items())))
+        
+        async def fetch() -> Any:
+            response = await self._request("GET", path, params=params)
+            if response.status_code == 200:
+                return response.json()
+            return None
+        
+        return await self._reads.do(key, fetch)
+    
+    async def list_hospitals(self) -> Optional[List[Dict[str, Any]]]:
+        """Get all hospitals with their settings and phone numbers (errors propagate)"""
+        return await self._get_json("/hospitals", {"includeSettings": "true"})
+    
     async def get_hospital_by_phone(self, phone_number: str) -> Optional[Dict[str, Any]]:
         """Get hospital info by phone number"""
         try:
@@ -26,14 +71,9 @@ class CoreAPIClient:
             logger.debug(f"Looking up hospital for phone: {formatted}")
             
             # Get all hospitals with their phone numbers
-            response = await self.client.get(
-                f"{self.base_url}/hospitals",
-                params={"includeSettings": "true"}
-            )
+            hospitals = await self.list_hospitals()
             
-            if response.status_code == 200:
-                hospitals = response.json()
-                
+            if hospitals is not None:
                 # Find hospital with matching phone number
                 for hospital in hospitals:
                     phone_numbers = hospital.get("phoneNumbers", [])
@@ -55,13 +95,15 @@ class CoreAPIClient:
             logger.error(f"Error fetching hospital: {e}")
             return None
     
-    async def get_hospital(self, hospital_id: str) -> Optional[Dict[str, Any]]:
-        """Get hospital by ID"""
+    async def get_hospital(
+        self,
+        hospital_id: str,
+        include_relations: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """Get hospital by ID, optionally with its phone numbers"""
         try:
-            response = await self.client.get(f"{self.base_url}/hospitals/{hospital_id}")
-            if response.status_code == 200:
-                return response.json()
-            return None
+            params = {"includeRelations": "true"} if include_relations else None
+            return await self._get_json(f"/hospitals/{hospital_id}", params)
         except Exception as e:
             logger.error(f"Error fetching hospital {hospital_id}: {e}")
             return None
@@ -69,25 +111,24 @@ class CoreAPIClient:
     async def get_workflow(self, hospital_id: str, workflow_id: str) -> Optional[Dict[str, Any]]:
         """Get workflow configuration"""
         try:
-            response = await self.client.get(
-                f"{self.base_url}/hospitals/{hospital_id}/workflows/{workflow_id}"
-            )
-            if response.status_code == 200:
-                return response.json()
-            return None
+            return await self._get_json(f"/hospitals/{hospital_id}/workflows/{workflow_id}")
         except Exception as e:
             logger.error(f"Error fetching workflow: {e}")
             return None
     
+    async def list_intents(self, hospital_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Get all intents for a hospital (errors propagate)"""
+        return await self._get_json(f"/hospitals/{hospital_id}/intents")
+    
+    async def list_departments(self, hospital_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Get all departments for a hospital (errors propagate)"""
+        return await self._get_json("/departments", {"hospitalId": hospital_id})
+    
     async def get_intents(self, hospital_id: str) -> List[Dict[str, Any]]:
         """Get all intents for a hospital"""
         try:
-            response = await self.client.get(
-                f"{self.base_url}/hospitals/{hospital_id}/intents"
-            )
-            if response.status_code == 200:
-                return response.json()
-            return []
+            intents = await self.list_intents(hospital_id)
+            return intents if intents is not None else []
         except Exception as e:
             logger.error(f"Error fetching intents: {e}")
             return []
@@ -95,13 +136,8 @@ class CoreAPIClient:
     async def get_departments(self, hospital_id: str) -> List[Dict[str, Any]]:
         """Get all departments for a hospital"""
         try:
-            response = await self.client.get(
-                f"{self.base_url}/departments",
-                params={"hospitalId": hospital_id}
-            )
-            if response.status_code == 200:
-                return response.json()
-            return []
+            departments = await self.list_departments(hospital_id)
+            return departments if departments is not None else []
         except Exception as e:
             logger.error(f"Error fetching departments: {e}")
             return []
@@ -109,8 +145,8 @@ class CoreAPIClient:
     async def create_call_session(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Create a new call session"""
         try:
-            response = await self.client.post(
-                f"{self.base_url}/api/calls",
+            response = await self._request(
+                "POST", "/api/calls",
                 json=data
             )
             if response.status_code in [200, 201]:
@@ -128,8 +164,8 @@ class CoreAPIClient:
     ) -> Optional[Dict[str, Any]]:
         """Update a call session"""
         try:
-            response = await self.client.patch(
-                f"{self.base_url}/api/calls/{call_id}",
+            response = await self._request(
+                "PATCH", f"/api/calls/{call_id}",
                 json=data
             )
             if response.status_code == 200:
@@ -140,6 +176,76 @@ class CoreAPIClient:
             logger.error(f"Error updating call session: {e}")
             return None
     
+    async def queue_call_for_agent(
+        self,
+        hospital_id: str,
+        call_id: str,
+        specialization: str,
+        priority: Optional[int] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Queue a call for a human agent, creating the specialization's queue if needed"""
+        try:
+            queues_path = f"/api/hospitals/{hospital_id}/queues"
+            queues = await self._get_json(queues_path, {"specialization": specialization})
+            if queues and queues.get("data"):
+                queue_id = queues["data"][0]["id"]
+            else:
+                response = await self._request(
+                    "POST", queues_path,
+                    json={
+                        "name": f"{specialization} Queue",
+                        "specialization": specialization,
+                        "priority": priority or 0,
+                    }
+                )
+                if response.status_code not in [200, 201]:
+                    logger.warning(f"Failed to create {specialization} queue: {response.status_code}")
+                    return None
+                queue_id = response.json()["id"]
+            
+            body: Dict[str, Any] = {"callId": call_id}
+            if priority is not None:
+                body["priority"] = priority
+            response = await self._request("POST", f"{queues_path}/{queue_id}/assign", json=body)
+            if response.status_code in [200, 201]:
+                return response.json()
+            logger.warning(f"Failed to queue call {call_id}: {response.status_code}")
+            return None
+        except Exception as e:
+            logger.error(f"Error queueing call for agent: {e}")
+            return None
+    
+    async def assign_call_to_agent(
+        self,
+        hospital_id: str,
+        call_id: str,
+        agent_id: str,
+    ) -> Optional[Dict[str, Any]]:
+        """Assign a call directly to one human agent"""
+        try:
+            response = await self._request(
+                "POST", f"/api/hospitals/{hospital_id}/assignments",
+                json={"callId": call_id, "agentId": agent_id}
+            )
+            if response.status_code in [200, 201]:
+                return response.json()
+            logger.warning(f"Failed to assign call {call_id} to agent: {response.status_code}")
+            return None
+        except Exception as e:
+            logger.error(f"Error assigning call to agent: {e}")
+            return None
+    
+    async def get_insurance_plans(self, hospital_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Get all accepted insurance plans for a hospital"""
+        try:
+            return await self._get_json(
+                "/insurance/plans",
+                {"hospitalId": hospital_id, "isAccepted": "true"}
+            )
+        except Exception as e:
+            logger.error(f"Error fetching insurance plans: {e}")
+            return None
+    
     async def check_insurance_plan(
         self, 
         hospital_id: str, 
@@ -147,13 +253,10 @@ class CoreAPIClient:
     ) -> Optional[Dict[str, Any]]:
         """Check if an insurance plan is accepted"""
         try:
-            response = await self.client.get(
-                f"{self.base_url}/insurance/plans/check",
-                params={"hospitalId": hospital_id, "carrierName": carrier_name}
+            return await self._get_json(
+                "/insurance/plans/check",
+                {"hospitalId": hospital_id, "carrierName": carrier_name}
             )
-            if response.status_code == 200:
-                return response.json()
-            return None
         except Exception as e:
             logger.error(f"Error checking insurance: {e}")
             return None
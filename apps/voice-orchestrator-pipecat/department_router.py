@@ -0,0 +1,185 @@
+"""
+In-process department routing
+
+Builds a per-hospital inverted index from department names, serviceTypes and
+common lay synonyms to departments, so "connect me to cardiology" or "who handles
+my MRI" resolves locally. Only ambiguous requests fall back to the LLM.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple
+from loguru import logger
+
+
+# Lay terms callers use, mapped to words found in department names/serviceTypes
+SYNONYMS: Dict[str, List[str]] = {
+    "heart": ["cardiology", "cardiac"],
+    "cardiologist": ["cardiology"],
+    "x ray": ["radiology", "imaging", "xray"],
+    "xray": ["radiology", "imaging"],
+    "mri": ["radiology", "imaging"],
+    "ct": ["radiology", "imaging"],
+    "cat scan": ["radiology", "imaging", "ct"],
+    "ultrasound": ["radiology", "imaging"],
+    "mammogram": ["radiology", "imaging", "mammography"],
+    "scan": ["radiology", "imaging"],
+    "bone": ["orthopedics", "orthopedic"],
+    "broken": ["orthopedics", "orthopedic"],
+    "fracture": ["orthopedics", "orthopedic"],
+    "knee": ["orthopedics", "orthopedic"],
+    "kid": ["pediatrics", "pediatric"],
+    "child": ["pediatrics", "pediatric"],
+    "baby": ["pediatrics", "obstetrics", "maternity"],
+    "pregnant": ["obstetrics", "maternity", "obgyn"],
+    "pregnancy": ["obstetrics", "maternity", "obgyn"],
+    "ob gyn": ["obstetrics", "gynecology", "obgyn"],
+    "skin": ["dermatology"],
+    "rash": ["dermatology"],
+    "cancer": ["oncology"],
+    "chemo": ["oncology"],
+    "blood test": ["laboratory", "lab"],
+    "bloodwork": ["laboratory", "lab"],
+    "lab": ["laboratory"],
+    "test result": ["laboratory", "lab"],
+    "pharmacy": ["pharmacy"],
+    "medication": ["pharmacy"],
+    "bill": ["billing"],
+    "payment": ["billing"],
+    "invoice": ["billing"],
+    "record": ["records", "medical records"],
+    "eye": ["ophthalmology", "optometry"],
+    "brain": ["neurology"],
+    "headache": ["neurology"],
+    "stomach": ["gastroenterology"],
+    "kidney": ["nephrology", "urology"],
+    "therapy": ["physical therapy", "rehabilitation", "behavioral health"],
+    "therapist": ["physical therapy", "behavioral health"],
+    "mental health": ["behavioral health", "psychiatry"],
+    "counseling": ["behavioral health", "psychiatry"],
+}
+
+# Phrases that explicitly ask to be put through to a department. Generic
+# ones ("i need", "looking for") would catch requests the LLM should handle,
+# like "I need to reschedule my stress test"
+ROUTING_CUES = (
+    "transfer", "connect", "speak to", "speak with", "talk to", "talk with",
+    "who handles", "put me through", "extension", "number for",
+)
+
+# Scores for a direct hit on a department's own terms vs a synonym
+DIRECT_WEIGHT = 3
+SYNONYM_WEIGHT = 1
+MAX_PHRASE_WORDS = 3
+
+
+def _tokens(text: str) -> List[str]:
+    """Lowercase words with trailing plural 's' stripped"""
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    return [w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w for w in words]
+
+
+def _phrase(text: str) -> str:
+    return " ".join(_tokens(text))
+
+
+def is_routing_request(text: str) -> bool:
+    """Cheap check for whether a caller is asking to be routed"""
+    lowered = text.lower()
+    return any(cue in lowered for cue in ROUTING_CUES)
+
+
+@dataclass
+class RoutingMatch:
+    """Result of resolving a routing request"""
+    department: Optional[Dict[str, Any]]
+    score: int
+    candidates: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def ambiguous(self) -> bool:
+        return self.department is None
+
+
+class DepartmentRouter:
+    """Per-hospital inverted index from service terms to departments"""
+
+    def __init__(self):
+        # hospital_id -> (signature, phrase -> [(department index, weight)])
+        self._indexes: Dict[str, Tuple[Tuple, Dict[str, List[Tuple[int, int]]]]] = {}
+        self._departments: Dict[str, List[Dict[str, Any]]] = {}
+
+    @staticmethod
+    def _signature(departments: List[Dict[str, Any]]) -> Tuple:
+        return tuple((d.get("id"), d.get("updatedAt")) for d in departments)
+
+    def build(self, hospital_id: str, departments: List[Dict[str, Any]]):
+        """Index a hospital's departments; a no-op if they haven't changed"""
+        signature = self._signature(departments)
+        cached = self._indexes.get(hospital_id)
+        if cached and cached[0] == signature:
+            return
+
+        index: Dict[str, List[Tuple[int, int]]] = {}
+
+        def add(phrase: str, position: int, weight: int):
+            if not phrase:
+                return
+            postings = index.setdefault(phrase, [])
+            for i, (existing, existing_weight) in enumerate(postings):
+                if existing == position:
+                    postings[i] = (position, max(weight, existing_weight))
+                    return
+            postings.append((position, weight))
+
+        for position, dept in enumerate(departments):
+            if dept.get("isActive") is False:
+                continue
+            terms = [dept.get("name", "")] + list(dept.get("serviceTypes") or [])
+            term_phrases = {_phrase(t) for t in terms}
+            term_words = {w for p in term_phrases for w in p.split()} | term_phrases
+            for phrase in term_phrases:
+                add(phrase, position, DIRECT_WEIGHT)
+            for lay_term, targets in SYNONYMS.items():
+                if any(_phrase(t) in term_words for t in targets):
+                    add(_phrase(lay_term), position, SYNONYM_WEIGHT)
+
+        self._indexes[hospital_id] = (signature, index)
+        self._departments[hospital_id] = departments
+        logger.info(
+            f"Built routing index for hospital {hospital_id}: "
+            f"{len(departments)} departments, {len(index)} terms"
+        )
+
+    def resolve(self, hospital_id: str, text: str) -> Optional[RoutingMatch]:
+        """
+        Resolve a routing request. Returns None when nothing matched, a match
+        with a department when one clearly wins, or an ambiguous match
+        listing the candidates for the LLM to disambiguate.
+        """
+        cached = self._indexes.get(hospital_id)
+        if not cached:
+            return None
+        index = cached[1]
+        departments = self._departments[hospital_id]
+
+        words = _tokens(text)
+        scores: Dict[int, int] = {}
+        for size in range(MAX_PHRASE_WORDS, 0, -1):
+            for start in range(len(words) - size + 1):
+                for position, weight in index.get(" ".join(words[start:start + size]), ()):
+                    scores[position] = scores.get(position, 0) + weight
+        if not scores:
+            return None
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        best_position, best_score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0
+        candidates = [departments[p] for p, s in ranked if s >= best_score - SYNONYM_WEIGHT]
+
+        if best_score >= DIRECT_WEIGHT and best_score - runner_up > SYNONYM_WEIGHT:
+            return RoutingMatch(department=departments[best_position], score=best_score)
+        return RoutingMatch(department=None, score=best_score, candidates=candidates)
+
+
+# Global department router
+department_router = DepartmentRouter()
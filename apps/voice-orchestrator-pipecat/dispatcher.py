@@ -0,0 +1,480 @@
+"""
+Multi-process front dispatcher
+
+Call state lives in the memory of the process that answered the call, so
+every turn of a call must reach that same process. This starts N server
+workers on local ports and sits in front of them:
+
+- Twilio webhooks are routed by the caller's number (From), so a repeat
+  caller reaches the worker whose caller cache knows them; calls without a
+  usable number are routed by CallSid
+- /media/{call_sid} websockets go to the worker that took the call's
+  webhooks, or by the path's CallSid
+- /internal/* and /debug/runtime requests are broadcast to every worker
+- /metrics merges every worker's metrics with a `worker` label
+
+Routing uses a consistent-hash ring, so adding or removing a worker only
+moves the calls that hashed to it. A worker that exits is restarted;
+while it is down its calls go to the next worker on the ring.
+
+Run with `python dispatcher.py` instead of `python server.py`.
+"""
+import asyncio
+import bisect
+import hashlib
+import json
+import os
+from collections import OrderedDict
+import signal
+import sys
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+import aiohttp
+import httpx
+from fastapi import FastAPI, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse
+from loguru import logger
+
+from config import settings
+from metrics import metrics
+
+
+# Ring points per worker; more points spread calls more evenly
+VIRTUAL_NODES = 128
+# Seconds to wait before restarting a worker that exited, doubling per crash
+RESTART_BACKOFF = 1.0
+MAX_RESTART_BACKOFF = 30.0
+# A new worker only receives traffic once its /ready answers (warmup done);
+# one that isn't answering at all by the timeout is restarted
+READY_POLL_INTERVAL = 0.2
+START_TIMEOUT = 60.0
+# Calls whose webhook worker is remembered for their media stream
+MAX_PINNED_CALLS = 10000
+# Shorter caller IDs (withheld, "anonymous") are routed by CallSid instead
+MIN_CALLER_DIGITS = 7
+# Twilio's stand-ins for withheld, unavailable and unknown caller IDs
+PLACEHOLDER_CALLERS = {"266696687", "86282452253", "8656696"}
+# Hop-by-hop headers that must not be forwarded
+HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "upgrade", "content-length", "host"}
+
+_dispatched = metrics.counter("dispatch_requests_total", "Requests dispatched to workers")
+_restarts = metrics.counter("dispatch_worker_restarts_total", "Worker processes restarted after exiting")
+_worker_up = metrics.gauge("dispatch_worker_up", "Whether a worker process is running (1) or not (0)")
+
+
+class HashRing:
+    """Consistent-hash ring with virtual nodes"""
+
+    def __init__(self, nodes: List[str], virtual_nodes: int = VIRTUAL_NODES):
+        self._points: List[Tuple[int, str]] = sorted(
+            (self._hash(f"{node}#{i}"), node)
+            for node in nodes
+            for i in range(virtual_nodes)
+        )
+        self._keys = [point for point, _ in self._points]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+    def lookup(self, key: str, available: Optional[set] = None) -> Optional[str]:
+        """Owner of `key`: the first node clockwise, skipping unavailable ones"""
+        if not self._points:
+            return None
+        start = bisect.bisect(self._keys, self._hash(key))
+        for offset in range(len(self._points)):
+            node = self._points[(start + offset) % len(self._points)][1]
+            if available is None or node in available:
+                return node
+        return None
+
+
+@dataclass
+class Worker:
+    worker_id: str
+    port: int
+    process: Optional[asyncio.subprocess.Process] = None
+    running: bool = False
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+
+class WorkerPool:
+    """Starts, supervises and routes to the server worker processes"""
+
+    def __init__(self, count: int, base_port: int):
+        self.workers: Dict[str, Worker] = {
+            f"w{i}": Worker(worker_id=f"w{i}", port=base_port + i) for i in range(count)
+        }
+        self.ring = HashRing(list(self.workers))
+        self._stopping = False
+        self._supervisors: List[asyncio.Task] = []
+        # call_sid -> worker_id of recent webhooks, for the call's media stream
+        self._pinned: "OrderedDict[str, str]" = OrderedDict()
+        # Shared by every worker so caller cache keys agree
+        self._caller_salt = settings.caller_cache_salt or os.urandom(16).hex()
+
+    def start(self):
+        for worker in self.workers.values():
+            self._supervisors.append(asyncio.create_task(self._supervise(worker)))
+
+    async def _spawn(self, worker: Worker):
+        env = dict(
+            os.environ,
+            ORCHESTRATOR_WORKER_ID=worker.worker_id,
+            LOG_FILE=f"logs/voice_orchestrator.{worker.worker_id}.log",
+            USAGE_FILE=f"logs/usage.{worker.worker_id}.jsonl",
+            CALLER_CACHE_SALT=self._caller_salt,
+            # Each worker admits calls and schedules LLM requests alone; split
+            # the limits between them (the scheduler keeps a minimum burst per bucket)
+            MAX_CONCURRENT_CALLS=self._share(settings.max_concurrent_calls),
+            LLM_TOKENS_PER_MINUTE=self._share(settings.llm_tokens_per_minute),
+            LLM_HOSPITAL_TOKENS_PER_MINUTE=self._share(settings.llm_hospital_tokens_per_minute),
+        )
+        worker.process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "uvicorn", "server:app",
+            "--host", "127.0.0.1", "--port", str(worker.port),
+            env=env,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        if not await self._wait_ready(worker):
+            return
+        worker.running = True
+        _worker_up.set(1, worker=worker.worker_id)
+        logger.info(f"Worker {worker.worker_id} started on port {worker.port} (pid {worker.process.pid})")
+
+    def _share(self, total: int) -> str:
+        """One worker's part of a budget; 0 (unlimited) stays unlimited"""
+        return str(max(1, total // len(self.workers)) if total > 0 else 0)
+
+    async def _wait_ready(self, worker: Worker) -> bool:
+        """
+        Poll a new worker's /ready until it passes, so calls aren't routed
+        to it while it is still importing or warming up. A worker that
+        doesn't answer at all in time is killed and restarted by its
+        supervisor; one that answers keeps retrying its own warmup.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + START_TIMEOUT
+        answering = False
+        while worker.process.returncode is None and not self._stopping:
+            try:
+                response = await http_client.get(f"{worker.url}/ready", timeout=1.0)
+                if response.status_code == 200:
+                    return True
+                answering = True
+            except httpx.HTTPError:
+                pass
+            if not answering and loop.time() >= deadline:
+                logger.error(f"Worker {worker.worker_id} not answering after {START_TIMEOUT:.0f}s")
+                worker.process.kill()
+                return False
+            await asyncio.sleep(READY_POLL_INTERVAL)
+        return False
+
+    async def _supervise(self, worker: Worker):
+        """Keep a worker running, restarting it with backoff when it exits"""
+        backoff = RESTART_BACKOFF
+        while not self._stopping:
+            await self._spawn(worker)
+            code = await worker.process.wait()
+            worker.running = False
+            _worker_up.set(0, worker=worker.worker_id)
+            if self._stopping:
+                return
+            logger.error(f"Worker {worker.worker_id} exited with {code}; restarting in {backoff:.0f}s")
+            _restarts.inc(worker=worker.worker_id)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, MAX_RESTART_BACKOFF)
+
+    async def stop(self, timeout: float):
+        """SIGTERM every worker so it drains and saves its calls, then wait"""
+        self._stopping = True
+        # Includes workers still starting up, which aren't marked running yet
+        processes = [
+            w.process for w in self.workers.values()
+            if w.process and w.process.returncode is None
+        ]
+        for process in processes:
+            process.send_signal(signal.SIGTERM)
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(p.wait() for p in processes)), timeout
+            )
+        except asyncio.TimeoutError:
+            for process in processes:
+                if process.returncode is None:
+                    process.kill()
+        for task in self._supervisors:
+            task.cancel()
+
+    def route(self, key: str) -> Optional[Worker]:
+        running = {w.worker_id for w in self.workers.values() if w.running}
+        worker_id = self.ring.lookup(key, running)
+        return self.workers[worker_id] if worker_id else None
+
+    def pin(self, call_sid: str, worker: Worker):
+        """Remember which worker a call's webhooks went to"""
+        self._pinned[call_sid] = worker.worker_id
+        self._pinned.move_to_end(call_sid)
+        while len(self._pinned) > MAX_PINNED_CALLS:
+            self._pinned.popitem(last=False)
+
+    def route_call(self, call_sid: str) -> Optional[Worker]:
+        """The worker that took this call's webhooks, if it is still up"""
+        worker = self.workers.get(self._pinned.get(call_sid, ""))
+        if worker is not None and worker.running:
+            return worker
+        return self.route(call_sid)
+
+
+def caller_route_key(caller: str) -> Optional[str]:
+    """Ring key for a caller's number; None for withheld or short numbers"""
+    digits = ''.join(filter(str.isdigit, caller))
+    if len(digits) < MIN_CALLER_DIGITS or digits in PLACEHOLDER_CALLERS:
+        return None
+    return f"caller:{digits[-10:]}"
+
+
+pool = WorkerPool(settings.orchestrator_workers or os.cpu_count() or 1, settings.worker_base_port)
+http_client: Optional[httpx.AsyncClient] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global http_client
+    logger.info(f"🚀 Starting dispatcher with {len(pool.workers)} workers")
+    http_client = httpx.AsyncClient(timeout=settings.turn_deadline_seconds + 5)
+    pool.start()
+    yield
+    logger.info("🛑 Stopping workers")
+    await pool.stop(settings.drain_timeout_seconds + 10)
+    await http_client.aclose()
+
+
+app = FastAPI(title="Wardline Voice Orchestrator Dispatcher", lifespan=lifespan)
+
+
+def _forward_headers(request: Request) -> Dict[str, str]:
+    headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_HEADERS}
+    # Workers see the public host, e.g. for Twilio signature validation
+    headers["x-forwarded-host"] = request.headers.get("host", "")
+    return headers
+
+
+async def _forward(worker: Worker, request: Request, body: bytes) -> Response:
+    try:
+        upstream = await http_client.request(
+            request.method,
+            f"{worker.url}{request.url.path}",
+            params=request.query_params,
+            content=body,
+            headers=_forward_headers(request),
+        )
+    except httpx.HTTPError as e:
+        logger.error(f"Worker {worker.worker_id} unreachable: {e}")
+        return Response(status_code=502)
+    headers = {k: v for k, v in upstream.headers.items() if k.lower() not in HOP_HEADERS}
+    return Response(content=upstream.content, status_code=upstream.status_code, headers=headers)
+
+
+# =============================================================================
+# Dispatcher-level endpoints
+# =============================================================================
+
+@app.get("/health")
+async def health_check():
+    running = sum(w.running for w in pool.workers.values())
+    return {"status": "healthy" if running else "unhealthy", "workers": len(pool.workers), "running": running}
+
+
+@app.get("/ready")
+async def readiness_check():
+    """Ready once every running worker is ready"""
+    statuses = await _gather_workers("GET", "/ready")
+    ready = bool(statuses) and all(code == 200 for code, _ in statuses.values())
+    return JSONResponse(
+        {"ready": ready, "workers": {wid: code for wid, (code, _) in statuses.items()}},
+        status_code=200 if ready else 503,
+    )
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Dispatcher metrics plus every worker's, labelled by worker"""
+    statuses = await _gather_workers("GET", "/metrics")
+    texts = [("", metrics.render())] + [
+        (wid, body.decode()) for wid, (code, body) in statuses.items() if code == 200
+    ]
+    return PlainTextResponse(merge_metrics(texts), media_type="text/plain; version=0.0.4")
+
+
+@app.api_route("/internal/{path:path}", methods=["GET", "POST"])
+async def broadcast_internal(request: Request, path: str):
+    """Config pushes and drain requests apply to every worker"""
+    statuses = await _gather_workers(
+        request.method, request.url.path, await request.body(), _forward_headers(request)
+    )
+    codes = {wid: code for wid, (code, _) in statuses.items()}
+    ok = bool(codes) and all(code < 300 for code in codes.values())
+    return JSONResponse({"workers": codes}, status_code=202 if ok else 502)
+
+
+@app.get("/debug/runtime")
+async def debug_runtime(request: Request):
+    """Every worker's runtime report, by worker; each process has its own loop and calls"""
+    path = request.url.path
+    if request.url.query:
+        path += f"?{request.url.query}"
+    statuses = await _gather_workers("GET", path, headers=_forward_headers(request))
+    reports = {
+        wid: json.loads(body) if code == 200 else {"status": code}
+        for wid, (code, body) in statuses.items()
+    }
+    codes = {code for code, _ in statuses.values()}
+    # One shared status (e.g. 401 for a bad token) is passed through as is
+    status_code = codes.pop() if len(codes) == 1 else 502
+    return JSONResponse({"workers": reports}, status_code=status_code)
+
+
+async def _gather_workers(
+    method: str,
+    path: str,
+    body: bytes = b"",
+    headers: Optional[Dict[str, str]] = None,
+) -> Dict[str, Tuple[int, bytes]]:
+    """Send one request to every running worker; returns (status, body) per worker"""
+    workers = [w for w in pool.workers.values() if w.running]
+
+    async def send(worker: Worker) -> Tuple[int, bytes]:
+        try:
+            response = await http_client.request(
+                method, f"{worker.url}{path}", content=body, headers=headers, timeout=5.0
+            )
+            return response.status_code, response.content
+        except httpx.HTTPError:
+            return 502, b""
+
+    results = await asyncio.gather(*(send(w) for w in workers))
+    return {w.worker_id: result for w, result in zip(workers, results)}
+
+
+def merge_metrics(texts: List[Tuple[str, str]]) -> str:
+    """
+    Merge Prometheus text from several processes, adding a `worker` label
+    and keeping each metric family's HELP/TYPE lines once
+    """
+    families: Dict[str, List[str]] = {}
+    headers: Dict[str, List[str]] = {}
+    for worker_id, text in texts:
+        family = ""
+        for line in text.splitlines():
+            if line.startswith("# HELP ") or line.startswith("# TYPE "):
+                family = line.split(" ", 3)[2]
+                headers.setdefault(family, [])
+                if len(headers[family]) < 2:
+                    headers[family].append(line)
+                continue
+            if not line.strip():
+                continue
+            families.setdefault(family, []).append(_add_label(line, worker_id))
+    lines = []
+    for family, header in headers.items():
+        lines.extend(header)
+        lines.extend(families.get(family, []))
+    return "\n".join(lines) + "\n"
+
+
+def _add_label(sample: str, worker_id: str) -> str:
+    if not worker_id:
+        return sample
+    name, _, rest = sample.partition(" ")
+    if name.endswith("}"):
+        return f'{name[:-1]},worker="{worker_id}"}} {rest}'
+    return f'{name}{{worker="{worker_id}"}} {rest}'
+
+
+# =============================================================================
+# Sticky routing
+# =============================================================================
+
+@app.websocket("/media/{call_sid}")
+async def media_stream(websocket: WebSocket, call_sid: str):
+    """Proxy a Twilio media stream to the worker that owns the call"""
+    worker = pool.route_call(call_sid)
+    if worker is None:
+        await websocket.close(code=1013)
+        return
+    _dispatched.inc(worker=worker.worker_id, kind="websocket")
+    await websocket.accept()
+
+    async with aiohttp.ClientSession() as session:
+        try:
+            upstream = await session.ws_connect(f"ws://127.0.0.1:{worker.port}/media/{call_sid}")
+        except aiohttp.ClientError as e:
+            logger.error(f"Worker {worker.worker_id} websocket unreachable: {e}")
+            await websocket.close(code=1011)
+            return
+
+        async def client_to_worker():
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                if message.get("text") is not None:
+                    await upstream.send_str(message["text"])
+                elif message.get("bytes") is not None:
+                    await upstream.send_bytes(message["bytes"])
+
+        async def worker_to_client():
+            async for message in upstream:
+                if message.type == aiohttp.WSMsgType.TEXT:
+                    await websocket.send_text(message.data)
+                elif message.type == aiohttp.WSMsgType.BINARY:
+                    await websocket.send_bytes(message.data)
+                else:
+                    return
+
+        pumps = [asyncio.create_task(client_to_worker()), asyncio.create_task(worker_to_client())]
+        try:
+            await asyncio.wait(pumps, return_when=asyncio.FIRST_COMPLETED)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            for task in pumps:
+                task.cancel()
+            await upstream.close()
+            try:
+                await websocket.close()
+            except RuntimeError:
+                pass  # Already closed by the client
+
+
+@app.api_route("/{path:path}", methods=["GET", "POST"])
+async def dispatch(request: Request, path: str):
+    """
+    Route webhooks by the caller's number, then CallSid; anything without
+    either is routed by path. Every Twilio voice webhook carries both.
+    """
+    body = await request.body()
+    form = parse_qs(body.decode(errors="ignore")) if body else {}
+    call_sid = request.query_params.get("CallSid") or (form.get("CallSid") or [""])[0]
+    caller = request.query_params.get("From") or (form.get("From") or [""])[0]
+    worker = pool.route(caller_route_key(caller) or call_sid or request.url.path)
+    if worker is None:
+        return Response(status_code=503)
+    if call_sid:
+        pool.pin(call_sid, worker)
+    _dispatched.inc(worker=worker.worker_id, kind="http")
+    return await _forward(worker, request, body)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=settings.host, port=settings.port, log_level="info")
@@ -0,0 +1,200 @@
+"""
+Graceful drain and call handoff across restarts
+
+On shutdown the server stops admitting new calls, waits for in-flight
+webhook turns to finish (up to a deadline), and snapshots every active
+CallContext to a file of its own. Replacement processes claim and
+restore those files on startup, or on the call's next turn if it was
+saved after they started, so a rolling deploy doesn't reset calls that
+are mid-conversation. Point CALL_SNAPSHOT_DIR at a volume shared by old
+and new pods; files are owner-only and deleted once restored.
+"""
+import asyncio
+import json
+import os
+import re
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Optional, Tuple
+from loguru import logger
+
+from config import settings
+from call_context import CallContext, CallState, context_manager
+from metrics import metrics
+
+
+# Call SIDs are alphanumeric; anything else never becomes part of a path
+CALL_SID_PATTERN = re.compile(r"^[A-Za-z0-9]{1,64}$")
+
+_handoffs = metrics.counter("call_handoffs_total", "Active calls saved on drain or restored on startup")
+
+
+class DrainCoordinator:
+    """Tracks in-flight turns and whether the process is draining"""
+
+    def __init__(self):
+        self.draining = False
+        self._in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @contextmanager
+    def track(self):
+        """Count a webhook turn as in flight for the duration of the block"""
+        self._in_flight += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                self._idle.set()
+
+    def begin(self):
+        """Stop admitting new calls and report not-ready"""
+        if not self.draining:
+            self.draining = True
+            logger.info("Drain started")
+
+    async def drain(self, timeout: float) -> bool:
+        """Stop admitting calls and wait for in-flight turns; False if the deadline hit first"""
+        self.begin()
+        logger.info(f"Draining: waiting for {self._in_flight} in-flight turns")
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(f"Drain deadline reached with {self._in_flight} turns in flight")
+            return False
+
+
+def _owner() -> str:
+    # Under the dispatcher, files carry the worker id so the same worker
+    # slot (which owns the same calls on the hash ring) restores them
+    return settings.worker_id or "proc"
+
+
+def _write_private(path: Path, text: str):
+    """Write a file readable only by this user, atomically"""
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def save_active_calls(directory: str) -> int:
+    """
+    Write each live call's context to its own file under `directory`;
+    returns how many were saved. Files hold transcripts and phone numbers,
+    so they are created owner-only and deleted as soon as they're loaded.
+    """
+    contexts = [
+        c for c in context_manager.get_all_active()
+        if c.state not in (CallState.ENDING, CallState.COMPLETED)
+        and CALL_SID_PATTERN.match(c.call_sid)
+    ]
+    if not contexts:
+        return 0
+    target_dir = Path(directory)
+    saved_at = time.time()
+    saved = 0
+    try:
+        target_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+    except OSError as e:
+        logger.error(f"Could not create {target_dir} for active calls: {e}")
+        return 0
+    for context in contexts:
+        target = target_dir / f"{_owner()}-{context.call_sid}.json"
+        try:
+            _write_private(target, json.dumps(
+                {"saved_at": saved_at, "call": context.to_dict()},
+                separators=(",", ":"),
+                default=str,
+            ))
+            saved += 1
+        except OSError as e:
+            logger.error(f"Could not save active call {context.call_sid}: {e}")
+    _handoffs.inc(saved, direction="saved")
+    logger.info(f"Saved {saved} active calls to {target_dir}")
+    return saved
+
+
+def _claim(path: Path, max_age: float) -> Optional[Tuple[CallContext, Optional[str]]]:
+    """
+    Claim one saved call by renaming its file first, so when several
+    processes race for it only one restores it, then load and delete it
+    """
+    claimed = path.with_suffix(f".claimed-{os.getpid()}")
+    try:
+        os.rename(path, claimed)
+    except OSError:
+        return None  # Another process got it
+    try:
+        data = json.loads(claimed.read_text())
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read saved call {path.name}: {e}")
+        return None
+    finally:
+        claimed.unlink(missing_ok=True)
+    if time.time() - data.get("saved_at", 0) > max_age:
+        logger.info(f"Saved call {path.name} is too old to restore")
+        return None
+    item = data.get("call") or {}
+    try:
+        context = CallContext.from_dict(item)
+    except (KeyError, TypeError, ValueError) as e:
+        logger.warning(f"Skipping unreadable saved call: {e}")
+        return None
+    context_manager.restore_context(context)
+    return context, item.get("workflow_id")
+
+
+def restore_active_calls(directory: str, max_age: float) -> List[Tuple[CallContext, Optional[str]]]:
+    """
+    Restore contexts saved by previous processes, with the id of the
+    workflow each was running. A dispatcher worker only claims files saved
+    by its own slot. Files older than `max_age` seconds are discarded.
+    """
+    source_dir = Path(directory)
+    if not source_dir.is_dir():
+        return []
+    restored = []
+    pattern = f"{settings.worker_id}-*.json" if settings.worker_id else "*.json"
+    for path in source_dir.glob(pattern):
+        result = _claim(path, max_age)
+        if result:
+            restored.append(result)
+    if restored:
+        _handoffs.inc(len(restored), direction="restored")
+        logger.info(f"Restored {len(restored)} active calls from {directory}")
+    return restored
+
+
+def restore_call(directory: str, call_sid: str, max_age: float) -> Optional[Tuple[CallContext, Optional[str]]]:
+    """
+    Restore one call saved after this process started, e.g. by a pod
+    that drained during a rolling deploy while its calls were already
+    being routed here. Returns None if no process saved the call.
+    """
+    if not CALL_SID_PATTERN.match(call_sid):
+        return None
+    source_dir = Path(directory)
+    if not source_dir.is_dir():
+        return None
+    for path in source_dir.glob(f"*-{call_sid}.json"):
+        result = _claim(path, max_age)
+        if result:
+            _handoffs.inc(direction="restored")
+            logger.info(f"Restored call {call_sid} from {path.name}")
+            return result
+    return None
+
+
+# Global drain coordinator
+drain = DrainCoordinator()
@@ -0,0 +1,252 @@
+"""
+Latency-aware routing across Azure endpoints
+
+Azure OpenAI and Azure Speech can each be configured with several
+endpoints (regions). Every request's latency and outcome feeds an EWMA per
+endpoint, and each request goes to the healthy endpoint with the best
+score. The score is the latency EWMA inflated by the error-rate EWMA.
+
+Failover:
+- An endpoint that fails ENDPOINT_FAILURE_THRESHOLD times in a row is
+  taken out for a cooldown that doubles on each repeat.
+- A request that fails for the endpoint's sake (connection error,
+  timeout, 429, 5xx) is retried once on the next best endpoint while the
+  turn has time left. Other errors (a 400, a content filter) are the
+  request's fault: they are raised as they are and don't count against
+  the endpoint.
+
+A small share of requests (ENDPOINT_EXPLORE_FRACTION) goes to another
+healthy endpoint, so the numbers for standby regions stay current.
+"""
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Collection, List, Optional, TypeVar
+import httpx
+from loguru import logger
+
+from config import settings
+from metrics import metrics
+from resilience import DeadlineExceeded
+
+
+T = TypeVar("T")
+
+# Latency assumed for an endpoint before its first sample
+INITIAL_LATENCY_SECONDS = 1.0
+# Error-rate EWMA multiplies the latency score by up to this much
+ERROR_PENALTY = 10.0
+MAX_COOLDOWN_SECONDS = 300.0
+# Besides 5xx, the statuses that mean the endpoint is struggling, not the request
+FAILOVER_STATUSES = {408, 429}
+
+_routed = metrics.counter(
+    "endpoint_routed_total", "Requests routed per endpoint, by reason (best, explore, failover)"
+)
+_outcomes = metrics.counter("endpoint_requests_total", "Requests per endpoint by outcome")
+_latency_ewma = metrics.gauge("endpoint_latency_ewma_seconds", "EWMA request latency per endpoint")
+_healthy = metrics.gauge("endpoint_healthy", "1 while the endpoint is in rotation")
+
+
+@dataclass
+class Endpoint:
+    """One regional endpoint and its running health numbers"""
+    name: str
+    # Base URL (Azure OpenAI) or region (Azure Speech)
+    target: str
+    key: str
+    latency: float = INITIAL_LATENCY_SECONDS
+    error_rate: float = 0.0
+    samples: int = 0
+    consecutive_failures: int = 0
+    cooldown: float = 0.0
+    down_until: float = 0.0
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.down_until
+
+    @property
+    def score(self) -> float:
+        return self.latency * (1.0 + ERROR_PENALTY * self.error_rate)
+
+
+def parse_endpoints(spec: str, default_target: str, default_key: str) -> List[Endpoint]:
+    """
+    Parse "target|key,target|key" (the key is optional and defaults to
+    `default_key`); an empty spec means just the default target
+    """
+    endpoints = []
+    for part in spec.split(","):
+        target, _, key = part.strip().partition("|")
+        if target.strip():
+            endpoints.append(Endpoint(
+                name=_short_name(target.strip()),
+                target=target.strip(),
+                key=key.strip() or default_key,
+            ))
+    return endpoints or [Endpoint(name=_short_name(default_target), target=default_target, key=default_key)]
+
+
+def is_endpoint_failure(error: BaseException) -> bool:
+    """
+    Whether an error says the endpoint is unhealthy: a connection error,
+    a timeout, a 429 or a 5xx. SDK errors (openai) carry a status_code or
+    wrap the underlying httpx error as their cause.
+    """
+    while error is not None:
+        status = getattr(error, "status_code", None)
+        if isinstance(status, int):
+            return status >= 500 or status in FAILOVER_STATUSES
+        if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError, httpx.TransportError)):
+            return True
+        error = error.__cause__
+    return False
+
+
+def _short_name(target: str) -> str:
+    """Metric label for an endpoint: the host's first label, or the region"""
+    host = target.split("://", 1)[-1].split("/", 1)[0]
+    return host.split(".", 1)[0] or target
+
+
+class EndpointRouter:
+    """Routes a service's requests to its fastest healthy endpoint"""
+
+    def __init__(self, service: str, endpoints: List[Endpoint]):
+        self.service = service
+        self.endpoints = endpoints
+        for endpoint in endpoints:
+            self._publish(endpoint, time.monotonic())
+
+    def choose(self, exclude: Collection[str] = ()) -> Endpoint:
+        """Best endpoint for the next request, skipping names in `exclude` if possible"""
+        now = time.monotonic()
+        candidates = [e for e in self.endpoints if e.name not in exclude and e.healthy(now)]
+        if not candidates:
+            # Everything is cooling down: try whichever comes back soonest
+            pool = [e for e in self.endpoints if e.name not in exclude] or self.endpoints
+            candidates = [min(pool, key=lambda e: e.down_until)]
+            reason = "failover"
+        else:
+            candidates.sort(key=lambda e: e.score)
+            reason = "failover" if exclude else "best"
+            if len(candidates) > 1 and random.random() < settings.endpoint_explore_fraction:
+                candidates = [random.choice(candidates[1:])]
+                reason = "explore"
+        endpoint = candidates[0]
+        _routed.inc(service=self.service, endpoint=endpoint.name, reason=reason)
+        self._publish(endpoint, now)
+        return endpoint
+
+    def record(self, endpoint: Endpoint, latency: float, ok: bool):
+        """Fold one request's outcome into the endpoint's EWMAs"""
+        now = time.monotonic()
+        self._fold_latency(endpoint, latency)
+        endpoint.error_rate += settings.endpoint_ewma_alpha * ((0.0 if ok else 1.0) - endpoint.error_rate)
+        _outcomes.inc(service=self.service, endpoint=endpoint.name, outcome="ok" if ok else "error")
+
+        if ok:
+            endpoint.consecutive_failures = 0
+            endpoint.cooldown = 0.0
+        else:
+            endpoint.consecutive_failures += 1
+            if endpoint.consecutive_failures >= settings.endpoint_failure_threshold and endpoint.healthy(now):
+                endpoint.cooldown = min(
+                    MAX_COOLDOWN_SECONDS,
+                    endpoint.cooldown * 2 or settings.endpoint_cooldown_seconds,
+                )
+                endpoint.down_until = now + endpoint.cooldown
+                logger.warning(
+                    f"{self.service} endpoint {endpoint.name} out of rotation for {endpoint.cooldown:.0f}s "
+                    f"after {endpoint.consecutive_failures} failures"
+                )
+        self._publish(endpoint, now)
+
+    def record_latency(self, endpoint: Endpoint, latency: float):
+        """
+        Note a request that ended without an outcome. Its latency is only a
+        lower bound, so it can raise the EWMA but never lower it.
+        """
+        if latency > endpoint.latency:
+            self._fold_latency(endpoint, latency)
+        _outcomes.inc(service=self.service, endpoint=endpoint.name, outcome="cancelled")
+        self._publish(endpoint, time.monotonic())
+
+    async def call(self, fn: Callable[[Endpoint], Awaitable[T]], exclude: Optional[set] = None) -> T:
+        """
+        Run `fn` against the best endpoint, recording its latency and
+        outcome. An endpoint failure (is_endpoint_failure) is retried on the
+        next best endpoint, up to ENDPOINT_FAILOVER_ATTEMPTS in total; any
+        other error is raised without counting against the endpoint. A turn
+        deadline is recorded against the endpoint as slow but not retried. A
+        cancelled attempt (e.g. the losing side of a hedge) can only raise
+        the endpoint's latency.
+
+        Endpoints tried are added to `exclude`. Callers that run hedged
+        attempts can pass one shared set so each attempt uses a different
+        endpoint.
+        """
+        tried = exclude if exclude is not None else set()
+        attempts = max(1, min(settings.endpoint_failover_attempts, len(self.endpoints)))
+        for attempt in range(attempts):
+            endpoint = self.choose(exclude=tried)
+            tried.add(endpoint.name)
+            started = time.monotonic()
+            try:
+                result = await fn(endpoint)
+            except DeadlineExceeded:
+                self.record(endpoint, time.monotonic() - started, ok=False)
+                raise
+            except asyncio.CancelledError:
+                # hedged() cancels the slower attempt: it took at least this long
+                self.record_latency(endpoint, time.monotonic() - started)
+                raise
+            except Exception as e:
+                if not is_endpoint_failure(e):
+                    # The endpoint answered; the request itself was refused
+                    self.record(endpoint, time.monotonic() - started, ok=True)
+                    raise
+                self.record(endpoint, time.monotonic() - started, ok=False)
+                if attempt + 1 >= attempts:
+                    raise
+                logger.warning(f"{self.service} request to {endpoint.name} failed ({e}); failing over")
+                continue
+            self.record(endpoint, time.monotonic() - started, ok=True)
+            return result
+
+    @staticmethod
+    def _fold_latency(endpoint: Endpoint, latency: float):
+        if endpoint.samples == 0:
+            endpoint.latency = latency
+        else:
+            endpoint.latency += settings.endpoint_ewma_alpha * (latency - endpoint.latency)
+        endpoint.samples += 1
+
+    def _publish(self, endpoint: Endpoint, now: float):
+        _latency_ewma.set(round(endpoint.latency, 4), service=self.service, endpoint=endpoint.name)
+        _healthy.set(1 if endpoint.healthy(now) else 0, service=self.service, endpoint=endpoint.name)
+
+    def status(self) -> List[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "name": e.name,
+                "latency_ewma": round(e.latency, 4),
+                "error_rate": round(e.error_rate, 4),
+                "samples": e.samples,
+                "healthy": e.healthy(now),
+            }
+            for e in self.endpoints
+        ]
+
+
+# Global routers
+llm_endpoints = EndpointRouter(
+    "azure_openai",
+    parse_endpoints(settings.azure_openai_endpoints, settings.azure_openai_endpoint, settings.azure_openai_key),
+)
+speech_endpoints = EndpointRouter(
+    "azure_speech",
+    parse_endpoints(settings.azure_speech_regions, settings.azure_speech_region, settings.azure_speech_key),
+)
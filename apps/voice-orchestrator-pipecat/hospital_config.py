@@ -0,0 +1,241 @@
+"""
+Per-hospital config snapshots
+
+Keeps each hospital's record (with phone numbers), intents and departments
+in memory and persists them to disk, so calls are answered from the last
+snapshot instead of refetching from core-api on every call, and a restarted
+process can serve calls before core-api answers. core-api pushes changes
+through /internal/config-changed; snapshots are also refreshed in the
+background once they reach a maximum age, in case a push was missed.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from loguru import logger
+
+from config import settings
+from core_api_client import api_client
+from metrics import metrics
+from task_runtime import runtime
+from singleflight import SingleFlight
+
+
+# Hospital relations that aren't call config and shouldn't be written to disk
+EXCLUDED_RELATIONS = ("users",)
+
+# Hospital ids are cuids/uuids; anything else never reaches a URL or a path
+HOSPITAL_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+_lookups = metrics.counter(
+    "hospital_config_lookups_total", "Hospital config lookups by result (hit, stale, miss)"
+)
+_refreshes = metrics.counter(
+    "hospital_config_refreshes_total", "Hospital config refetches by reason and outcome"
+)
+
+
+@dataclass
+class HospitalSnapshot:
+    """One hospital's call config as of `fetched_at` (epoch seconds)"""
+    hospital_id: str
+    version: int
+    digest: str
+    fetched_at: float
+    hospital: Dict[str, Any]
+    intents: List[Dict[str, Any]]
+    departments: List[Dict[str, Any]]
+
+
+def is_valid_hospital_id(hospital_id: str) -> bool:
+    return bool(hospital_id) and HOSPITAL_ID_PATTERN.match(hospital_id) is not None
+
+
+def _phone_key(phone_number: str) -> str:
+    return ''.join(filter(str.isdigit, phone_number))[-10:]
+
+
+def _digest(hospital: Dict[str, Any], intents: List, departments: List) -> str:
+    body = json.dumps([hospital, intents, departments], sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+class HospitalConfigStore:
+    """In-memory, disk-backed hospital config with push invalidation"""
+
+    def __init__(self):
+        self._dir = Path(settings.config_snapshot_dir)
+        self._max_age = settings.config_snapshot_max_age_seconds
+        self._snapshots: Dict[str, HospitalSnapshot] = {}
+        # Last 10 digits of each Twilio number -> hospital id
+        self._by_phone: Dict[str, str] = {}
+        self._refreshes = SingleFlight("hospital_config")
+        self._background: Dict[str, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._snapshots)
+
+    # -------------------------------------------------------------------------
+    # Lookup
+    # -------------------------------------------------------------------------
+
+    def get(self, hospital_id: str) -> Optional[HospitalSnapshot]:
+        return self._snapshots.get(hospital_id)
+
+    def find_by_phone(self, phone_number: str) -> Optional[HospitalSnapshot]:
+        """
+        Snapshot for the hospital that owns a dialed number. Old snapshots are
+        still returned, with a refresh scheduled in the background.
+        """
+        hospital_id = self._by_phone.get(_phone_key(phone_number))
+        snapshot = self._snapshots.get(hospital_id) if hospital_id else None
+        if snapshot is None:
+            _lookups.inc(result="miss")
+            return None
+        if time.time() - snapshot.fetched_at >= self._max_age:
+            _lookups.inc(result="stale")
+            self.schedule_refresh(snapshot.hospital_id, reason="max_age")
+        else:
+            _lookups.inc(result="hit")
+        return snapshot
+
+    async def load_for_phone(self, phone_number: str) -> Optional[HospitalSnapshot]:
+        """Fetch the config for a number we have no snapshot for"""
+        hospital = await api_client.get_hospital_by_phone(phone_number)
+        if not hospital:
+            return None
+        return await self.refresh(hospital.get("id", ""), reason="miss")
+
+    # -------------------------------------------------------------------------
+    # Refresh
+    # -------------------------------------------------------------------------
+
+    async def refresh(self, hospital_id: str, reason: str = "warmup") -> Optional[HospitalSnapshot]:
+        """
+        Refetch one hospital's config. Keeps the old snapshot if core-api
+        can't be reached; concurrent refreshes of a hospital share one fetch.
+        """
+        if not is_valid_hospital_id(hospital_id):
+            return None
+        return await self._refreshes.do(hospital_id, lambda: self._refresh(hospital_id, reason))
+
+    async def _refresh(self, hospital_id: str, reason: str) -> Optional[HospitalSnapshot]:
+        hospital, intents, departments = await asyncio.gather(
+            api_client.get_hospital(hospital_id, include_relations=True),
+            api_client.list_intents(hospital_id),
+            api_client.list_departments(hospital_id),
+            return_exceptions=True,
+        )
+        previous = self._snapshots.get(hospital_id)
+        if not isinstance(hospital, dict):
+            _refreshes.inc(reason=reason, outcome="failed")
+            return previous
+
+        # A list that failed to load keeps its last known value rather than
+        # replacing a good snapshot with an empty one
+        partial = False
+        if not isinstance(intents, list):
+            if previous is None:
+                _refreshes.inc(reason=reason, outcome="failed")
+                logger.warning(f"Could not fetch intents for hospital {hospital_id}: {intents}")
+                return None
+            intents, partial = previous.intents, True
+        if not isinstance(departments, list):
+            if previous is None:
+                _refreshes.inc(reason=reason, outcome="failed")
+                logger.warning(f"Could not fetch departments for hospital {hospital_id}: {departments}")
+                return None
+            departments, partial = previous.departments, True
+
+        hospital = {k: v for k, v in hospital.items() if k not in EXCLUDED_RELATIONS}
+        digest = await runtime.run_in_process(_digest, hospital, intents, departments)
+        if previous and previous.digest == digest:
+            # Only a complete refetch proves the snapshot is current
+            if partial:
+                _refreshes.inc(reason=reason, outcome="partial")
+                return previous
+            previous.fetched_at = time.time()
+            _refreshes.inc(reason=reason, outcome="unchanged")
+            await runtime.run_in_thread(self._write, previous)
+            return previous
+
+        snapshot = HospitalSnapshot(
+            hospital_id=hospital_id,
+            version=previous.version + 1 if previous else 1,
+            digest=digest,
+            # A partial refetch keeps the old age so the missing lists are retried
+            fetched_at=previous.fetched_at if partial else time.time(),
+            hospital=hospital,
+            intents=intents,
+            departments=departments,
+        )
+        self._install(snapshot)
+        _refreshes.inc(reason=reason, outcome="partial" if partial else "changed")
+        logger.info(f"Hospital config {hospital_id} updated to version {snapshot.version}")
+        await runtime.run_in_thread(self._write, snapshot)
+        return snapshot
+
+    def schedule_refresh(self, hospital_id: str, reason: str):
+        """Refresh in the background unless a refresh is already running"""
+        task = self._background.get(hospital_id)
+        if task and not task.done():
+            return
+        task = runtime.spawn("config_refresh", self.refresh(hospital_id, reason=reason))
+        if task:
+            self._background[hospital_id] = task
+            task.add_done_callback(lambda t: self._background.pop(hospital_id, None))
+
+    def _install(self, snapshot: HospitalSnapshot):
+        previous = self._snapshots.get(snapshot.hospital_id)
+        if previous:
+            for pn in previous.hospital.get("phoneNumbers", []):
+                key = _phone_key(pn.get("twilioPhoneNumber", ""))
+                # The number may have moved to another hospital since
+                if self._by_phone.get(key) == snapshot.hospital_id:
+                    del self._by_phone[key]
+        self._snapshots[snapshot.hospital_id] = snapshot
+        for pn in snapshot.hospital.get("phoneNumbers", []):
+            key = _phone_key(pn.get("twilioPhoneNumber", ""))
+            if key:
+                self._by_phone[key] = snapshot.hospital_id
+
+    # -------------------------------------------------------------------------
+    # Persistence
+    # -------------------------------------------------------------------------
+
+    def load_from_disk(self) -> int:
+        """Load every persisted snapshot; returns how many were loaded"""
+        if not self._dir.is_dir():
+            return 0
+        loaded = 0
+        for path in self._dir.glob("*.json"):
+            try:
+                snapshot = HospitalSnapshot(**json.loads(path.read_text()))
+            except (OSError, ValueError, TypeError) as e:
+                logger.warning(f"Skipping unreadable config snapshot {path.name}: {e}")
+                continue
+            self._install(snapshot)
+            loaded += 1
+        logger.info(f"Loaded {loaded} hospital config snapshots from {self._dir}")
+        return loaded
+
+    def _write(self, snapshot: HospitalSnapshot):
+        """Write a snapshot atomically so a crash never leaves a torn file"""
+        try:
+            self._dir.mkdir(parents=True, exist_ok=True)
+            path = self._dir / f"{snapshot.hospital_id}.json"
+            # Per-process temp name: workers share the snapshot directory
+            tmp = path.with_suffix(f".json.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(asdict(snapshot), default=str))
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Could not persist config snapshot {snapshot.hospital_id}: {e}")
+
+
+# Global hospital config store
+hospital_configs = HospitalConfigStore()
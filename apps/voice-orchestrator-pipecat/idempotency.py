@@ -0,0 +1,140 @@
+"""
+Idempotent Twilio webhooks
+
+When a webhook is slow, Twilio retries it. Without deduplication every
+retry of /voice/process appends the same utterance to the conversation
+again and sends another full LLM request, doubling load exactly when we
+are already slow.
+
+Each webhook is keyed by CallSid plus a fingerprint of the request:
+- Twilio's I-Twilio-Idempotency-Token header, which is the same on every
+  retry of one event
+- otherwise, a hash of the path and form fields
+
+The first request runs the handler. A duplicate that arrives while it is
+still running waits for the same result; one that arrives later gets the
+stored TwiML back. The original keeps running even if Twilio gave up on
+its connection, so the retry still gets an answer.
+
+Results are kept for WEBHOOK_IDEMPOTENCY_TTL_SECONDS in a store bounded to
+WEBHOOK_IDEMPOTENCY_MAX_ENTRIES (oldest evicted first). A failed handler is
+not remembered, so a retry after an error runs again.
+"""
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Mapping, Tuple
+from loguru import logger
+
+from fastapi import Request, Response
+
+from config import settings
+from metrics import metrics
+
+
+IDEMPOTENCY_HEADER = "i-twilio-idempotency-token"
+
+_duplicates = metrics.counter(
+    "webhook_duplicates_total",
+    "Duplicate webhooks answered without re-running, by path and whether the original was in flight",
+)
+_entries_gauge = metrics.gauge("webhook_idempotency_entries", "Webhook results held for deduplication")
+
+
+@dataclass
+class _Entry:
+    task: asyncio.Task
+    created_at: float
+
+
+@dataclass
+class _Rendered:
+    """A handler's response, reduced to what's needed to send it again"""
+    body: bytes
+    status_code: int
+    media_type: str
+
+
+def fingerprint(request: Request, form: Mapping[str, str]) -> str:
+    """What identifies one webhook event across Twilio's retries"""
+    token = request.headers.get(IDEMPOTENCY_HEADER)
+    if token:
+        return token
+    digest = hashlib.sha256(request.url.path.encode())
+    for name, value in sorted(form.items()):
+        digest.update(b"\0" + str(name).encode() + b"=" + str(value).encode())
+    return digest.hexdigest()
+
+
+class WebhookIdempotency:
+    """Bounded TTL store of in-flight and recent webhook results"""
+
+    def __init__(self):
+        self._max_entries = settings.webhook_idempotency_max_entries
+        self._ttl = settings.webhook_idempotency_ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+
+    async def handle(
+        self,
+        request: Request,
+        form: Mapping[str, str],
+        handler: Callable[[], Awaitable[Response]],
+    ) -> Response:
+        """Run `handler` once per webhook event; duplicates get its response"""
+        call_sid = form.get("CallSid", "")
+        if not call_sid:
+            return await handler()
+        key = (call_sid, fingerprint(request, form))
+        self._expire()
+
+        entry = self._entries.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(self._render(handler))
+            entry = self._entries[key] = _Entry(task, time.monotonic())
+            task.add_done_callback(lambda t: self._finished(key, t))
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+            _entries_gauge.set(len(self._entries))
+        else:
+            path = request.url.path
+            _duplicates.inc(path=path, state="completed" if entry.task.done() else "in_flight")
+            logger.info(f"Duplicate {path} webhook for {call_sid}; answering with the original result")
+
+        # Shielded: a dropped connection mustn't cancel the turn its retry is waiting on
+        rendered = await asyncio.shield(entry.task)
+        return Response(
+            content=rendered.body,
+            status_code=rendered.status_code,
+            media_type=rendered.media_type,
+        )
+
+    async def _render(self, handler: Callable[[], Awaitable[Response]]) -> _Rendered:
+        response = await handler()
+        return _Rendered(response.body, response.status_code, response.media_type or "text/xml")
+
+    def _finished(self, key: Tuple[str, str], task: asyncio.Task):
+        if task.cancelled() or task.exception() is not None:
+            # Let a retry run the handler again
+            entry = self._entries.get(key)
+            if entry is not None and entry.task is task:
+                del self._entries[key]
+                _entries_gauge.set(len(self._entries))
+
+    def _expire(self):
+        """Drop entries past their TTL; the oldest are at the front"""
+        cutoff = time.monotonic() - self._ttl
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.created_at > cutoff or not entry.task.done():
+                break
+            del self._entries[key]
+        _entries_gauge.set(len(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Global webhook deduplication
+webhook_idempotency = WebhookIdempotency()
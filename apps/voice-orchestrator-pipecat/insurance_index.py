@@ -0,0 +1,255 @@
+"""
+Prefetched insurance carrier index
+
+Keeps each hospital's accepted-plan list in memory and answers "do you take
+my insurance?" locally with fuzzy matching (character trigrams plus phonetic
+keys), so speech-to-text spelling variations still hit. The index only
+holds every accepted carrier, so a fresh index that doesn't find the named
+carrier answers "not accepted" itself. core-api's plan check is only asked
+when the index is missing or stale, and only about a carrier the stale index
+matched; the caller's words never leave the process.
+"""
+import asyncio
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Set, Tuple
+from loguru import logger
+
+from config import settings
+from core_api_client import api_client
+from task_runtime import runtime
+
+
+# Words callers add around carrier names that carry no signal
+_FILLER_WORDS = {
+    "insurance", "health", "healthcare", "plan", "plans", "coverage", "the",
+    "of", "and", "inc", "co", "company", "my", "i", "have", "do", "does", "you",
+    "guys", "your", "we", "our", "take", "accept", "accepted", "covered", "is",
+    "are", "a", "with", "through", "under", "in", "network", "if", "it", "was",
+    "wondering", "about", "what", "can", "use", "still", "office", "hospital",
+    "clinic",
+}
+
+_SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"), **dict.fromkeys("cgjkqsxz", "2"),
+    **dict.fromkeys("dt", "3"), "l": "4", **dict.fromkeys("mn", "5"), "r": "6",
+}
+
+# Discount for matching only part of a carrier name, and the minimum
+# window size (in trigrams) before partial matches are considered
+PARTIAL_MATCH_WEIGHT = 0.85
+MIN_PARTIAL_GRAMS = 7
+
+# Phrases that mark a turn as an insurance question
+INSURANCE_CUES = (
+    "insurance", "accept", "take my", "do you take", "do you guys take",
+    "in network", "in-network", "covered", "coverage", "my plan",
+)
+
+
+def normalize(text: str) -> List[str]:
+    """Lowercase, strip punctuation and filler words"""
+    tokens = re.findall(r"[a-z0-9]+", text.lower())
+    return [t for t in tokens if t not in _FILLER_WORDS]
+
+
+def phonetic_key(token: str) -> str:
+    """
+    Soundex-style key that also codes the first letter, so "Etna"/"Aetna"
+    and "Signa"/"Cigna" collide the way speech-to-text confuses them.
+    """
+    key = []
+    last = None
+    for index, char in enumerate(token):
+        code = _SOUNDEX_CODES.get(char, "")
+        if index == 0:
+            key.append(code or "V")
+        elif code and code != last:
+            key.append(code)
+        if char not in "hw":
+            last = code
+    return "".join(key)
+
+
+def trigrams(text: str) -> Set[str]:
+    """Character trigrams, ignoring spaces so "blue cross" matches "bluecross" """
+    padded = f"  {text.replace(' ', '')} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def is_insurance_question(text: str) -> bool:
+    """Cheap check for whether a caller is asking about insurance"""
+    lowered = text.lower()
+    return any(cue in lowered for cue in INSURANCE_CUES)
+
+
+@dataclass
+class _Entry:
+    """One indexed carrier name with the plans it covers"""
+    carrier: str
+    tokens: List[str]
+    grams: Set[str]
+    phonetic: Set[str]
+    plans: List[Dict[str, Any]] = field(default_factory=list)
+
+
+@dataclass
+class _HospitalIndex:
+    fetched_at: float
+    entries: List[_Entry]
+
+
+class InsuranceIndex:
+    """Per-hospital fuzzy index of accepted insurance plans"""
+
+    def __init__(self):
+        self._ttl = settings.insurance_index_ttl_seconds
+        self._threshold = settings.insurance_match_threshold
+        self._indexes: Dict[str, _HospitalIndex] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
+    def is_fresh(self, hospital_id: str) -> bool:
+        index = self._indexes.get(hospital_id)
+        return index is not None and time.monotonic() - index.fetched_at < self._ttl
+
+    async def prefetch(self, hospital_id: str):
+        """Load a hospital's plans if the index is missing or stale"""
+        if hospital_id and not self.is_fresh(hospital_id):
+            await self.refresh(hospital_id)
+
+    async def refresh(self, hospital_id: str):
+        """Fetch the accepted-plan list and rebuild the hospital's index"""
+        plans = await api_client.get_insurance_plans(hospital_id)
+        if plans is None:
+            return
+        # Trigram and phonetic keys for every plan; off the event loop
+        entries = await runtime.run_in_process(InsuranceIndex._build, plans)
+        self._indexes[hospital_id] = _HospitalIndex(
+            fetched_at=time.monotonic(),
+            entries=entries,
+        )
+        logger.info(f"Indexed {len(plans)} insurance plans for hospital {hospital_id}")
+
+    def invalidate(self, hospital_id: str):
+        self._indexes.pop(hospital_id, None)
+
+    @staticmethod
+    def _build(plans: List[Dict[str, Any]]) -> List[_Entry]:
+        today = datetime.now(timezone.utc).date().isoformat()
+        by_carrier: Dict[str, _Entry] = {}
+        for plan in plans:
+            if not plan.get("isAccepted", True):
+                continue
+            termination = plan.get("terminationDate")
+            if termination and termination[:10] <= today:
+                continue
+            carrier = plan.get("carrierName", "")
+            tokens = normalize(carrier)
+            if not tokens:
+                continue
+            key = " ".join(tokens)
+            entry = by_carrier.get(key)
+            if entry is None:
+                entry = by_carrier[key] = _Entry(
+                    carrier=carrier,
+                    tokens=tokens,
+                    grams=trigrams(key),
+                    phonetic={phonetic_key(t) for t in tokens},
+                )
+            entry.plans.append(plan)
+        return list(by_carrier.values())
+
+    @staticmethod
+    def _score(entry: _Entry, grams: Set[str], phonetic: Set[str]) -> float:
+        shared_grams = grams & entry.grams
+        shared_keys = phonetic & entry.phonetic
+        score = max(
+            len(shared_grams) / len(grams | entry.grams),
+            len(shared_keys) / len(phonetic | entry.phonetic),
+        )
+        if len(grams) >= MIN_PARTIAL_GRAMS:
+            # A distinctive partial name ("Kaiser", "United") still counts
+            partial = max(len(shared_grams) / len(grams), len(shared_keys) / len(phonetic))
+            score = max(score, PARTIAL_MATCH_WEIGHT * partial)
+        return score
+
+    def match(self, hospital_id: str, text: str) -> Optional[Tuple[_Entry, float]]:
+        """Best carrier match for a free-form utterance, if any clears the threshold"""
+        index = self._indexes.get(hospital_id)
+        tokens = normalize(text)
+        if index is None or not tokens:
+            return None
+
+        # Features for each token window, shared across carriers
+        windows: Dict[Tuple[int, int], Tuple[Set[str], Set[str]]] = {}
+        best: Optional[Tuple[_Entry, float]] = None
+        for entry in index.entries:
+            size = len(entry.tokens)
+            # Compare against every window near the carrier name's length
+            for width in {max(1, size - 1), size, size + 1}:
+                for start in range(max(1, len(tokens) - width + 1)):
+                    features = windows.get((start, width))
+                    if features is None:
+                        window = tokens[start:start + width]
+                        features = windows[(start, width)] = (
+                            trigrams(" ".join(window)),
+                            {phonetic_key(t) for t in window},
+                        )
+                    score = self._score(entry, *features)
+                    if best is None or score > best[1]:
+                        best = (entry, score)
+        if best and best[1] >= self._threshold:
+            return best
+        return None
+
+    async def check(self, hospital_id: str, text: str) -> Optional[Dict[str, Any]]:
+        """
+        Answer an insurance question. Returns the same shape as core-api's
+        /insurance/plans/check ({isAccepted, matchingPlans}) plus the carrier
+        asked about, or None when the caller didn't name one.
+        """
+        fresh = self.is_fresh(hospital_id)
+        if not fresh:
+            self._schedule_refresh(hospital_id)
+
+        found = self.match(hospital_id, text)
+        if found and fresh:
+            entry, score = found
+            return {
+                "isAccepted": True,
+                "carrierName": entry.carrier,
+                "matchingPlans": entry.plans,
+                "score": round(score, 2),
+            }
+
+        if fresh:
+            # Every accepted carrier is indexed; words left after dropping
+            # filler mean the caller named one we don't take
+            if not normalize(text):
+                return None
+            return {"isAccepted": False, "carrierName": None, "matchingPlans": []}
+
+        # A stale index may still name the carrier; confirm it with core-api
+        if not found:
+            return None
+        carrier = found[0].carrier
+        result = await api_client.check_insurance_plan(hospital_id, carrier)
+        if result is None:
+            return None
+        # Shared with concurrent identical checks; copy rather than mutate
+        return {"carrierName": carrier, **result}
+
+    def _schedule_refresh(self, hospital_id: str):
+        """Rebuild a stale index in the background, once at a time"""
+        if hospital_id in self._refreshing:
+            return
+        task = runtime.spawn("insurance_refresh", self.refresh(hospital_id))
+        if task:
+            self._refreshing[hospital_id] = task
+            task.add_done_callback(lambda _: self._refreshing.pop(hospital_id, None))
+
+
+# Global insurance index
+insurance_index = InsuranceIndex()
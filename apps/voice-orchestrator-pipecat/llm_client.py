@@ -0,0 +1,30 @@
+"""
+Azure OpenAI clients for the webhook turns and the sentiment service, one
+per configured endpoint (see endpoint_router)
+"""
+from typing import Dict, Optional
+
+from config import settings
+from endpoint_router import Endpoint, llm_endpoints
+
+
+_llm_clients: Dict[str, object] = {}
+
+
+def get_llm_client(endpoint: Optional[Endpoint] = None):
+    """
+    Shared client for an endpoint (the current best one by default);
+    retries are off because turns carry deadlines and the router fails over
+    """
+    endpoint = endpoint or llm_endpoints.choose()
+    client = _llm_clients.get(endpoint.name)
+    if client is None:
+        from openai import AsyncAzureOpenAI
+        
+        client = _llm_clients[endpoint.name] = AsyncAzureOpenAI(
+            api_key=endpoint.key,
+            api_version=settings.azure_openai_api_version,
+            azure_endpoint=endpoint.target,
+            max_retries=0,
+        )
+    return client
@@ -0,0 +1,310 @@
+"""
+Weighted fair scheduling of LLM requests across hospitals
+
+Every hospital shares one Azure OpenAI deployment and its tokens-per-minute
+quota. Requests wait in a queue per hospital and are dispatched in weighted
+fair order over their estimated tokens (start-time fair queuing). Each
+hospital draws from its own token bucket sized by its weight, and all of
+them draw from a shared bucket sized to the deployment quota. One busy
+tenant can't starve the others or push everyone into 429s.
+
+Emergency and escalation turns get priority lanes. They are served before
+normal turns, aren't held back by their hospital's budget (it is still
+charged), and may use a reserve of the shared bucket that normal turns
+leave alone.
+
+Dispatch also takes a slot from admission's adaptive LLM limiter, so the
+concurrency cap and the queue order come from one place.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from config import settings
+from admission import AdaptiveLimiter, OverloadedError, admission
+from call_context import CallContext, CallState
+from metrics import metrics
+from resilience import remaining
+
+
+# Highest priority first
+LANES = ("emergency", "escalation", "normal")
+
+# Seconds of quota a bucket can bank for a burst
+BURST_SECONDS = 10.0
+# ...but never less than a few full turns, so a budget split across
+# dispatcher workers still lets a normal turn through without waiting
+MIN_BURST_TOKENS = 4000
+# Rough prompt size estimate; usage from the response corrects it afterwards
+CHARS_PER_TOKEN = 4
+TOKENS_PER_MESSAGE = 4
+# Don't re-check buckets more often than this while waiting on a refill
+MIN_RECHECK_SECONDS = 0.005
+
+_queue_wait = metrics.histogram(
+    "llm_queue_wait_seconds", "Time LLM requests waited to be scheduled, by hospital and lane"
+)
+_queued = metrics.gauge("llm_scheduler_queued", "LLM requests waiting, by lane")
+_tokens = metrics.counter("llm_scheduled_tokens_total", "LLM tokens charged, by hospital and lane")
+_rejected = metrics.counter(
+    "llm_scheduler_rejected_total", "LLM requests that timed out in the queue, by hospital and lane"
+)
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """Parse "hospitalA=2,hospitalB=0.5" into {hospital_id: weight}"""
+    weights = {}
+    for part in spec.split(","):
+        hospital_id, _, weight = part.partition("=")
+        if hospital_id.strip() and weight.strip():
+            weights[hospital_id.strip()] = max(0.01, float(weight))
+    return weights
+
+
+def estimate_tokens(messages: List[Dict[str, Any]], max_completion_tokens: int) -> int:
+    """Prompt plus completion tokens a chat request may use"""
+    chars = sum(len(m.get("content") or "") for m in messages)
+    return chars // CHARS_PER_TOKEN + TOKENS_PER_MESSAGE * len(messages) + max_completion_tokens
+
+
+def lane_for(context: CallContext) -> str:
+    """Scheduling lane for a call's next LLM turn"""
+    if context.is_emergency:
+        return "emergency"
+    if context.state == CallState.ESCALATING or context.sentiment.escalation_needed:
+        return "escalation"
+    return "normal"
+
+
+class TokenBucket:
+    """Tokens refilled continuously at a per-minute rate; may go into debt"""
+
+    def __init__(self, tokens_per_minute: float):
+        self.rate = tokens_per_minute / 60.0
+        self.capacity = max(float(MIN_BURST_TOKENS), self.rate * BURST_SECONDS)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def available(self, now: float) -> float:
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return self.tokens
+
+    def take(self, amount: float):
+        self.tokens -= amount
+
+    def wait_time(self, amount: float, now: float, reserve: float = 0.0) -> float:
+        """Seconds until `amount` tokens are free above `reserve`; 0 if they are now"""
+        # A request bigger than the bucket waits for a full bucket, not forever
+        needed = min(amount + reserve, self.capacity)
+        return max(0.0, needed - self.available(now)) / self.rate
+
+
+@dataclass
+class Grant:
+    """A queued or dispatched request; set `used_tokens` from the response"""
+    hospital_id: str
+    lane: str
+    tokens: int
+    start: float
+    enqueued: float
+    future: asyncio.Future
+    dispatched: float = 0.0
+    used_tokens: Optional[int] = None
+
+
+@dataclass
+class _HospitalState:
+    bucket: Optional[TokenBucket]
+    weight: float
+    last_finish: float = 0.0
+    queues: Dict[str, Deque[Grant]] = field(
+        default_factory=lambda: {lane: deque() for lane in LANES}
+    )
+
+
+class LLMScheduler:
+    """Per-hospital weighted fair queues in front of the LLM concurrency limit"""
+
+    def __init__(self, limiter: AdaptiveLimiter):
+        self._limiter = limiter
+        self._weights = parse_weights(settings.llm_hospital_weights)
+        self._shared: Optional[TokenBucket] = None
+        self._reserve = 0.0
+        if settings.llm_tokens_per_minute > 0:
+            self._shared = TokenBucket(settings.llm_tokens_per_minute)
+            self._reserve = self._shared.capacity * settings.llm_priority_reserve_fraction
+        self._hospitals: Dict[str, _HospitalState] = {}
+        self._virtual_time = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _hospital(self, hospital_id: str) -> _HospitalState:
+        state = self._hospitals.get(hospital_id)
+        if state is None:
+            weight = self._weights.get(hospital_id, 1.0)
+            budget = settings.llm_hospital_tokens_per_minute * weight
+            state = self._hospitals[hospital_id] = _HospitalState(
+                bucket=TokenBucket(budget) if budget > 0 else None,
+                weight=weight,
+            )
+        return state
+
+    @asynccontextmanager
+    async def slot(self, hospital_id: Optional[str], lane: str, tokens: int):
+        """
+        Wait for this hospital's turn and budget, then hold an LLM slot.
+        Raises OverloadedError if none frees up within the queue timeout,
+        or DeadlineExceeded if the turn has no time left.
+        """
+        timeout = remaining(settings.llm_queue_timeout_seconds)
+        grant = self._enqueue(hospital_id or "unknown", lane, tokens)
+        try:
+            done, _ = await asyncio.wait({grant.future}, timeout=timeout)
+        except BaseException:
+            self._abandon(grant)
+            raise
+        if not done:
+            self._abandon(grant)
+            _rejected.inc(hospital=grant.hospital_id, lane=lane)
+            self._limiter.reject()
+            raise OverloadedError("llm")
+        try:
+            yield grant
+        finally:
+            self._release(grant)
+
+    # -------------------------------------------------------------------------
+    # Queueing
+    # -------------------------------------------------------------------------
+
+    def _enqueue(self, hospital_id: str, lane: str, tokens: int) -> Grant:
+        state = self._hospital(hospital_id)
+        start = max(self._virtual_time, state.last_finish)
+        state.last_finish = start + tokens / state.weight
+        grant = Grant(
+            hospital_id=hospital_id,
+            lane=lane if lane in LANES else "normal",
+            tokens=tokens,
+            start=start,
+            enqueued=time.monotonic(),
+            future=asyncio.get_running_loop().create_future(),
+        )
+        state.queues[grant.lane].append(grant)
+        self._dispatch()
+        return grant
+
+    def _abandon(self, grant: Grant):
+        """The waiter gave up; hand back a slot it was granted meanwhile"""
+        if grant.future.done() and not grant.future.cancelled():
+            self._release(grant)
+        else:
+            grant.future.cancel()
+            self._dispatch()
+
+    def _release(self, grant: Grant):
+        if grant.used_tokens is not None:
+            # Settle the estimate against what the request really used
+            correction = grant.used_tokens - grant.tokens
+            for bucket in self._buckets(grant):
+                bucket.take(correction)
+            _tokens.inc(correction, hospital=grant.hospital_id, lane=grant.lane)
+        self._limiter.release(time.monotonic() - grant.dispatched)
+        self._dispatch()
+
+    # -------------------------------------------------------------------------
+    # Dispatch
+    # -------------------------------------------------------------------------
+
+    def _dispatch(self):
+        """Hand out slots to every request that may go now, in fair order"""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        now = time.monotonic()
+        while True:
+            grant, wait = self._next(now)
+            if grant is None:
+                break
+            state = self._hospitals[grant.hospital_id]
+            state.queues[grant.lane].popleft()
+            for bucket in self._buckets(grant):
+                bucket.take(grant.tokens)
+            self._virtual_time = max(self._virtual_time, grant.start)
+            grant.dispatched = now
+            grant.future.set_result(True)
+            _queue_wait.observe(now - grant.enqueued, hospital=grant.hospital_id, lane=grant.lane)
+            _tokens.inc(grant.tokens, hospital=grant.hospital_id, lane=grant.lane)
+        if wait is not None:
+            self._schedule_recheck(wait)
+        self._publish()
+
+    def _next(self, now: float) -> Tuple[Optional[Grant], Optional[float]]:
+        """
+        The request to dispatch now, or (None, seconds until a token refill
+        could unblock one). (None, None) means the queues are empty or every
+        LLM slot is taken; a release will dispatch again.
+        """
+        wait = None
+        for lane in LANES:
+            heads = []
+            for state in self._hospitals.values():
+                queue = state.queues[lane]
+                while queue and queue[0].future.done():
+                    queue.popleft()  # Timed out or cancelled
+                if queue:
+                    heads.append(queue[0])
+            heads.sort(key=lambda g: g.start + g.tokens / self._hospitals[g.hospital_id].weight)
+            for grant in heads:
+                blocked = self._budget_wait(grant, now)
+                if blocked > 0:
+                    wait = blocked if wait is None else min(wait, blocked)
+                    continue
+                if not self._limiter.try_acquire():
+                    return None, None
+                return grant, None
+        return None, wait
+
+    def _budget_wait(self, grant: Grant, now: float) -> float:
+        priority = grant.lane != "normal"
+        wait = 0.0
+        if self._shared:
+            wait = self._shared.wait_time(grant.tokens, now, 0.0 if priority else self._reserve)
+        bucket = self._hospitals[grant.hospital_id].bucket
+        if bucket and not priority:
+            wait = max(wait, bucket.wait_time(grant.tokens, now))
+        return wait
+
+    def _buckets(self, grant: Grant) -> List[TokenBucket]:
+        return [b for b in (self._shared, self._hospitals[grant.hospital_id].bucket) if b]
+
+    def _schedule_recheck(self, delay: float):
+        loop = asyncio.get_running_loop()
+        self._timer = loop.call_later(max(delay, MIN_RECHECK_SECONDS), self._dispatch)
+
+    def _publish(self):
+        for lane in LANES:
+            _queued.set(
+                sum(len(s.queues[lane]) for s in self._hospitals.values()), lane=lane
+            )
+
+    def status(self) -> Dict[str, Any]:
+        """Queue depth and remaining budget per hospital"""
+        now = time.monotonic()
+        return {
+            "shared_tokens": int(self._shared.available(now)) if self._shared else None,
+            "hospitals": {
+                hospital_id: {
+                    "weight": state.weight,
+                    "tokens": int(state.bucket.available(now)) if state.bucket else None,
+                    "queued": {lane: len(q) for lane, q in state.queues.items() if q},
+                }
+                for hospital_id, state in self._hospitals.items()
+            },
+        }
+
+
+# Global LLM scheduler, sharing admission's LLM concurrency limit
+llm_scheduler = LLMScheduler(admission.llm)
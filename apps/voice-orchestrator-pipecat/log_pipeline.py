@@ -0,0 +1,211 @@
+"""
+Non-blocking log pipeline
+
+Loguru sinks normally write from whichever thread logs, which for us is
+the event loop; a slow disk or a blocked stderr pipe then stalls every
+call. Here each sink is a bounded queue drained in batches by a
+background thread. When the queue is full, records are dropped and
+counted instead of blocking the caller.
+
+High-volume categories (media frames, sentiment debug lines) are sampled:
+log them via `logger.bind(category="media")` and only one in N is kept.
+"""
+import queue
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, TextIO
+from loguru import logger
+
+from config import settings
+from metrics import metrics
+
+
+LOG_FORMAT = (
+    "{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <8} | "
+    "{name}:{function}:{line} - {message}"
+)
+
+_dropped = metrics.counter("log_records_dropped_total", "Log records dropped because a sink queue was full")
+_sampled_out = metrics.counter("log_records_sampled_out_total", "High-volume log records skipped by sampling")
+
+_STOP = object()
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """Parse "media=0.01,sentiment=0.1" into {category: rate}"""
+    rates = {}
+    for part in spec.split(","):
+        category, _, rate = part.partition("=")
+        if category.strip() and rate.strip():
+            rates[category.strip()] = max(0.0, min(1.0, float(rate)))
+    return rates
+
+
+class CategorySampler:
+    """Loguru filter keeping one in every 1/rate records per category"""
+
+    def __init__(self, sink: str, rates: Dict[str, float]):
+        self._sink = sink
+        self._every = {c: (round(1 / r) if r > 0 else 0) for c, r in rates.items()}
+        self._seen: Dict[str, int] = {}
+
+    def __call__(self, record) -> bool:
+        category = record["extra"].get("category")
+        every = self._every.get(category)
+        if every is None or every == 1:
+            return True
+        seen = self._seen.get(category, 0)
+        self._seen[category] = seen + 1
+        if every and seen % every == 0:
+            return True
+        _sampled_out.inc(sink=self._sink, category=category)
+        return False
+
+
+class DailyFile:
+    """Append-only log file rotated at midnight, keeping `retention_days` old files"""
+
+    def __init__(self, path: str, retention_days: int):
+        self.path = Path(path)
+        self.retention_days = retention_days
+        self._day: Optional[date] = None
+        self._stream: Optional[TextIO] = None
+
+    def write(self, text: str):
+        today = date.today()
+        if self._stream is None or today != self._day:
+            self._rotate(today)
+        self._stream.write(text)
+
+    def flush(self):
+        if self._stream:
+            self._stream.flush()
+
+    def close(self):
+        if self._stream:
+            self._stream.close()
+            self._stream = None
+
+    def _rotate(self, today: date):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self._stream is not None:
+            self._stream.close()
+            self._archive(self._day)
+        elif self.path.exists():
+            # Left over from before a restart; archive it under its own day
+            written = date.fromtimestamp(self.path.stat().st_mtime)
+            if written < today:
+                self._archive(written)
+        cutoff = today - timedelta(days=self.retention_days)
+        for old in self.path.parent.glob(f"{self.path.stem}.*{self.path.suffix}"):
+            try:
+                if date.fromisoformat(old.name[len(self.path.stem) + 1:-len(self.path.suffix)]) < cutoff:
+                    old.unlink()
+            except ValueError:
+                continue
+        self._stream = open(self.path, "a", encoding="utf-8")
+        self._day = today
+
+    def _archive(self, day: date):
+        self.path.rename(self.path.with_name(f"{self.path.stem}.{day}{self.path.suffix}"))
+
+
+class QueuedSink:
+    """Loguru sink that hands formatted records to a writer thread"""
+
+    def __init__(self, name: str, stream, max_queue: int, batch_size: int, flush_interval: float):
+        self.name = name
+        self._stream = stream
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name=f"log-{name}", daemon=True)
+        self._thread.start()
+
+    def __call__(self, message):
+        try:
+            self._queue.put_nowait(str(message))
+        except queue.Full:
+            _dropped.inc(sink=self.name)
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self._flush_interval)
+            except queue.Empty:
+                continue
+            batch: List[str] = []
+            item = first
+            while item is not _STOP:
+                batch.append(item)
+                if len(batch) >= self._batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._write(batch)
+            if item is _STOP:
+                return
+
+    def _write(self, batch: List[str]):
+        if not batch:
+            return
+        try:
+            self._stream.write("".join(batch))
+            self._stream.flush()
+        except Exception as e:
+            # Never let a broken sink take down the writer thread
+            print(f"Log sink {self.name} write failed: {e}", file=sys.__stderr__)
+
+    def stop(self, timeout: float = 5.0):
+        """Flush what's queued and stop the writer thread"""
+        deadline = time.monotonic() + timeout
+        while self._thread.is_alive() and time.monotonic() < deadline:
+            try:
+                self._queue.put(_STOP, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        self._thread.join(max(0.0, deadline - time.monotonic()))
+        if hasattr(self._stream, "close") and self._stream is not sys.stderr:
+            self._stream.close()
+
+
+_sinks: List[QueuedSink] = []
+
+
+def configure_logging():
+    """Replace loguru's default synchronous stderr sink with queued sinks"""
+    rates = parse_sample_rates(settings.log_sample_rates)
+    streams = [
+        ("stderr", sys.stderr, settings.log_level),
+        ("file", DailyFile(settings.log_file, settings.log_retention_days), settings.log_file_level),
+    ]
+    logger.remove()
+    for name, stream, level in streams:
+        sink = QueuedSink(
+            name,
+            stream,
+            max_queue=settings.log_queue_size,
+            batch_size=settings.log_batch_size,
+            flush_interval=settings.log_flush_interval_seconds,
+        )
+        _sinks.append(sink)
+        logger.add(
+            sink,
+            level=level,
+            format=LOG_FORMAT,
+            filter=CategorySampler(name, rates),
+            colorize=False,
+        )
+
+
+def shutdown_logging():
+    """Flush queued records; call once on shutdown"""
+    for sink in _sinks:
+        sink.stop()
+    _sinks.clear()
@@ -0,0 +1,153 @@
+"""
+Per-turn model tiering
+
+Every webhook turn used to go to AZURE_OPENAI_DEPLOYMENT with the same
+token limit. That included acknowledgments like "okay, thanks", which a
+smaller model answers faster. Each turn is now classified in-process, from
+cheap lexical cues and the call's state, into one of three tiers:
+- fast: short acknowledgments, greetings and yes/no answers with no
+  question or workflow guidance
+- strong: emergencies and escalations, frustrated callers, long or
+  multi-question turns, and medical, billing or scheduling detail
+- standard: everything else
+
+Each tier has its own deployment and completion-token limit. The fast
+tier is only used once LLM_FAST_DEPLOYMENT is set; an unset strong
+deployment means AZURE_OPENAI_DEPLOYMENT with the larger token limit.
+
+A fast-tier answer that comes back empty or cut off is retried on the
+standard tier while the turn has time. Turns, latency and fallbacks are
+exported per tier.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from config import settings
+from call_context import CallContext, CallState
+from metrics import metrics
+from resilience import LatencyTracker
+
+
+FAST = "fast"
+STANDARD = "standard"
+STRONG = "strong"
+
+# Longest turn (in words) that can still count as an acknowledgment
+FAST_MAX_WORDS = 5
+# Turns longer than this go to the strong tier
+STRONG_MIN_WORDS = 40
+
+ACKNOWLEDGMENT_WORDS = frozenset({
+    "ok", "okay", "alright", "all", "right", "sure", "yes", "yeah", "yep", "yup",
+    "no", "nope", "nah", "thanks", "thank", "you", "great", "good", "perfect",
+    "cool", "fine", "got", "it", "hello", "hi", "hey", "bye", "goodbye", "uh",
+    "um", "huh", "mhm", "hmm", "that's", "sounds", "correct", "please", "so",
+    "much", "very", "oh", "i", "see", "understand",
+})
+COMPLEX_CUES = (
+    "medication", "prescription", "dose", "dosage", "symptom", "side effect",
+    "diagnos", "test result", "lab result", "referral", "surgery", "procedure",
+    "bill", "charge", "payment", "refund", "reschedule", "cancel", "why",
+    "explain", "difference", "compare", "both", "instead",
+)
+_WORD = re.compile(r"[a-z']+")
+
+_turns = metrics.counter("llm_tier_turns_total", "Webhook LLM turns by model tier")
+_latency = metrics.histogram("llm_tier_latency_seconds", "LLM request latency by model tier")
+_fallbacks = metrics.counter(
+    "llm_tier_fallbacks_total", "Turns retried on a stronger tier, by tier and reason"
+)
+
+
+@dataclass
+class ModelTier:
+    """A deployment and token limit for one class of turn"""
+    name: str
+    deployment: str
+    max_completion_tokens: int
+    # Per tier, so hedging waits on the right model's latency
+    latency: LatencyTracker = field(default_factory=LatencyTracker)
+
+    def record(self, seconds: float):
+        self.latency.record(seconds)
+        _latency.observe(seconds, tier=self.name)
+
+
+def _tiers() -> Dict[str, ModelTier]:
+    default = settings.azure_openai_deployment
+    return {
+        FAST: ModelTier(
+            FAST,
+            settings.llm_fast_deployment or default,
+            settings.llm_fast_max_completion_tokens,
+        ),
+        STANDARD: ModelTier(STANDARD, default, settings.llm_max_completion_tokens),
+        STRONG: ModelTier(
+            STRONG,
+            settings.llm_strong_deployment or default,
+            settings.llm_strong_max_completion_tokens,
+        ),
+    }
+
+
+def classify_turn(context: CallContext, user_message: str, instructions: Optional[str] = None) -> str:
+    """Tier for a turn, from the caller's words and the call's state"""
+    if (
+        context.is_emergency
+        or context.state == CallState.ESCALATING
+        or context.sentiment.escalation_needed
+        or context.sentiment.frustration_level >= settings.llm_strong_frustration
+    ):
+        return STRONG
+    lowered = user_message.lower()
+    words = _WORD.findall(lowered)
+    if len(words) >= STRONG_MIN_WORDS or lowered.count("?") > 1:
+        return STRONG
+    if any(cue in lowered for cue in COMPLEX_CUES):
+        return STRONG
+    if (
+        len(words) <= FAST_MAX_WORDS
+        and "?" not in lowered
+        and not instructions
+        and all(word in ACKNOWLEDGMENT_WORDS for word in words)
+    ):
+        return FAST
+    return STANDARD
+
+
+class ModelTierRouter:
+    """Picks the tier for each turn and tracks how the tiers perform"""
+
+    def __init__(self):
+        self.tiers = _tiers()
+
+    def choose(self, context: CallContext, user_message: str, instructions: Optional[str] = None) -> ModelTier:
+        name = classify_turn(context, user_message, instructions) if settings.llm_tiering_enabled else STANDARD
+        if name == FAST and not settings.llm_fast_deployment:
+            # No small model configured; the default one needs the standard budget
+            name = STANDARD
+        _turns.inc(tier=name)
+        return self.tiers[name]
+
+    def fallback(self, tier: ModelTier, reason: str) -> Optional[ModelTier]:
+        """The tier to retry on after `tier` gave an unusable answer, if any"""
+        if tier.name != FAST:
+            return None
+        _fallbacks.inc(tier=tier.name, reason=reason)
+        return self.tiers[STANDARD]
+
+    def status(self) -> Dict[str, dict]:
+        return {
+            name: {
+                "deployment": tier.deployment,
+                "max_completion_tokens": tier.max_completion_tokens,
+                "p50_seconds": tier.latency.percentile(0.5),
+                "p95_seconds": tier.latency.percentile(0.95),
+            }
+            for name, tier in self.tiers.items()
+        }
+
+
+# Global model tier router
+model_tiers = ModelTierRouter()
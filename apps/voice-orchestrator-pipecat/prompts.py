@@ -2,20 +2,8 @@
 System prompts for the voice AI assistant
 """
 
-def get_system_prompt(hospital_name: str, intents: list, departments: list) -> str:
-    """Generate the system prompt based on hospital configuration"""
-    
-    intent_list = "\n".join([
-        f"- {intent.get('displayName', intent.get('key'))}: {intent.get('description', '')}"
-        for intent in intents
-    ]) if intents else "- General inquiries"
-    
-    dept_list = "\n".join([
-        f"- {dept.get('name')}: {', '.join(dept.get('serviceTypes', []))}"
-        for dept in departments
-    ]) if departments else "- General reception"
-    
-    return f"""You are a friendly, professional, and empathetic AI receptionist for {hospital_name}.
+# The receptionist system prompt; replay can diff a candidate against it
+SYSTEM_PROMPT_TEMPLATE = """You are a friendly, professional, and empathetic AI receptionist for {hospital_name}.
 
 ## Your Role
 You handle incoming phone calls and help callers with their needs. You speak naturally and conversationally, like a real person would on the phone.
@@ -25,7 +13,7 @@ You handle incoming phone calls and help callers with their needs. You speak nat
 
 ## Available Departments
 {dept_list}
-
+{returning_caller}
 ## Communication Style
 - Be warm, friendly, and professional
 - Keep responses VERY brief (1-2 sentences MAX) - this is a phone call
@@ -73,6 +61,43 @@ If you cannot help the caller or they request to speak with a human:
 Remember: You represent {hospital_name}. Every interaction matters."""
 
 
+def get_system_prompt(
+    hospital_name: str,
+    intents: list,
+    departments: list,
+    caller_name: str = None,
+    caller_summary: str = None,
+    template: str = SYSTEM_PROMPT_TEMPLATE,
+) -> str:
+    """Generate the system prompt based on hospital configuration"""
+    
+    intent_list = "\n".join([
+        f"- {intent.get('displayName', intent.get('key'))}: {intent.get('description', '')}"
+        for intent in intents
+    ]) if intents else "- General inquiries"
+    
+    dept_list = "\n".join([
+        f"- {dept.get('name')}: {', '.join(dept.get('serviceTypes', []))}"
+        for dept in departments
+    ]) if departments else "- General reception"
+    
+    returning_caller = ""
+    if caller_name or caller_summary:
+        returning_caller = f"""
+## Returning Caller
+{f"This number previously belonged to a caller named {caller_name}." if caller_name else ""}
+{caller_summary or ""}
+Confirm their name and date of birth before relying on this or discussing account details.
+"""
+    
+    return template.format(
+        hospital_name=hospital_name,
+        intent_list=intent_list,
+        dept_list=dept_list,
+        returning_caller=returning_caller,
+    )
+
+
 def get_greeting_prompt(hospital_name: str) -> str:
     """Get the initial greeting"""
     return f"Hello, thank you for calling {hospital_name}. How can I help you today?"
@@ -114,3 +139,22 @@ Rate the following on a scale of 0.0 to 1.0:
 Respond in JSON format:
 {{"overall_sentiment": 0.X, "frustration_level": 0.X, "urgency_level": 0.X, "escalation_needed": 0.X, "reason": "brief explanation"}}"""
 
+
+def get_batch_sentiment_analysis_prompt(conversations: list) -> str:
+    """Prompt to analyze several conversations in one request; `conversations` is [(id, text)]"""
+    blocks = "\n\n".join(
+        f"### Conversation {conversation_id}\n{text}" for conversation_id, text in conversations
+    )
+    return f"""Analyze the sentiment of each of these separate phone conversations.
+
+{blocks}
+
+For each conversation, rate the following on a scale of 0.0 to 1.0:
+- overall_sentiment: (0=very negative, 0.5=neutral, 1=very positive)
+- frustration_level: (0=not frustrated, 1=very frustrated)
+- urgency_level: (0=not urgent, 1=very urgent)
+- escalation_needed: (0=no, 1=yes - should transfer to human)
+
+Judge each conversation on its own. Respond in JSON format, with one result per conversation id:
+{{"results": [{{"id": "<conversation id>", "overall_sentiment": 0.X, "frustration_level": 0.X, "urgency_level": 0.X, "escalation_needed": 0.X, "reason": "brief explanation"}}]}}"""
+
@@ -0,0 +1,256 @@
+"""
+Offline transcript replay
+
+Feeds recorded calls through the same conversation rules, escalation check
+and prompt building as the live bot, with no audio, network or pipecat, to
+see what a change to keywords or thresholds would have decided. Calls are
+streamed from JSONL and spread across a process pool.
+
+Input, one call per line:
+    {"call_sid": "CA...", "hospital_name": "...", "intents": [...],
+     "departments": [...], "turns": [{"role": "user", "text": "..."}, ...]}
+
+Usage:
+    python replay.py calls.jsonl --out decisions.jsonl
+    python replay.py calls.jsonl --config current.json --compare proposed.json
+
+Configs are JSON objects of RulesConfig fields; omitted fields keep their
+defaults. A config can also set "prompt_template_file" to a system prompt
+template to use instead of the live one (same {hospital_name},
+{intent_list}, {dept_list} and {returning_caller} placeholders). With
+--compare, each call is replayed under both and the summary reports how
+many decisions and system prompts changed.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from call_context import CallContext
+from conversation_rules import (
+    RulesConfig,
+    apply_assistant_turn,
+    apply_user_turn,
+    is_sentiment_turn,
+    score_sentiment,
+)
+from prompts import SYSTEM_PROMPT_TEMPLATE, get_system_prompt
+
+
+# Calls handed to a worker at a time; large enough to amortize IPC
+CHUNK_SIZE = 64
+# Chunks per worker read ahead; Pool.imap would otherwise queue the whole input
+READ_AHEAD_CHUNKS = 8
+
+# Replay config key naming a system prompt template file
+PROMPT_TEMPLATE_KEY = "prompt_template_file"
+
+_configs: Dict[str, Tuple[RulesConfig, str]] = {}
+
+
+def replay_call(
+    call: Dict[str, Any],
+    rules: RulesConfig,
+    template: str = SYSTEM_PROMPT_TEMPLATE,
+) -> Dict[str, Any]:
+    """Replay one call's turns and return the decisions made along the way"""
+    context = CallContext(
+        call_sid=call.get("call_sid", ""),
+        hospital_name=call.get("hospital_name", "Wardline Medical Center"),
+        intents=call.get("intents", []),
+        departments=call.get("departments", []),
+    )
+    emergency_turn: Optional[int] = None
+    escalate_turn: Optional[int] = None
+    user_turns = 0
+
+    for index, turn in enumerate(call.get("turns", [])):
+        text = (turn.get("text") or "").strip()
+        if not text:
+            continue
+        if turn.get("role") == "user":
+            user_turns += 1
+            if apply_user_turn(context, text, rules) and emergency_turn is None:
+                emergency_turn = index
+            if is_sentiment_turn(user_turns, rules):
+                score_sentiment(context, rules)
+        else:
+            apply_assistant_turn(context, text, rules)
+        if escalate_turn is None and context.should_escalate():
+            escalate_turn = index
+
+    prompt = get_system_prompt(
+        hospital_name=context.hospital_name,
+        intents=context.intents,
+        departments=context.departments,
+        template=template,
+    )
+    return {
+        "call_sid": context.call_sid,
+        "turns": len(call.get("turns", [])),
+        "emergency": context.is_emergency,
+        "emergency_turn": emergency_turn,
+        "escalate": escalate_turn is not None,
+        "escalate_turn": escalate_turn,
+        "frustration": round(context.sentiment.frustration_level, 3),
+        "urgency": round(context.sentiment.urgency_level, 3),
+        "prompt_chars": len(prompt),
+        "prompt_digest": hashlib.sha1(prompt.encode()).hexdigest()[:12],
+    }
+
+
+def _split_config(data: Dict[str, Any]) -> Tuple[RulesConfig, str]:
+    """Rules and system prompt template from a loaded config"""
+    rules = {k: v for k, v in data.items() if k != PROMPT_TEMPLATE_KEY}
+    return RulesConfig.from_dict(rules), data.get(PROMPT_TEMPLATE_KEY) or SYSTEM_PROMPT_TEMPLATE
+
+
+def _init_worker(configs: Dict[str, Dict[str, Any]]):
+    """Pool initializer: build the configs once per process"""
+    for name, data in configs.items():
+        _configs[name] = _split_config(data)
+
+
+def _replay_line(line: str) -> Optional[Dict[str, Any]]:
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        call = json.loads(line)
+    except ValueError:
+        return {"error": "invalid json"}
+    return {
+        name: replay_call(call, rules, template)
+        for name, (rules, template) in _configs.items()
+    }
+
+
+class Summary:
+    """Aggregate counts per config and decision changes between them"""
+
+    DECISIONS = ("emergency", "escalate")
+
+    def __init__(self, names: List[str]):
+        self.names = names
+        self.calls = 0
+        self.turns = 0
+        self.errors = 0
+        self.counts = {name: {d: 0 for d in self.DECISIONS} for name in names}
+        self.changed = {d: {"gained": 0, "lost": 0} for d in self.DECISIONS}
+        self.escalate_turn_shift = 0
+        self.prompt_changed = 0
+
+    def add(self, result: Dict[str, Any]):
+        if "error" in result:
+            self.errors += 1
+            return
+        self.calls += 1
+        first = result[self.names[0]]
+        self.turns += first["turns"]
+        for name in self.names:
+            for decision in self.DECISIONS:
+                self.counts[name][decision] += bool(result[name][decision])
+        if len(self.names) == 2:
+            second = result[self.names[1]]
+            for decision in self.DECISIONS:
+                if second[decision] and not first[decision]:
+                    self.changed[decision]["gained"] += 1
+                elif first[decision] and not second[decision]:
+                    self.changed[decision]["lost"] += 1
+            if first["escalate_turn"] is not None and second["escalate_turn"] is not None:
+                self.escalate_turn_shift += second["escalate_turn"] - first["escalate_turn"]
+            if first["prompt_digest"] != second["prompt_digest"]:
+                self.prompt_changed += 1
+
+    def as_dict(self, elapsed: float, prompts: Dict[str, str]) -> Dict[str, Any]:
+        summary = {
+            "calls": self.calls,
+            "turns": self.turns,
+            "errors": self.errors,
+            "seconds": round(elapsed, 2),
+            "turns_per_hour": int(self.turns / elapsed * 3600) if elapsed else None,
+            "decisions": self.counts,
+            "prompt_templates": prompts,
+        }
+        if len(self.names) == 2:
+            summary["changed"] = self.changed
+            summary["escalate_turn_shift"] = self.escalate_turn_shift
+            summary["prompt_changed"] = self.prompt_changed
+        return summary
+
+
+def _load_config(path: Optional[str]) -> Dict[str, Any]:
+    if not path:
+        return {}
+    with open(path) as f:
+        data = json.load(f)
+    template_path = data.get(PROMPT_TEMPLATE_KEY)
+    try:
+        if template_path:
+            # Relative to the config; workers get the text, not the path
+            with open(os.path.join(os.path.dirname(path), template_path)) as f:
+                data[PROMPT_TEMPLATE_KEY] = f.read()
+        # Fail fast on bad keys and placeholders, before starting workers
+        _, template = _split_config(data)
+        get_system_prompt(hospital_name="", intents=[], departments=[], template=template)
+    except (OSError, TypeError, ValueError, KeyError, IndexError) as e:
+        raise SystemExit(f"{path}: {e}")
+    return data
+
+
+def _template_digest(data: Dict[str, Any]) -> str:
+    """Short digest identifying a config's system prompt template"""
+    template = data.get(PROMPT_TEMPLATE_KEY) or SYSTEM_PROMPT_TEMPLATE
+    return hashlib.sha1(template.encode()).hexdigest()[:12]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay recorded call transcripts offline")
+    parser.add_argument("input", help="JSONL file of calls, or - for stdin")
+    parser.add_argument("--config", help="Rules config JSON (default: built-in rules)")
+    parser.add_argument("--compare", help="Second rules config JSON to diff against --config")
+    parser.add_argument("--out", help="Write per-call decisions as JSONL here")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    args = parser.parse_args(argv)
+
+    configs = {"baseline": _load_config(args.config)}
+    if args.compare:
+        configs["candidate"] = _load_config(args.compare)
+    summary = Summary(list(configs))
+
+    source = sys.stdin if args.input == "-" else open(args.input)
+    out = open(args.out, "w") if args.out else None
+    started = time.monotonic()
+    try:
+        with multiprocessing.Pool(args.workers, initializer=_init_worker, initargs=(configs,)) as pool:
+            # Stream the input in bounded windows so memory stays flat
+            window = args.workers * CHUNK_SIZE * READ_AHEAD_CHUNKS
+            while True:
+                lines = list(itertools.islice(source, window))
+                if not lines:
+                    break
+                for result in pool.imap_unordered(_replay_line, lines, CHUNK_SIZE):
+                    if result is None:
+                        continue
+                    summary.add(result)
+                    if out:
+                        out.write(json.dumps(result, separators=(",", ":")) + "\n")
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out:
+            out.close()
+
+    prompts = {name: _template_digest(data) for name, data in configs.items()}
+    json.dump(summary.as_dict(time.monotonic() - started, prompts), sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
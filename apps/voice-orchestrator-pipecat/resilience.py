@@ -0,0 +1,225 @@
+"""
+Resilience primitives shared by the core-api and Azure OpenAI clients
+
+- Per-turn deadline budgets carried in a context variable, so every
+  request made while handling a turn gets whatever time the turn has left
+- Circuit breakers per dependency that fail fast while it is unhealthy
+- Hedged requests that fire a second attempt after the p95 latency
+"""
+import asyncio
+import contextvars
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Deque, Optional, TypeVar
+from loguru import logger
+
+from metrics import metrics
+
+
+T = TypeVar("T")
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "turn_deadline", default=None
+)
+
+_breaker_state = metrics.gauge(
+    "circuit_breaker_state", "Circuit breaker state (0=closed, 1=half-open, 2=open)"
+)
+_breaker_rejections = metrics.counter(
+    "circuit_breaker_rejections_total", "Requests failed fast by an open breaker"
+)
+_breaker_trips = metrics.counter("circuit_breaker_trips_total", "Times a breaker opened")
+_hedges = metrics.counter("hedged_requests_total", "Hedged requests by which attempt won")
+_deadline_exceeded = metrics.counter(
+    "deadline_exceeded_total", "Requests skipped or cut short by the turn deadline"
+)
+
+
+class DeadlineExceeded(Exception):
+    """The current turn has no time left for this request"""
+
+
+class CircuitOpenError(Exception):
+    """The dependency's breaker is open"""
+
+
+# =============================================================================
+# Deadlines
+# =============================================================================
+
+@contextmanager
+def deadline_scope(seconds: float):
+    """Give everything awaited inside this block a shared time budget"""
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    # A nested scope can only shorten the budget
+    token = _deadline.set(min(deadline, outer) if outer else deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining(default: float) -> float:
+    """
+    Seconds a request may take: the smaller of `default` and what's left of
+    the current turn. Raises DeadlineExceeded when the budget is spent.
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return default
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded()
+    return min(default, left)
+
+
+async def with_deadline(dependency: str, awaitable: Awaitable[T], default: float) -> T:
+    """Await something within the current turn's budget"""
+    try:
+        timeout = remaining(default)
+    except DeadlineExceeded:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        _deadline_exceeded.inc(dependency=dependency)
+        raise DeadlineExceeded(dependency)
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        _deadline_exceeded.inc(dependency=dependency)
+        raise DeadlineExceeded(dependency)
+
+
+# =============================================================================
+# Circuit breaker
+# =============================================================================
+
+class CircuitBreaker:
+    """Closed -> open after N consecutive failures -> half-open after a cooldown"""
+
+    CLOSED = 0
+    HALF_OPEN = 1
+    OPEN = 2
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        _breaker_state.set(self.state, dependency=name)
+
+    def _set_state(self, state: int):
+        if state != self.state:
+            self.state = state
+            _breaker_state.set(state, dependency=self.name)
+
+    def allow(self) -> bool:
+        """Whether a request may go out now"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._set_state(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            # Let a single probe through
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self._failures = 0
+        self._probe_in_flight = False
+        self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        self._failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                _breaker_trips.inc(dependency=self.name)
+                logger.warning(f"Circuit breaker for {self.name} opened")
+            self._opened_at = time.monotonic()
+            self._set_state(self.OPEN)
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run `fn` through the breaker"""
+        if not self.allow():
+            _breaker_rejections.inc(dependency=self.name)
+            raise CircuitOpenError(self.name)
+        # Admitted while half-open means this call is the probe
+        probe = self.state == self.HALF_OPEN
+        try:
+            result = await fn()
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            # Cancelled: no verdict either way, but let the next call probe
+            if probe:
+                self._probe_in_flight = False
+            raise
+        self.record_success()
+        return result
+
+
+# =============================================================================
+# Hedging
+# =============================================================================
+
+class LatencyTracker:
+    """Rolling window of latencies for percentile estimates"""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._min_samples = min_samples
+
+    def record(self, latency: float):
+        self._samples.append(latency)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """The q-th percentile, or None until enough samples are in"""
+        if len(self._samples) < self._min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def hedged(
+    dependency: str,
+    fn: Callable[[], Awaitable[T]],
+    delay: Optional[float],
+) -> T:
+    """
+    Run `fn`; if it hasn't finished after `delay` seconds start a second
+    attempt and return whichever succeeds first. With no delay (not enough
+    latency samples yet) this is a plain call.
+    """
+    if delay is None:
+        return await fn()
+
+    primary = asyncio.ensure_future(fn())
+    attempts = {primary: "primary"}
+    pending = {primary}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return primary.result()
+
+        hedge = asyncio.ensure_future(fn())
+        attempts[hedge] = "hedge"
+        pending.add(hedge)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    _hedges.inc(dependency=dependency, winner=attempts[task])
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,188 @@
+"""
+Runtime introspection for /debug/runtime
+
+When the orchestrator slows under load, the cause may be:
+- event-loop blocking
+- call contexts growing
+- tasks piling up
+
+This module gathers what's needed to tell these apart:
+- Event-loop lag: a sleeper wakes every LOOP_LAG_INTERVAL_SECONDS and
+  records how late it woke, as a histogram (also on /metrics) plus the
+  worst recent value.
+- Per-call approximate memory: history, collected fields and the config
+  lists copied into each CallContext. Shallow copies are taken on the
+  event loop and sized off it, so the walk never sees a call mid-change.
+- Counts of live call contexts and asyncio tasks, by coroutine.
+- tracemalloc top-N allocation sites, on demand. Tracing is off until
+  started through the endpoint, because it slows every allocation.
+
+Only the lag sleeper runs all the time. Everything else is computed when
+the endpoint is queried.
+"""
+import asyncio
+import sys
+import time
+import tracemalloc
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional
+
+from config import settings
+from call_context import CallContext, context_manager
+from metrics import metrics
+
+
+# How many recent lag samples the report summarizes
+LAG_WINDOW = 120
+# Containers nested deeper than this are counted shallowly
+MAX_SIZE_DEPTH = 6
+
+_loop_lag = metrics.histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop ran a timer",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+
+def approx_size(obj: Any, depth: int = 0) -> int:
+    """Rough deep size in bytes of plain data (dicts, lists, strings, scalars)"""
+    size = sys.getsizeof(obj)
+    if depth >= MAX_SIZE_DEPTH:
+        return size
+    if isinstance(obj, dict):
+        size += sum(approx_size(k, depth + 1) + approx_size(v, depth + 1) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approx_size(item, depth + 1) for item in obj)
+    elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+        size += approx_size(vars(obj), depth + 1)
+    return size
+
+
+def call_snapshot(context: CallContext) -> Dict[str, Any]:
+    """
+    Shallow copies of the parts of a call call_memory sizes. Take it on the
+    event loop; the loop only replaces, never resizes, what the copies share.
+    """
+    return {
+        "call_sid": context.call_sid,
+        "hospital_id": context.hospital_id,
+        "state": context.state.value,
+        "history": list(context.conversation_history),
+        "fields": dict(context.collected_fields),
+        "intents": list(context.intents),
+        "departments": list(context.departments),
+        "workflow": dict(context.workflow) if context.workflow else None,
+    }
+
+
+def call_memory(snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    """Approximate memory held by one call, by part, from its snapshot"""
+    history = approx_size(snapshot["history"])
+    fields = approx_size(snapshot["fields"])
+    config = (
+        approx_size(snapshot["intents"])
+        + approx_size(snapshot["departments"])
+        + approx_size(snapshot["workflow"])
+    )
+    return {
+        "call_sid": snapshot["call_sid"],
+        "hospital_id": snapshot["hospital_id"],
+        "state": snapshot["state"],
+        "history_turns": len(snapshot["history"]),
+        "history_bytes": history,
+        "collected_fields": len(snapshot["fields"]),
+        "fields_bytes": fields,
+        "intents": len(snapshot["intents"]),
+        "departments": len(snapshot["departments"]),
+        "config_bytes": config,
+        "total_bytes": history + fields + config,
+    }
+
+
+class LoopLagMonitor:
+    """Measures event-loop lag with a periodic timer"""
+
+    def __init__(self):
+        self._recent: Deque[float] = deque(maxlen=LAG_WINDOW)
+
+    async def run(self):
+        """Sample until cancelled; started with the server"""
+        interval = settings.loop_lag_interval_seconds
+        while True:
+            expected = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            lag = max(0.0, time.monotonic() - expected)
+            self._recent.append(lag)
+            _loop_lag.observe(lag)
+
+    def status(self) -> Dict[str, Any]:
+        ordered = sorted(self._recent)
+        if not ordered:
+            return {"samples": 0}
+        return {
+            "samples": len(ordered),
+            "p50_seconds": round(ordered[len(ordered) // 2], 4),
+            "p99_seconds": round(ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))], 4),
+            "max_seconds": round(ordered[-1], 4),
+        }
+
+
+def task_counts() -> Dict[str, Any]:
+    """Live asyncio tasks, in total and by coroutine"""
+    tasks = asyncio.all_tasks()
+    by_coroutine = Counter(
+        getattr(task.get_coro(), "__qualname__", type(task.get_coro()).__name__)
+        for task in tasks
+    )
+    return {"total": len(tasks), "by_coroutine": dict(by_coroutine.most_common(25))}
+
+
+def call_snapshots() -> List[Dict[str, Any]]:
+    """Snapshots of every live call, for calls_report; call on the event loop"""
+    return [call_snapshot(context) for context in context_manager.get_all_active()]
+
+
+def calls_report(snapshots: List[Dict[str, Any]], top: int) -> Dict[str, Any]:
+    """Live call contexts and the `top` largest by approximate memory"""
+    calls = [call_memory(snapshot) for snapshot in snapshots]
+    calls.sort(key=lambda call: call["total_bytes"], reverse=True)
+    return {
+        "active": len(calls),
+        "total_bytes": sum(call["total_bytes"] for call in calls),
+        "largest": calls[:top],
+    }
+
+
+def tracemalloc_report(action: Optional[str], top: int) -> Dict[str, Any]:
+    """
+    Handle a tracemalloc request: "start" begins tracing, "stop" ends it,
+    and "snapshot" returns the top allocation sites while tracing
+    """
+    if action == "start" and not tracemalloc.is_tracing():
+        tracemalloc.start(settings.tracemalloc_frames)
+    elif action == "stop" and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    report: Dict[str, Any] = {"tracing": tracemalloc.is_tracing()}
+    if not report["tracing"]:
+        return report
+    current, peak = tracemalloc.get_traced_memory()
+    report.update(current_bytes=current, peak_bytes=peak)
+    if action == "snapshot":
+        stats = tracemalloc.take_snapshot().statistics("lineno")
+        report["top"] = _format_stats(stats[:top])
+    return report
+
+
+def _format_stats(stats: List[tracemalloc.Statistic]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "bytes": stat.size,
+            "blocks": stat.count,
+        }
+        for stat in stats
+    ]
+
+
+# Global event-loop lag monitor
+loop_lag = LoopLagMonitor()
@@ -0,0 +1,254 @@
+"""
+Micro-batched LLM sentiment analysis
+
+Sentiment requests are collected per hospital over a short window
+(SENTIMENT_BATCH_MAX_WAIT_SECONDS, or until SENTIMENT_BATCH_SIZE of the
+hospital's calls are waiting). They are scored together in one LLM request
+with JSON output, and each result is written back to its
+CallContext.sentiment. A call that asks again while it is still waiting
+shares the pending request.
+
+A batch never mixes hospitals, so one tenant's conversations can't sway
+another's scores, and it is scheduled as its hospital's LLM work, under
+that hospital's fair share and budget.
+
+Calls the LLM couldn't score (over capacity, timeout, bad output) fall back
+to the keyword heuristics in conversation_rules, so a result is always
+written.
+"""
+import asyncio
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from loguru import logger
+
+from config import settings
+from admission import OverloadedError
+from accounting import accounting
+from call_context import CallContext
+from conversation_rules import DEFAULT_RULES, RulesConfig, score_sentiment
+from endpoint_router import llm_endpoints
+from llm_client import get_llm_client
+from llm_scheduler import estimate_tokens, llm_scheduler
+from metrics import metrics
+from prompts import get_batch_sentiment_analysis_prompt
+
+
+# Completion budget per conversation in a batch
+COMPLETION_TOKENS_PER_CALL = 60
+
+_batch_size = metrics.histogram(
+    "sentiment_batch_size", "Calls scored per sentiment batch", buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+_scored = metrics.counter("sentiment_scored_total", "Sentiment results by source (llm, heuristic)")
+
+
+@dataclass
+class _Request:
+    context: CallContext
+    rules: RulesConfig
+    enqueued: float
+    future: asyncio.Future
+
+
+def _score(value: Any) -> float:
+    try:
+        return max(0.0, min(1.0, float(value)))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def apply_llm_scores(context: CallContext, result: Dict[str, Any], rules: RulesConfig):
+    """Write one conversation's LLM scores to context.sentiment"""
+    sentiment = context.sentiment
+    sentiment.overall_score = _score(result.get("overall_sentiment", 0.5))
+    sentiment.frustration_level = _score(result.get("frustration_level"))
+    sentiment.urgency_level = _score(result.get("urgency_level"))
+    sentiment.reason = str(result.get("reason") or "")[:200]
+    sentiment.escalation_needed = (
+        _score(result.get("escalation_needed")) >= 0.5 or
+        sentiment.frustration_level > rules.frustration_threshold or
+        sentiment.urgency_level > rules.urgency_threshold
+    )
+
+
+class SentimentService:
+    """Collects sentiment requests across calls and scores them in batches"""
+
+    def __init__(self):
+        # hospital_id -> call_sid -> request, oldest first
+        self._pending: Dict[str, Dict[str, _Request]] = {}
+        self._arrived = asyncio.Event()
+        self._full = asyncio.Event()
+        self._running = False
+
+    async def score(self, context: CallContext, rules: RulesConfig = DEFAULT_RULES) -> bool:
+        """
+        Score a call's recent conversation, waiting for the next batch.
+        Returns False when there was nothing to score.
+        """
+        if not (self._running and settings.sentiment_llm_enabled):
+            return score_sentiment(context, rules)
+        queue = self._pending.setdefault(context.hospital_id or "", {})
+        request = queue.get(context.call_sid)
+        if request is None:
+            request = queue[context.call_sid] = _Request(
+                context=context,
+                rules=rules,
+                enqueued=time.monotonic(),
+                future=asyncio.get_running_loop().create_future(),
+            )
+            self._arrived.set()
+            if len(queue) >= settings.sentiment_batch_size:
+                self._full.set()
+        # A caller giving up mustn't cancel the result other waiters share
+        return await asyncio.shield(request.future)
+
+    async def run(self):
+        """Form batches until cancelled; started with the server"""
+        self._running = True
+        slots = asyncio.Semaphore(settings.sentiment_max_concurrent_batches)
+        batches = set()
+        try:
+            while True:
+                await self._arrived.wait()
+                oldest = next(iter(self._pending[self._next_hospital()].values()))
+                window = settings.sentiment_batch_max_wait_seconds - (time.monotonic() - oldest.enqueued)
+                if window > 0 and not self._full.is_set():
+                    try:
+                        await asyncio.wait_for(self._full.wait(), window)
+                    except asyncio.TimeoutError:
+                        pass
+                # Bound batches in flight; requests keep coalescing meanwhile
+                await slots.acquire()
+                batch = self._take(self._next_hospital(), settings.sentiment_batch_size)
+                task = asyncio.create_task(self._score_batch(batch))
+                batches.add(task)
+                task.add_done_callback(lambda t: (batches.discard(t), slots.release()))
+        finally:
+            self._running = False
+            for hospital_id in list(self._pending):
+                for request in self._take(hospital_id, len(self._pending[hospital_id])):
+                    request.future.set_result(score_sentiment(request.context, request.rules))
+
+    def _next_hospital(self) -> str:
+        """A hospital with a full batch, else the one that has waited longest"""
+        size = settings.sentiment_batch_size
+        for hospital_id, queue in self._pending.items():
+            if len(queue) >= size:
+                return hospital_id
+        return min(self._pending, key=lambda h: next(iter(self._pending[h].values())).enqueued)
+
+    def _take(self, hospital_id: str, size: int) -> List[_Request]:
+        queue = self._pending[hospital_id]
+        batch = [queue.pop(call_sid) for call_sid in list(queue)[:size]]
+        if not queue:
+            del self._pending[hospital_id]
+        if all(len(q) < settings.sentiment_batch_size for q in self._pending.values()):
+            self._full.clear()
+        if not self._pending:
+            self._arrived.clear()
+        return batch
+
+    async def _score_batch(self, batch: List[_Request]):
+        try:
+            await self._score_requests(batch)
+        finally:
+            # Never leave a caller waiting, whatever went wrong above
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_result(score_sentiment(request.context, request.rules))
+
+    async def _score_requests(self, batch: List[_Request]):
+        conversations = {}
+        for index, request in enumerate(batch):
+            text = request.context.get_conversation_text(last_n=request.rules.sentiment_window_turns)
+            if text:
+                conversations[str(index)] = text
+            else:
+                request.future.set_result(False)
+        if not conversations:
+            return
+        _batch_size.observe(len(conversations))
+
+        results = await self._complete(batch[0].context.hospital_id, batch, conversations)
+        for conversation_id in conversations:
+            request = batch[int(conversation_id)]
+            result = results.get(conversation_id)
+            if result is not None:
+                apply_llm_scores(request.context, result, request.rules)
+                _scored.inc(source="llm")
+            else:
+                score_sentiment(request.context, request.rules)
+                _scored.inc(source="heuristic")
+            request.future.set_result(True)
+
+    async def _complete(
+        self,
+        hospital_id: Optional[str],
+        batch: List[_Request],
+        conversations: Dict[str, str],
+    ) -> Dict[str, Dict[str, Any]]:
+        """One LLM request for the batch; {conversation id: scores}, empty on failure"""
+        messages = [{
+            "role": "user",
+            "content": get_batch_sentiment_analysis_prompt(list(conversations.items())),
+        }]
+        max_tokens = COMPLETION_TOKENS_PER_CALL * len(conversations)
+        try:
+            async with llm_scheduler.slot(
+                hospital_id, "normal", estimate_tokens(messages, max_tokens)
+            ) as grant:
+                response = await llm_endpoints.call(
+                    lambda endpoint: asyncio.wait_for(
+                        get_llm_client(endpoint).chat.completions.create(
+                            model=settings.azure_openai_deployment,
+                            messages=messages,
+                            max_completion_tokens=max_tokens,
+                            response_format={"type": "json_object"},
+                        ),
+                        settings.sentiment_timeout_seconds,
+                    )
+                )
+                usage = getattr(response, "usage", None)
+                grant.used_tokens = getattr(usage, "total_tokens", None)
+        except OverloadedError:
+            logger.warning(f"No LLM capacity for a sentiment batch of {len(conversations)}")
+            return {}
+        except asyncio.TimeoutError:
+            logger.warning(f"Sentiment batch of {len(conversations)} timed out")
+            return {}
+        except Exception as e:
+            logger.error(f"Sentiment batch failed: {e}")
+            return {}
+
+        self._charge(batch, conversations, response)
+        try:
+            parsed = json.loads(response.choices[0].message.content or "{}")
+            return {
+                str(item["id"]): item
+                for item in parsed.get("results", [])
+                if isinstance(item, dict) and str(item.get("id")) in conversations
+            }
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            logger.warning(f"Unreadable sentiment batch output: {e}")
+            return {}
+
+    def _charge(self, batch: List[_Request], conversations: Dict[str, str], response: Any):
+        """Split the batch's usage across its calls by conversation length"""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        total_chars = sum(len(text) for text in conversations.values()) or 1
+        for conversation_id, text in conversations.items():
+            share = len(text) / total_chars
+            accounting.record_llm(
+                batch[int(conversation_id)].context,
+                prompt_tokens=round((usage.prompt_tokens or 0) * share),
+                completion_tokens=round((usage.completion_tokens or 0) / len(conversations)),
+            )
+
+
+# Global sentiment service
+sentiment_service = SentimentService()
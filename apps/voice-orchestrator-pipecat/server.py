@@ -2,38 +2,287 @@
 FastAPI Server for Pipecat Voice Orchestrator
 Handles Twilio webhooks and manages voice bot instances
 """
+import time
+
+_import_started = time.perf_counter()
+
 import asyncio
+import hmac
 import json
 from datetime import datetime
-from typing import Optional
+from functools import lru_cache
+from typing import Any, Dict, Optional
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request, Response, WebSocket, WebSocketDisconnect
-from fastapi.responses import PlainTextResponse
-from twilio.twiml.voice_response import VoiceResponse, Connect, Stream, Gather
+from fastapi.responses import JSONResponse, PlainTextResponse
+from twilio.twiml.voice_response import VoiceResponse, Connect, Stream, Gather, Dial
 from loguru import logger
 
 from config import settings
-from call_context import context_manager, CallContext, CallState
+from call_context import context_manager, CallContext, CallState, IntentType
 from core_api_client import api_client
 from prompts import get_greeting_prompt, get_system_prompt
+from workflow_engine import workflow_engine, StepKind, detect_intent
+from insurance_index import insurance_index, is_insurance_question
+from department_router import department_router, is_routing_request
+from caller_cache import caller_cache
+from hospital_config import hospital_configs, is_valid_hospital_id
+from drain import drain, restore_active_calls, restore_call, save_active_calls
+from admission import admission, OverloadedError
+from llm_scheduler import llm_scheduler, estimate_tokens, lane_for
+from accounting import accounting
+from call_events import call_events
+from llm_client import get_llm_client
+from endpoint_router import llm_endpoints, speech_endpoints
+from audio_writer import OutboundAudioWriter, audio_writers
+from idempotency import webhook_idempotency
+from model_tiers import ModelTier, model_tiers
+from runtime_debug import call_snapshots, calls_report, loop_lag, task_counts, tracemalloc_report
+from sentiment_service import sentiment_service
+from conversation_rules import DEFAULT_RULES, apply_user_turn, is_sentiment_turn
+from task_runtime import runtime
+from metrics import metrics
+from resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceeded,
+    deadline_scope,
+    hedged,
+    remaining,
+    with_deadline,
+)
+from warmup import warmup
+from log_pipeline import configure_logging, shutdown_logging
 
-# Configure logging
-logger.add(
-    "logs/voice_orchestrator.log",
-    rotation="1 day",
-    retention="7 days",
-    level="DEBUG"
+warmup.record_imports(time.perf_counter() - _import_started)
+
+CALLER_CACHE_PURGE_INTERVAL = 300  # seconds
+CALL_REAP_INTERVAL = 60  # seconds
+COLD_HOSPITAL_MAX_RETRY_SECONDS = 300  # seconds
+
+degraded_responses = metrics.counter(
+    "degraded_responses_total", "Calls or turns sent to the degraded path"
 )
 
+# Configure logging (queued sinks, written off the event loop)
+configure_logging()
+# Twilio media frames arrive every 20ms per call; sampled by category
+media_log = logger.bind(category="media")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown events"""
-    logger.info("🚀 Starting Pipecat Voice Orchestrator")
+    logger.info(f"🚀 Starting Pipecat Voice Orchestrator (imports took {warmup.import_seconds:.2f}s)")
+    # Serve calls from the last snapshots until warmup refreshes them
+    hospital_configs.load_from_disk()
+    restored = _restore_calls()
+    purge_task = runtime.spawn_service("caller_cache_purge", _purge_caller_cache())
+    reap_task = runtime.spawn_service("call_reaper", _reap_idle_calls())
+    # Warm up in the background so /health answers immediately; /ready
+    # stays false until this finishes
+    warmup_task = runtime.spawn_service("warmup", _warm_up(restored))
+    usage_task = runtime.spawn_service("usage_flush", accounting.run())
+    events_task = runtime.spawn_service("call_events", call_events.run())
+    sentiment_task = runtime.spawn_service("sentiment_batcher", sentiment_service.run())
+    lag_task = runtime.spawn_service("loop_lag", loop_lag.run())
     yield
     logger.info("🛑 Shutting down Voice Orchestrator")
+    # Finish in-flight turns, then hand live calls to the next process
+    await drain.drain(settings.drain_timeout_seconds)
+    save_active_calls(settings.call_snapshot_dir)
+    purge_task.cancel()
+    reap_task.cancel()
+    warmup_task.cancel()
+    usage_task.cancel()
+    events_task.cancel()
+    sentiment_task.cancel()
+    lag_task.cancel()
+    await accounting.flush(include_active=True)
+    await runtime.shutdown()
     await api_client.close()
+    shutdown_logging()
+
+
+def _restore_calls() -> Dict[str, tuple]:
+    """
+    Pick up calls handed over by the previous process. Returns the
+    workflow to reload per hospital and call, which warmup takes care of.
+    """
+    workflows = {}
+    for context, workflow_id in restore_active_calls(
+        settings.call_snapshot_dir, settings.call_snapshot_max_age_seconds
+    ):
+        _adopt_restored_call(context)
+        if workflow_id:
+            workflows[context.call_sid] = (context.hospital_id, workflow_id)
+    return workflows
+
+
+def _adopt_restored_call(context: CallContext):
+    """Give a call handed over from another process its slot and hospital config"""
+    admission.admit_call(context.call_sid)
+    snapshot = hospital_configs.get(context.hospital_id)
+    if snapshot:
+        context.intents = list(snapshot.intents)
+        context.departments = list(snapshot.departments)
+
+
+async def _restore_late_call(call_sid: str) -> Optional[CallContext]:
+    """
+    Pick up a call saved by a process that drained after this one started,
+    as happens during a rolling deploy
+    """
+    restored = await runtime.run_in_thread(
+        restore_call, settings.call_snapshot_dir, call_sid, settings.call_snapshot_max_age_seconds
+    )
+    if restored is None:
+        return None
+    context, workflow_id = restored
+    _adopt_restored_call(context)
+    if workflow_id and context.workflow is None:
+        context.workflow = await workflow_engine.load(context.hospital_id, workflow_id)
+    return context
+
+
+async def _reload_restored_workflows(workflows: Dict[str, tuple]):
+    """Give restored calls their workflow back so they resume at the same node"""
+    for call_sid, (hospital_id, workflow_id) in workflows.items():
+        context = context_manager.get_context(call_sid)
+        if context and context.workflow is None:
+            context.workflow = await workflow_engine.load(hospital_id, workflow_id)
+
+
+async def _warm_up(restored_workflows: Dict[str, tuple]):
+    """
+    Open connections and load hospital config before reporting ready,
+    retrying until core-api and the hospital config have loaded
+    """
+    while True:
+        warmup.start()
+        try:
+            await asyncio.wait_for(_warm_caches(restored_workflows), settings.warmup_timeout_seconds)
+        except asyncio.TimeoutError:
+            ready = warmup.finish(timed_out=True)
+        else:
+            ready = warmup.finish()
+        if ready:
+            if warmup.cold_hospitals:
+                runtime.spawn_service("warmup_retry", _retry_cold_hospitals())
+            return
+        await asyncio.sleep(settings.warmup_retry_seconds)
+
+
+async def _list_hospitals() -> list:
+    """The hospital list, failing the warmup step when core-api can't give it"""
+    hospitals = await api_client.list_hospitals()
+    if hospitals is None:
+        raise RuntimeError("core-api returned no hospital list")
+    return hospitals
+
+
+async def _warm_caches(restored_workflows: Dict[str, tuple]):
+    hospitals, _ = await asyncio.gather(
+        warmup.run("core_api", _list_hospitals()),
+        warmup.run("llm", _warm_llm_connection()),
+    )
+    await warmup.run("hospital_config", _warm_hospitals(hospitals or []))
+    if restored_workflows:
+        await warmup.run("restored_calls", _reload_restored_workflows(restored_workflows))
+
+
+async def _warm_hospitals(hospitals: list):
+    """
+    Warm every hospital. The step fails only if fewer than
+    WARMUP_MIN_HOSPITAL_RATIO of them refreshed; the rest are marked cold
+    and retried in the background.
+    """
+    hospital_ids = [h.get("id", "") for h in hospitals]
+    cold = await _warm_hospital_batch(hospital_ids)
+    warmup.cold_hospitals = cold
+    if hospital_ids and 1 - len(cold) / len(hospital_ids) < settings.warmup_min_hospital_ratio:
+        raise RuntimeError(f"config not refreshed for {len(cold)} of {len(hospital_ids)} hospitals")
+    if cold:
+        logger.warning(f"Config not refreshed for {len(cold)} hospitals; retrying once ready")
+
+
+async def _warm_hospital_batch(hospital_ids: list) -> set:
+    """Warm the given hospitals; returns those whose config didn't refresh"""
+    started = time.time()
+    await asyncio.gather(*(_warm_hospital(hospital_id) for hospital_id in hospital_ids))
+    return {
+        hospital_id for hospital_id in hospital_ids
+        if (snapshot := hospital_configs.get(hospital_id)) is None or snapshot.fetched_at < started
+    }
+
+
+async def _retry_cold_hospitals():
+    """
+    Keep warming the hospitals startup couldn't refresh until all have,
+    backing off so a hospital that no longer exists isn't polled hard
+    """
+    delay = settings.warmup_retry_seconds
+    while warmup.cold_hospitals:
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, COLD_HOSPITAL_MAX_RETRY_SECONDS)
+        warmup.cold_hospitals = await _warm_hospital_batch(sorted(warmup.cold_hospitals))
+    logger.info("Every hospital's config has refreshed")
+
+
+async def _warm_llm_connection():
+    """
+    Build each endpoint's client and open its connection pool with a cheap
+    request; the timings give the router a first latency sample per endpoint
+    """
+    async def warm(endpoint):
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(get_llm_client(endpoint).models.list(), settings.llm_timeout_seconds)
+        except Exception:
+            llm_endpoints.record(endpoint, time.monotonic() - started, ok=False)
+            raise
+        llm_endpoints.record(endpoint, time.monotonic() - started, ok=True)
+    
+    await asyncio.gather(*(warm(endpoint) for endpoint in llm_endpoints.endpoints))
+
+
+async def _warm_hospital(hospital_id: str, reason: str = "warmup"):
+    """
+    Refresh a hospital's config snapshot, then load its workflows, insurance
+    plans and routing index and render its greeting
+    """
+    snapshot = await hospital_configs.refresh(hospital_id, reason=reason)
+    if snapshot is None:
+        return
+    hospital = snapshot.hospital
+    _incoming_twiml(hospital.get("name", "Wardline Medical Center"))
+    await asyncio.gather(
+        insurance_index.prefetch(hospital_id),
+        *(workflow_engine.load(hospital_id, wid) for wid in _workflow_ids(hospital)),
+    )
+    department_router.build(hospital_id, snapshot.departments)
+
+
+def _workflow_ids(hospital: Dict[str, Any]) -> set:
+    return {pn.get("workflowId") for pn in hospital.get("phoneNumbers", []) if pn.get("workflowId")}
+
+
+async def _purge_caller_cache():
+    """Expire cached caller profiles even if nobody looks them up again"""
+    while True:
+        await asyncio.sleep(CALLER_CACHE_PURGE_INTERVAL)
+        caller_cache.purge_expired()
+
+
+async def _reap_idle_calls():
+    """Reclaim the slot and state of calls whose final status callback never came"""
+    while True:
+        await asyncio.sleep(CALL_REAP_INTERVAL)
+        for call_sid in admission.reap_idle_calls(settings.call_slot_idle_seconds):
+            runtime.close_group(call_sid)
+            accounting.end_call(call_sid)
+            context_manager.remove_context(call_sid)
 
 
 app = FastAPI(
@@ -44,6 +293,15 @@ app = FastAPI(
 )
 
 
+@app.middleware("http")
+async def turn_deadline(request: Request, call_next):
+    """Give each Twilio webhook one deadline budget shared by every request it makes"""
+    if not request.url.path.startswith("/voice/"):
+        return await call_next(request)
+    with drain.track(), deadline_scope(settings.turn_deadline_seconds):
+        return await call_next(request)
+
+
 # =============================================================================
 # Health Checks
 # =============================================================================
@@ -60,8 +318,109 @@ async def health_check():
 
 @app.get("/ready")
 async def readiness_check():
-    """Readiness check"""
-    return {"ready": True}
+    """Readiness check: 503 until startup warmup has finished, and while draining"""
+    ready = warmup.ready and not drain.draining
+    return JSONResponse(
+        {**warmup.status(), "ready": ready, "draining": drain.draining},
+        status_code=200 if ready else 503,
+    )
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+# =============================================================================
+# Internal (core-api -> orchestrator)
+# =============================================================================
+
+def _is_internal_request(request: Request) -> bool:
+    """Check the shared bearer token core-api sends; closed when no token is configured"""
+    if not settings.internal_api_token:
+        return False
+    supplied = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+    return hmac.compare_digest(supplied.encode(), settings.internal_api_token.encode())
+
+
+@app.get("/debug/runtime")
+async def debug_runtime(request: Request, top: int = 20, tracemalloc: Optional[str] = None):
+    """
+    Event-loop lag, task and per-call memory breakdown, plus scheduler and
+    routing state, for diagnosing slowdowns. `tracemalloc=start|snapshot|stop`
+    controls allocation tracing; a snapshot lists the top `top` sites.
+    """
+    if not _is_internal_request(request):
+        return JSONResponse({"error": "unauthorized"}, status_code=401)
+    if tracemalloc not in (None, "start", "snapshot", "stop"):
+        return JSONResponse({"error": "tracemalloc must be start, snapshot or stop"}, status_code=400)
+    top = max(1, min(top, 200))
+    
+    return {
+        "worker": settings.worker_id,
+        "loop_lag": loop_lag.status(),
+        "tasks": task_counts(),
+        # Both walk every live call or traced block; keep that off the event loop
+        "calls": await runtime.run_in_thread(calls_report, call_snapshots(), top),
+        "tracemalloc": await runtime.run_in_thread(tracemalloc_report, tracemalloc, top),
+        "warmup": warmup.status(),
+        "llm_scheduler": llm_scheduler.status(),
+        "model_tiers": model_tiers.status(),
+        "endpoints": {
+            "azure_openai": llm_endpoints.status(),
+            "azure_speech": speech_endpoints.status(),
+        },
+        "webhook_idempotency_entries": len(webhook_idempotency),
+        "media_streams": len(audio_writers),
+    }
+
+
+@app.post("/internal/drain")
+async def start_drain(request: Request):
+    """
+    Start draining ahead of SIGTERM (e.g. from a preStop hook) so the load
+    balancer sees /ready fail before the process stops listening
+    """
+    if not _is_internal_request(request):
+        return JSONResponse({"error": "unauthorized"}, status_code=401)
+    drain.begin()
+    return {"draining": True, "in_flight": drain.in_flight}
+
+
+@app.post("/internal/config-changed")
+async def config_changed(request: Request):
+    """
+    core-api calls this when a hospital's config changes. Only that hospital
+    is refetched, in the background.
+    Body: {"hospitalId": "...", "workflowId": "..." (optional)}
+    """
+    if not _is_internal_request(request):
+        return JSONResponse({"error": "unauthorized"}, status_code=401)
+    
+    try:
+        body = await request.json()
+    except ValueError:
+        body = None
+    if not isinstance(body, dict):
+        return JSONResponse({"error": "expected a JSON object"}, status_code=400)
+    hospital_id = str(body.get("hospitalId", ""))
+    if not is_valid_hospital_id(hospital_id):
+        return JSONResponse({"error": "invalid hospitalId"}, status_code=400)
+    
+    # Drop derived caches so the refetch below rebuilds them
+    workflow_ids = {body.get("workflowId")} - {None}
+    snapshot = hospital_configs.get(hospital_id)
+    if snapshot:
+        workflow_ids |= _workflow_ids(snapshot.hospital)
+    for workflow_id in workflow_ids:
+        workflow_engine.invalidate(str(workflow_id))
+    insurance_index.invalidate(hospital_id)
+    
+    runtime.spawn("config_refresh", _warm_hospital(hospital_id, reason="push"))
+    
+    logger.info(f"Config change pushed for hospital {hospital_id}")
+    return JSONResponse({"accepted": True}, status_code=202)
 
 
 # =============================================================================
@@ -75,11 +434,26 @@ async def handle_incoming_call(request: Request):
     Returns TwiML to greet caller and connect to WebSocket stream
     """
     form_data = await request.form()
+    # A retried webhook must not open a second call session
+    return await webhook_idempotency.handle(
+        request, form_data, lambda: _handle_incoming_call(form_data)
+    )
+
+
+async def _handle_incoming_call(form_data) -> Response:
     call_sid = form_data.get("CallSid", "")
     from_number = form_data.get("From", "")
     to_number = form_data.get("To", "")
     
-    logger.info(f"📞 Incoming call: {call_sid} from {from_number} to {to_number}")
+    logger.info("📞 Incoming call: {} from {} to {}", call_sid, from_number, to_number)
+    
+    # A draining process only finishes the calls it already has
+    if drain.draining and context_manager.get_context(call_sid) is None:
+        return _overflow_response("draining")
+    
+    # Shed load before doing any work for the call
+    if not admission.admit_call(call_sid):
+        return _overflow_response("calls")
     
     # Create call context
     context = context_manager.create_context(
@@ -88,24 +462,46 @@ async def handle_incoming_call(request: Request):
         to_phone=to_number,
     )
     
-    # Look up hospital by phone number
+    # Look up hospital by phone number, from the config snapshot when we have one
     try:
-        hospital = await api_client.get_hospital_by_phone(to_number)
-        if hospital:
-            context.hospital_id = hospital.get("id", "")
+        snapshot = hospital_configs.find_by_phone(to_number)
+        if snapshot is None:
+            snapshot = await hospital_configs.load_for_phone(to_number)
+        if snapshot:
+            hospital = snapshot.hospital
+            context.hospital_id = snapshot.hospital_id
             context.hospital_name = hospital.get("name", "Wardline Medical Center")
+            context.intents = list(snapshot.intents)
+            context.departments = list(snapshot.departments)
             logger.info(f"Found hospital: {context.hospital_name} ({context.hospital_id})")
             
-            context.intents = await api_client.get_intents(context.hospital_id)
-            context.departments = await api_client.get_departments(context.hospital_id)
+            workflow_id = workflow_engine.find_workflow_id(hospital, to_number)
+            
+            # Load the workflow, create the call session in core-api and
+            # prefetch the insurance index concurrently; the caller lookup
+            # below is a local cache read
+            (
+                context.workflow,
+                call_data,
+                _,
+            ) = await asyncio.gather(
+                workflow_engine.load(context.hospital_id, workflow_id),
+                api_client.create_call_session({
+                    "twilioCallSid": call_sid,
+                    "direction": "inbound",
+                    "fromNumber": from_number,
+                    "toNumber": to_number,
+                }),
+                insurance_index.prefetch(context.hospital_id),
+            )
+            department_router.build(context.hospital_id, context.departments)
+            
+            profile = caller_cache.lookup(context.hospital_id, from_number)
+            if profile:
+                context.caller_name = profile.name
+                context.caller_summary = profile.summary
+                logger.info(f"Recognized returning caller for {call_sid}")
             
-            # Create call session in core-api
-            call_data = await api_client.create_call_session({
-                "twilioCallSid": call_sid,
-                "direction": "inbound",
-                "fromNumber": from_number,
-                "toNumber": to_number,
-            })
             if call_data:
                 context.call_id = call_data.get("id")
                 logger.info(f"Created call session: {context.call_id}")
@@ -116,11 +512,18 @@ async def handle_incoming_call(request: Request):
         logger.warning(f"Could not load hospital data: {e}")
         context.hospital_name = "Wardline Medical Center"
     
-    # Generate TwiML response
+    accounting.record_tts(context, len(get_greeting_prompt(context.hospital_name)))
+    context.listening_since = time.time()
+    return Response(content=_incoming_twiml(context.hospital_name), media_type="text/xml")
+
+
+@lru_cache(maxsize=256)
+def _incoming_twiml(hospital_name: str) -> str:
+    """Greeting TwiML for a hospital; rendered once and reused for every call"""
     response = VoiceResponse()
     
     # Greeting inside gather so it starts listening immediately
-    greeting = get_greeting_prompt(context.hospital_name)
+    greeting = get_greeting_prompt(hospital_name)
     
     gather = Gather(
         input="speech",
@@ -141,7 +544,7 @@ async def handle_incoming_call(request: Request):
     )
     response.redirect("/voice/incoming")
     
-    return Response(content=str(response), media_type="text/xml")
+    return str(response)
 
 
 @app.post("/voice/process")
@@ -150,14 +553,23 @@ async def process_speech(request: Request):
     Process speech input from Twilio and generate AI response
     """
     form_data = await request.form()
+    # A retried webhook gets the original turn's TwiML instead of running it again
+    return await webhook_idempotency.handle(
+        request, form_data, lambda: _process_speech(form_data)
+    )
+
+
+async def _process_speech(form_data) -> Response:
     call_sid = form_data.get("CallSid", "")
     speech_result = form_data.get("SpeechResult", "")
     confidence = form_data.get("Confidence", "0")
     
-    logger.info(f"🎤 Speech from {call_sid}: \"{speech_result}\" (confidence: {confidence})")
+    logger.info("🎤 Speech from {} ({} chars, confidence: {})", call_sid, len(speech_result), confidence)
+    logger.debug("🎤 {} said: {!r}", call_sid, speech_result)
+    turn_started = time.monotonic()
     
-    # Get call context
-    context = context_manager.get_context(call_sid)
+    # Get call context, or the one a drained process handed over
+    context = context_manager.get_context(call_sid) or await _restore_late_call(call_sid)
     if not context:
         logger.warning(f"No context found for call {call_sid}")
         response = VoiceResponse()
@@ -174,50 +586,114 @@ async def process_speech(request: Request):
         response.append(gather)
         return Response(content=str(response), media_type="text/xml")
     
-    # Add user message to context
-    context.add_user_message(speech_result)
+    admission.touch_call(call_sid)
+    
+    # Twilio bills speech recognition for as long as the <Gather> listened
+    if context.listening_since is not None:
+        accounting.record_stt(context, max(0.0, time.time() - context.listening_since))
+        context.listening_since = None
+    
+    # Record the turn and check for emergencies with the same rules as the
+    # streaming pipeline and offline replay
+    is_emergency = apply_user_turn(context, speech_result, DEFAULT_RULES)
     
-    # Check for emergency keywords
-    emergency_keywords = [
-        "chest pain", "can't breathe", "difficulty breathing",
-        "stroke", "heart attack", "severe bleeding", "unconscious"
-    ]
-    is_emergency = any(kw in speech_result.lower() for kw in emergency_keywords)
+    # Re-score sentiment every few caller turns, batched with other calls;
+    # should_escalate() sees the result from the next turn on
+    user_turns = sum(1 for turn in context.conversation_history if turn.role == "user")
+    if is_sentiment_turn(user_turns, DEFAULT_RULES):
+        runtime.group(call_sid).spawn("sentiment", sentiment_service.score(context, DEFAULT_RULES))
     
     if is_emergency:
-        context.is_emergency = True
-        context.state = CallState.ESCALATING
-        
-        response = VoiceResponse()
-        response.say(
+        message = (
             "This sounds like it could be a medical emergency. "
             "Please hang up and call 911 immediately, or go to your nearest emergency room. "
-            "If you need immediate help, I'm transferring you now.",
-            voice="Polly.Joanna"
+            "If you need immediate help, I'm transferring you now."
         )
+        accounting.record_tts(context, len(message))
+        response = VoiceResponse()
+        response.say(message, voice="Polly.Joanna")
         # In production, could dial 911 or emergency line
         response.hangup()
         return Response(content=str(response), media_type="text/xml")
     
-    # Generate AI response
-    ai_response = await generate_ai_response(context, speech_result)
+    # Run deterministic workflow nodes locally; only LLM nodes go to Azure
+    step = await workflow_engine.advance(context, speech_result)
+    
+    if step.kind == StepKind.END:
+        context.state = CallState.ENDING
+        message = "Thank you for calling. Goodbye!"
+        accounting.record_tts(context, len(message))
+        response = VoiceResponse()
+        response.say(message, voice="Polly.Joanna")
+        response.hangup()
+        return Response(content=str(response), media_type="text/xml")
+    
+    if step.kind == StepKind.ESCALATE:
+        context.state = CallState.ESCALATING
+        context.escalation_reason = step.reason
+        ai_response = "Thanks for your patience."
+    elif step.kind == StepKind.SAY and step.text:
+        ai_response = step.text
+    else:
+        instructions = step.instructions
+        
+        # Resolve department routing locally; the LLM only sees ambiguous
+        # requests. Scheduling turns and calls inside a workflow step are
+        # left to the LLM and the workflow rather than cold-transferred.
+        if (
+            context.hospital_id
+            and context.workflow_node_id is None
+            and is_routing_request(speech_result)
+            and detect_intent(speech_result) != IntentType.SCHEDULING
+        ):
+            routing = department_router.resolve(context.hospital_id, speech_result)
+            if routing and not routing.ambiguous:
+                return _transfer_to_department(context, routing.department)
+            if routing:
+                names = ", ".join(d.get("name", "") for d in routing.candidates)
+                instructions = "\n".join(filter(None, [
+                    instructions,
+                    f"The caller may want one of these departments: {names}. "
+                    "Ask which one they need.",
+                ]))
+        
+        # Answer insurance questions from the local plan index
+        if context.hospital_id and is_insurance_question(speech_result):
+            plan_check = await insurance_index.check(context.hospital_id, speech_result)
+            if plan_check:
+                instructions = "\n".join(filter(None, [
+                    instructions,
+                    _describe_plan_check(plan_check),
+                ]))
+        
+        # Generate AI response
+        try:
+            ai_response = await generate_ai_response(
+                context, speech_result, instructions=instructions
+            )
+        except OverloadedError:
+            # Mid-call, the queue is usually a short spike; ask again
+            # rather than hang up on an admitted caller
+            degraded_responses.inc(reason="llm_busy")
+            ai_response = LLM_BUSY_RESPONSE
+        else:
+            admission.observe_turn(time.monotonic() - turn_started)
     
     # Add AI response to context
     context.add_assistant_message(ai_response)
+    # Twilio <Say> bills per character spoken
+    accounting.record_tts(context, len(ai_response))
     
     # Check if we should escalate based on sentiment/request
     if context.should_escalate():
+        handoff = " I'll connect you with a staff member now. Please hold."
+        holding = "Thank you for holding. A representative will be with you shortly."
+        accounting.record_tts(context, len(handoff) + len(holding))
         response = VoiceResponse()
-        response.say(
-            f"{ai_response} I'll connect you with a staff member now. Please hold.",
-            voice="Polly.Joanna"
-        )
+        response.say(f"{ai_response}{handoff}", voice="Polly.Joanna")
         # In production, transfer to call center queue
         # For now, just say goodbye
-        response.say(
-            "Thank you for holding. A representative will be with you shortly.",
-            voice="Polly.Joanna"
-        )
+        response.say(holding, voice="Polly.Joanna")
         response.pause(length=30)
         response.hangup()
         return Response(content=str(response), media_type="text/xml")
@@ -239,6 +715,7 @@ async def process_speech(request: Request):
     # Say AI response inside gather so it listens immediately after
     gather.say(ai_response, voice="Polly.Joanna")
     response.append(gather)
+    context.listening_since = time.time()
     
     # If no input after 10 seconds of silence, ask if they're still there
     response.say(
@@ -250,6 +727,47 @@ async def process_speech(request: Request):
     return Response(content=str(response), media_type="text/xml")
 
 
+def _overflow_response(reason: str, context: Optional[CallContext] = None) -> Response:
+    """Degraded path when over capacity: skip the AI and go straight to staff"""
+    degraded_responses.inc(reason=reason)
+    
+    message = "Thank you for calling. I'm connecting you with a staff member now. Please hold."
+    if context:
+        accounting.record_tts(context, len(message))
+    response = VoiceResponse()
+    response.say(message, voice="Polly.Joanna")
+    if settings.overflow_transfer_number:
+        response.dial(settings.overflow_transfer_number)
+    else:
+        response.pause(length=30)
+        response.hangup()
+    return Response(content=str(response), media_type="text/xml")
+
+
+def _transfer_to_department(context: CallContext, department: dict) -> Response:
+    """Transfer the caller to a department resolved by the routing index"""
+    name = department.get("name", "the right department")
+    phone_number = department.get("phoneNumber")
+    extension = department.get("extension")
+    
+    context.detected_intent = IntentType.DEPARTMENT_ROUTING
+    context.transfer_target = phone_number or name
+    context.state = CallState.TRANSFERRING
+    logger.info(f"📟 Routing {context.call_sid} to {name} ({context.transfer_target})")
+    
+    message = f"Sure, I'll connect you with {name} now. Please hold."
+    context.add_assistant_message(message)
+    accounting.record_tts(context, len(message))
+    
+    response = VoiceResponse()
+    response.say(message, voice="Polly.Joanna")
+    if phone_number:
+        dial = Dial()
+        dial.number(phone_number, send_digits=f"ww{extension}" if extension else None)
+        response.append(dial)
+    return Response(content=str(response), media_type="text/xml")
+
+
 @app.post("/voice/status")
 async def call_status(request: Request):
     """Handle call status callbacks"""
@@ -261,11 +779,15 @@ async def call_status(request: Request):
     logger.info(f"📊 Call {call_sid}: {call_status} (duration: {call_duration}s)")
     
     if call_status in ["completed", "failed", "busy", "no-answer"]:
+        admission.release_call(call_sid)
+        runtime.close_group(call_sid)
         context = context_manager.get_context(call_sid)
         if context:
             context.state = CallState.COMPLETED
             context.ended_at = datetime.now()
             
+            caller_cache.remember(context)
+            
             # Update call session in core-api
             if context.call_id:
                 await api_client.update_call_session(context.call_id, {
@@ -276,6 +798,7 @@ async def call_status(request: Request):
                 logger.info(f"Updated call session {context.call_id}: {call_status}")
             
             # Clean up context
+            accounting.end_call(call_sid)
             context_manager.remove_context(call_sid)
             logger.info(f"🗑️ Cleaned up context for {call_sid}")
     
@@ -286,25 +809,91 @@ async def call_status(request: Request):
 # AI Response Generation
 # =============================================================================
 
-async def generate_ai_response(context: CallContext, user_message: str) -> str:
+def _describe_plan_check(plan_check: dict) -> str:
+    """Turn an insurance plan check into guidance for the LLM"""
+    plans = plan_check.get("matchingPlans", [])
+    carrier = plan_check.get("carrierName") or (
+        plans[0].get("carrierName") if plans else "the caller's carrier"
+    )
+    if not plan_check.get("isAccepted"):
+        return f"Insurance lookup: none of our accepted plans match \"{carrier}\"."
+    plan_names = ", ".join(sorted({p.get("planName", "") for p in plans if p.get("planName")}))
+    return (
+        f"Insurance lookup: we accept {carrier}"
+        + (f" (plans: {plan_names})." if plan_names else ".")
+    )
+
+
+LLM_UNAVAILABLE_RESPONSE = (
+    "I'm sorry, I'm having a little trouble on my end. Could you say that once more?"
+)
+LLM_BUSY_RESPONSE = "One moment, please. Could you say that again?"
+llm_breaker = CircuitBreaker(
+    "azure_openai",
+    failure_threshold=settings.breaker_failure_threshold,
+    reset_timeout=settings.breaker_reset_seconds,
+)
+
+
+async def _complete_turn(context: CallContext, messages: list, tier: ModelTier):
+    """One scheduled, hedged chat completion on a tier's deployment"""
+    # Endpoints this request has used, so a hedge or retry goes elsewhere
+    used = set()
+    
+    async def complete():
+        started = time.monotonic()
+        # Generate response - keep it concise for phone conversations
+        response = await llm_endpoints.call(
+            lambda endpoint: with_deadline(
+                "azure_openai",
+                get_llm_client(endpoint).chat.completions.create(
+                    model=tier.deployment,
+                    messages=messages,
+                    max_completion_tokens=tier.max_completion_tokens,
+                ),
+                settings.llm_timeout_seconds,
+            ),
+            exclude=used,
+        )
+        tier.record(time.monotonic() - started)
+        return response
+    
+    hedge_delay = tier.latency.percentile(0.95) if settings.llm_hedging_enabled else None
+    async with llm_scheduler.slot(
+        context.hospital_id,
+        lane_for(context),
+        estimate_tokens(messages, tier.max_completion_tokens),
+    ) as grant:
+        response = await llm_breaker.call(
+            lambda: hedged("azure_openai", complete, hedge_delay)
+        )
+        usage = getattr(response, "usage", None)
+        grant.used_tokens = getattr(usage, "total_tokens", None)
+    return response
+
+
+async def generate_ai_response(
+    context: CallContext,
+    user_message: str,
+    instructions: Optional[str] = None,
+) -> str:
     """
     Generate AI response using Azure OpenAI
+    
+    `instructions` carries guidance from the current workflow node.
+    Raises OverloadedError when the hospital's turn doesn't come up in time.
     """
     try:
-        from openai import AsyncAzureOpenAI
-        
-        client = AsyncAzureOpenAI(
-            api_key=settings.azure_openai_key,
-            api_version=settings.azure_openai_api_version,
-            azure_endpoint=settings.azure_openai_endpoint,
-        )
-        
         # Build system prompt
         system_prompt = get_system_prompt(
             hospital_name=context.hospital_name,
             intents=context.intents,
             departments=context.departments,
+            caller_name=context.caller_name,
+            caller_summary=context.caller_summary,
         )
+        if instructions:
+            system_prompt += f"\n\n## Current Step\n{instructions}"
         
         # Build messages
         messages = [
@@ -318,18 +907,48 @@ async def generate_ai_response(context: CallContext, user_message: str) -> str:
                 "content": turn.content
             })
         
-        # Generate response - keep it concise for phone conversations
-        response = await client.chat.completions.create(
-            model=settings.azure_openai_deployment,
-            messages=messages,
-            max_completion_tokens=100,  # Keep responses brief for phone
-        )
+        # Small turns go to a fast model, hard ones to a stronger one
+        tier = model_tiers.choose(context, user_message, instructions)
+        while True:
+            try:
+                response = await _complete_turn(context, messages, tier)
+            except (OverloadedError, CircuitOpenError, DeadlineExceeded):
+                raise
+            except Exception as e:
+                fallback = model_tiers.fallback(tier, "error")
+                if fallback is None:
+                    raise
+                logger.warning(f"{tier.name} tier failed for {context.call_sid} ({e}); retrying on {fallback.name}")
+                tier = fallback
+                continue
+            accounting.record_llm_response(context, response)
+            choice = response.choices[0]
+            ai_response = choice.message.content
+            if ai_response and choice.finish_reason != "length":
+                break
+            reason = "truncated" if ai_response else "empty"
+            fallback = model_tiers.fallback(tier, reason)
+            if fallback is None:
+                if not ai_response:
+                    raise ValueError(f"empty response from {tier.name} tier")
+                break
+            # Raises DeadlineExceeded if the turn has no time left for it
+            remaining(settings.llm_timeout_seconds)
+            logger.debug(f"{tier.name} tier answer {reason} for {context.call_sid}; retrying on {fallback.name}")
+            tier = fallback
         
-        ai_response = response.choices[0].message.content
-        logger.info(f"🤖 AI Response: {ai_response}")
+        logger.debug("🤖 AI Response for {} ({} tier): {!r}", context.call_sid, tier.name, ai_response)
         
         return ai_response
         
+    except OverloadedError:
+        raise
+    except CircuitOpenError:
+        logger.warning("Azure OpenAI breaker open, using canned response")
+        return LLM_UNAVAILABLE_RESPONSE
+    except DeadlineExceeded:
+        logger.warning(f"Turn deadline exceeded waiting for Azure OpenAI ({context.call_sid})")
+        return LLM_UNAVAILABLE_RESPONSE
     except Exception as e:
         logger.error(f"Error generating AI response: {e}")
         return "I'm sorry, I'm having trouble understanding. Could you please repeat that?"
@@ -347,12 +966,14 @@ async def websocket_media_stream(websocket: WebSocket, call_sid: str):
     """
     await websocket.accept()
     logger.info(f"🔌 WebSocket connected for call {call_sid}")
+    writer: Optional[OutboundAudioWriter] = None
     
     try:
         while True:
             data = await websocket.receive_text()
             message = json.loads(data)
             event = message.get("event")
+            admission.touch_call(call_sid)
             
             if event == "connected":
                 logger.info("✅ Twilio stream connected")
@@ -360,11 +981,24 @@ async def websocket_media_stream(websocket: WebSocket, call_sid: str):
             elif event == "start":
                 stream_sid = message.get("start", {}).get("streamSid")
                 logger.info(f"🎙️ Stream started: {stream_sid}")
+                # Outbound audio for this call goes through the paced writer
+                writer = audio_writers[call_sid] = OutboundAudioWriter(
+                    websocket.send_text, stream_sid, call_sid
+                )
+                writer.start()
             
             elif event == "media":
                 # Handle audio chunk
                 # In full Pipecat integration, this would feed into the pipeline
-                pass
+                media_log.debug(
+                    "Media frame for {}: {} bytes",
+                    call_sid, len(message.get("media", {}).get("payload", "")),
+                )
+            
+            elif event == "mark":
+                # Twilio finished playing outbound audio up to this mark
+                if writer:
+                    writer.on_mark(message.get("mark", {}).get("name", ""))
             
             elif event == "stop":
                 logger.info("⏹️ Stream stopped")
@@ -375,7 +1009,13 @@ async def websocket_media_stream(websocket: WebSocket, call_sid: str):
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
     finally:
+        if writer:
+            audio_writers.pop(call_sid, None)
+            await writer.close()
+        accounting.end_call(call_sid)
         context_manager.remove_context(call_sid)
+        admission.release_call(call_sid)
+        runtime.close_group(call_sid)
 
 
 # =============================================================================
@@ -0,0 +1,50 @@
+"""
+Singleflight request coalescing
+
+Concurrent callers asking for the same key share one in-flight call and
+its result. This guards against thundering herds (a burst of calls to one
+hospital all fetching the same config at once); it is not a cache, and
+nothing is kept once the call completes.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from metrics import metrics
+
+
+_requests = metrics.counter(
+    "singleflight_requests_total",
+    "Coalesced calls by role (leader issued the request, follower shared it)",
+)
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls by key"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run `fn` unless a call for `key` is already in flight, in which case
+        wait for that one. Results are shared between callers and must be
+        treated as read-only.
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            _requests.inc(client=self.name, role="leader")
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+        else:
+            _requests.inc(client=self.name, role="follower")
+        # Shield so one caller being cancelled doesn't cancel everyone's request
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Mark the exception retrieved in case every waiter was cancelled
+            task.exception()
@@ -0,0 +1,208 @@
+"""
+Supervised background task runtime
+
+Background work used to be started with a bare asyncio.create_task() and
+the handle dropped, which caused three problems:
+- The task could be garbage-collected mid-run.
+- Tasks piled up without limit under load.
+- They outlived the call that started them.
+
+Work now goes through the process-wide runtime, which:
+- keeps a handle to every task
+- runs at most BACKGROUND_MAX_CONCURRENT at once, rejecting new work once
+  BACKGROUND_MAX_QUEUED are waiting
+- logs failures instead of dropping them
+- exports queued/running/failed counts by kind
+
+Process-lifetime loops (flushers, pollers) use spawn_service(), which
+supervises them the same way without taking one of those slots.
+
+Each call gets a task group that is cancelled when the call or its
+pipeline ends. A group runs one task per key at a time: a second
+"sentiment" job while one is still running is coalesced, not queued.
+
+CPU-heavy work goes to a bounded thread pool (run_in_thread), or to a
+process pool for pure functions (run_in_process), so it never blocks the
+event loop.
+"""
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, TypeVar
+from loguru import logger
+
+from config import settings
+from metrics import metrics
+
+
+T = TypeVar("T")
+
+_queued = metrics.gauge("background_tasks_queued", "Background tasks waiting for a slot, by kind")
+_running = metrics.gauge("background_tasks_running", "Background tasks running, by kind")
+_finished = metrics.counter(
+    "background_tasks_total",
+    "Background tasks by kind and outcome (ok, failed, cancelled, rejected, coalesced)",
+)
+
+
+class CallTaskGroup:
+    """Background tasks belonging to one call; cancelled together when it ends"""
+
+    def __init__(self, runtime: "TaskRuntime", call_sid: str):
+        self.call_sid = call_sid
+        self._runtime = runtime
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.closed = False
+
+    def spawn(self, key: str, coro: Awaitable[Any]) -> Optional[asyncio.Task]:
+        """Run `coro` unless a task with this key is still running for the call"""
+        running = self._tasks.get(key)
+        if self.closed or (running and not running.done()):
+            coro.close()
+            _finished.inc(kind=key, outcome="coalesced")
+            return None
+        task = self._runtime.spawn(key, coro)
+        if task:
+            self._tasks[key] = task
+            task.add_done_callback(lambda t: self._tasks.get(key) is t and self._tasks.pop(key))
+        return task
+
+    def cancel(self):
+        self.closed = True
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+
+
+class TaskRuntime:
+    """Process-wide supervised executor for background coroutines and CPU work"""
+
+    def __init__(self):
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._waiting = 0
+        self._groups: Dict[str, CallTaskGroup] = {}
+        self._threads = ThreadPoolExecutor(
+            max_workers=settings.background_thread_workers,
+            thread_name_prefix="background",
+        )
+        self._processes: Optional[ProcessPoolExecutor] = None
+
+    # -------------------------------------------------------------------------
+    # Coroutines
+    # -------------------------------------------------------------------------
+
+    def spawn(self, kind: str, coro: Awaitable[Any]) -> Optional[asyncio.Task]:
+        """Start supervised background work; None if the queue is full"""
+        if self._waiting >= settings.background_max_queued:
+            coro.close()
+            _finished.inc(kind=kind, outcome="rejected")
+            logger.warning(f"Background queue full; dropped {kind} task")
+            return None
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(settings.background_max_concurrent)
+        # Counted as queued from here, so a burst can't overrun the limit
+        self._waiting += 1
+        _queued.inc(kind=kind)
+        waiting = [True]
+        task = asyncio.create_task(self._supervise(kind, coro, waiting))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(lambda t: self._dequeue(kind, coro, waiting))
+        return task
+
+    def _dequeue(self, kind: str, coro: Awaitable[Any], waiting: list):
+        """Stop counting a task as queued; closes it if it never got a slot"""
+        if waiting[0]:
+            waiting[0] = False
+            self._waiting -= 1
+            _queued.dec(kind=kind)
+            coro.close()
+            _finished.inc(kind=kind, outcome="cancelled")
+
+    async def _supervise(self, kind: str, coro: Awaitable[Any], waiting: list):
+        await self._slots.acquire()
+        waiting[0] = False
+        self._waiting -= 1
+        _queued.dec(kind=kind)
+        try:
+            return await self._run(kind, coro)
+        finally:
+            self._slots.release()
+
+    async def _run(self, kind: str, coro: Awaitable[Any]):
+        _running.inc(kind=kind)
+        try:
+            result = await coro
+            _finished.inc(kind=kind, outcome="ok")
+            return result
+        except asyncio.CancelledError:
+            _finished.inc(kind=kind, outcome="cancelled")
+            raise
+        except Exception as e:
+            _finished.inc(kind=kind, outcome="failed")
+            logger.opt(exception=e).error(f"Background {kind} task failed: {e}")
+        finally:
+            _running.dec(kind=kind)
+
+    def spawn_service(self, kind: str, coro: Awaitable[Any]) -> asyncio.Task:
+        """
+        Start a loop that runs for the life of the process (flushers,
+        pollers, warmup). Tracked, logged and cancelled on shutdown like
+        spawn(), but never queued and never holding a concurrency slot.
+        """
+        task = asyncio.create_task(self._run(kind, coro))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    # -------------------------------------------------------------------------
+    # Per-call groups
+    # -------------------------------------------------------------------------
+
+    def group(self, call_sid: str) -> CallTaskGroup:
+        group = self._groups.get(call_sid)
+        if group is None:
+            group = self._groups[call_sid] = CallTaskGroup(self, call_sid)
+        return group
+
+    def close_group(self, call_sid: str):
+        """Cancel whatever a finished call still has running"""
+        group = self._groups.pop(call_sid, None)
+        if group:
+            group.cancel()
+
+    # -------------------------------------------------------------------------
+    # CPU-bound work
+    # -------------------------------------------------------------------------
+
+    async def run_in_thread(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run blocking or CPU-heavy work on the bounded thread pool"""
+        return await asyncio.get_running_loop().run_in_executor(self._threads, fn, *args)
+
+    async def run_in_process(self, fn: Callable[..., T], *args: Any) -> T:
+        """
+        Run a pure, picklable function in the process pool, for work that
+        holds the GIL too long for a thread. Runs on the thread pool when
+        BACKGROUND_PROCESS_WORKERS is 0.
+        """
+        if settings.background_process_workers <= 0:
+            return await self.run_in_thread(fn, *args)
+        if self._processes is None:
+            self._processes = ProcessPoolExecutor(max_workers=settings.background_process_workers)
+        return await asyncio.get_running_loop().run_in_executor(self._processes, fn, *args)
+
+    async def shutdown(self):
+        """Cancel outstanding tasks and stop the pools"""
+        for group in list(self._groups.values()):
+            group.cancel()
+        self._groups.clear()
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        if self._processes:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+
+
+# Global background task runtime
+runtime = TaskRuntime()
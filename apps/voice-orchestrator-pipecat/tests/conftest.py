@@ -0,0 +1,17 @@
+"""
+Shared test setup: the settings module requires credentials at import,
+so give it placeholders and put the app directory on the import path.
+"""
+import os
+import sys
+
+for name, value in {
+    "TWILIO_ACCOUNT_SID": "ACtest",
+    "TWILIO_AUTH_TOKEN": "test",
+    "AZURE_SPEECH_KEY": "test",
+    "AZURE_OPENAI_KEY": "test",
+    "AZURE_OPENAI_ENDPOINT": "https://test.openai.azure.com",
+}.items():
+    os.environ.setdefault(name, value)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
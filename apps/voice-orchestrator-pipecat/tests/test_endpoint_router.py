@@ -0,0 +1,180 @@
+"""Tests for latency-aware endpoint routing"""
+import asyncio
+
+import pytest
+
+import endpoint_router
+from config import settings
+from endpoint_router import Endpoint, EndpointRouter
+from resilience import hedged
+
+
+@pytest.fixture(autouse=True)
+def no_exploration(monkeypatch):
+    monkeypatch.setattr(settings, "endpoint_explore_fraction", 0.0)
+    monkeypatch.setattr(settings, "endpoint_ewma_alpha", 0.5)
+    monkeypatch.setattr(settings, "endpoint_failure_threshold", 2)
+    monkeypatch.setattr(settings, "endpoint_cooldown_seconds", 30.0)
+    monkeypatch.setattr(settings, "endpoint_failover_attempts", 2)
+
+
+def make_router(*names: str) -> EndpointRouter:
+    return EndpointRouter("test", [Endpoint(name=n, target=n, key="k") for n in names])
+
+
+def test_routes_to_lowest_latency_ewma():
+    router = make_router("east", "west")
+    east, west = router.endpoints
+    router.record(east, 0.8, ok=True)
+    router.record(west, 0.2, ok=True)
+    assert router.choose() is west
+
+    # West slows down; the EWMA moves it behind east
+    for _ in range(4):
+        router.record(west, 2.0, ok=True)
+    assert west.latency > east.latency
+    assert router.choose() is east
+
+
+def test_errors_inflate_score():
+    router = make_router("east", "west")
+    east, west = router.endpoints
+    router.record(east, 0.5, ok=True)
+    router.record(west, 0.3, ok=True)
+    router.record(west, 0.3, ok=False)
+    assert west.latency < east.latency
+    assert router.choose() is east
+
+
+def test_cooldown_after_repeated_failures_doubles():
+    router = make_router("east", "west")
+    east, west = router.endpoints
+    router.record(east, 0.1, ok=False)
+    assert east.healthy(endpoint_router.time.monotonic())
+    router.record(east, 0.1, ok=False)
+    assert east.cooldown == 30.0
+    assert not east.healthy(endpoint_router.time.monotonic())
+    assert router.choose() is west
+
+    # Cooldown over, still failing: out for twice as long
+    east.down_until = 0.0
+    router.record(east, 0.1, ok=False)
+    assert east.cooldown == 60.0
+
+    # A success resets it
+    east.down_until = 0.0
+    router.record(east, 0.1, ok=True)
+    assert east.cooldown == 0.0 and east.consecutive_failures == 0
+
+
+def test_all_down_picks_soonest_back():
+    router = make_router("east", "west")
+    east, west = router.endpoints
+    east.down_until = 1e12
+    west.down_until = 1e11
+    assert router.choose() is west
+
+
+def test_call_fails_over_to_next_endpoint():
+    router = make_router("east", "west")
+    east, west = router.endpoints
+    router.record(east, 0.1, ok=True)
+    router.record(west, 0.5, ok=True)
+    called = []
+
+    async def fn(endpoint):
+        called.append(endpoint.name)
+        if endpoint is east:
+            raise ConnectionError("down")
+        return "ok"
+
+    assert asyncio.run(router.call(fn)) == "ok"
+    assert called == ["east", "west"]
+    assert east.consecutive_failures == 1
+
+
+def test_call_raises_after_last_attempt():
+    router = make_router("east", "west")
+
+    async def fn(endpoint):
+        raise ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(router.call(fn))
+    assert all(e.consecutive_failures == 1 for e in router.endpoints)
+
+
+def test_exploration_sends_traffic_to_standby(monkeypatch):
+    router = make_router("east", "west", "north")
+    east, west, north = router.endpoints
+    router.record(east, 0.1, ok=True)
+    router.record(west, 0.5, ok=True)
+    router.record(north, 0.9, ok=True)
+    monkeypatch.setattr(settings, "endpoint_explore_fraction", 1.0)
+    monkeypatch.setattr(endpoint_router.random, "choice", lambda options: options[-1])
+    assert router.choose() is north
+
+
+def test_hedge_loser_records_latency_only():
+    router = make_router("east", "west")
+    east, west = router.endpoints
+    router.record(east, 0.01, ok=True)
+    router.record(west, 0.01, ok=True)
+    tried = set()
+
+    async def fn(endpoint):
+        await asyncio.sleep(0.3 if endpoint is east else 0.0)
+        return endpoint.name
+
+    async def run():
+        return await hedged("test", lambda: router.call(fn, exclude=tried), delay=0.05)
+
+    assert asyncio.run(run()) == "west"
+    # The cancelled primary still reports how long it had taken
+    assert east.samples == 2 and east.latency > 0.01
+    assert east.consecutive_failures == 0 and east.error_rate == 0.0
+
+
+def test_request_errors_are_not_failed_over():
+    router = make_router("east", "west")
+    east, west = router.endpoints
+    router.record(east, 0.1, ok=True)
+    router.record(west, 0.5, ok=True)
+    called = []
+
+    class BadRequest(Exception):
+        status_code = 400
+
+    async def fn(endpoint):
+        called.append(endpoint.name)
+        raise BadRequest("content filter")
+
+    with pytest.raises(BadRequest):
+        asyncio.run(router.call(fn))
+    assert called == ["east"]
+    assert east.consecutive_failures == 0 and east.error_rate == 0.0
+
+
+def test_throttling_and_timeouts_fail_over():
+    class Throttled(Exception):
+        status_code = 429
+
+    class Wrapped(Exception):
+        pass
+
+    wrapped = Wrapped("connection error")
+    wrapped.__cause__ = endpoint_router.httpx.ConnectTimeout("timed out")
+    assert endpoint_router.is_endpoint_failure(Throttled())
+    assert endpoint_router.is_endpoint_failure(asyncio.TimeoutError())
+    assert endpoint_router.is_endpoint_failure(wrapped)
+    assert not endpoint_router.is_endpoint_failure(ValueError("bad"))
+
+
+def test_cancelled_latency_never_lowers_ewma():
+    router = make_router("east")
+    east, = router.endpoints
+    router.record(east, 1.0, ok=True)
+    router.record_latency(east, 0.1)
+    assert east.latency == 1.0
+    router.record_latency(east, 3.0)
+    assert east.latency == 2.0
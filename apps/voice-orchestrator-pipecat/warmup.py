@@ -0,0 +1,111 @@
+"""
+Startup warmup and readiness
+
+Tracks how long the server took to import and to warm up (open the
+core-api and Azure OpenAI connections, load hospital config, pre-render
+greetings). /ready reports true only once the core-api and hospital config
+steps have succeeded; a timed-out or failed attempt is retried, so a freshly
+scheduled pod never takes its first calls cold. Other steps that miss the
+timeout fill on first use.
+
+The hospital config step needs the hospital list and most (not all)
+hospitals refreshed, so one broken tenant can't keep the server out of
+service. Hospitals that didn't refresh are listed as cold and retried in
+the background.
+"""
+import time
+from typing import Any, Awaitable, Dict, List, Optional, Set
+from loguru import logger
+
+from metrics import metrics
+
+
+# Steps without which the server would take calls cold
+REQUIRED_STEPS = ("core_api", "hospital_config")
+
+_step_seconds = metrics.gauge("warmup_step_seconds", "Duration of each startup warmup step")
+
+
+class Warmup:
+    """Startup timings and readiness state"""
+
+    def __init__(self):
+        self.import_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self.steps: Dict[str, float] = {}
+        self.failed: List[str] = []
+        self.completed: Set[str] = set()
+        # Hospitals whose config hasn't refreshed yet; served from old snapshots
+        self.cold_hospitals: Set[str] = set()
+        self.attempts = 0
+        self.timed_out = False
+        self.ready = False
+        self._started: Optional[float] = None
+
+    def record_imports(self, seconds: float):
+        self.import_seconds = seconds
+        _step_seconds.set(seconds, step="imports")
+
+    def start(self):
+        """Begin a warmup attempt"""
+        if self._started is None:
+            self._started = time.perf_counter()
+        self.attempts += 1
+        self.failed = []
+        self.completed = set()
+        self.timed_out = False
+
+    async def run(self, name: str, awaitable: Awaitable[Any]) -> Any:
+        """Await one warmup step, recording its duration; failures return None"""
+        started = time.perf_counter()
+        try:
+            result = await awaitable
+        except Exception as e:
+            self.failed.append(name)
+            logger.warning(f"Warmup step {name} failed: {e}")
+            return None
+        finally:
+            self.steps[name] = time.perf_counter() - started
+            _step_seconds.set(self.steps[name], step=name)
+        self.completed.add(name)
+        return result
+
+    def finish(self, timed_out: bool = False) -> bool:
+        """
+        End a warmup attempt. The server becomes ready only if every required
+        step has succeeded; returns whether it did.
+        """
+        self.timed_out = timed_out
+        self.warmup_seconds = time.perf_counter() - (self._started or time.perf_counter())
+        missing = [step for step in REQUIRED_STEPS if step not in self.completed]
+        if missing:
+            logger.warning(
+                f"Warmup attempt {self.attempts} incomplete"
+                + (" (timed out)" if timed_out else "")
+                + f", still cold: {', '.join(missing)}; staying not ready"
+            )
+            return False
+        self.ready = True
+        _step_seconds.set(self.warmup_seconds, step="total")
+        logger.info(
+            f"Warmup finished in {self.warmup_seconds:.2f}s"
+            + (" (timed out)" if timed_out else "")
+            + (f", failed: {', '.join(self.failed)}" if self.failed else "")
+        )
+        return True
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "attempts": self.attempts,
+            "import_seconds": self.import_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "steps": self.steps,
+            "failed": self.failed,
+            "cold_hospitals": sorted(self.cold_hospitals),
+            "timed_out": self.timed_out,
+        }
+
+
+# Global warmup state
+warmup = Warmup()
@@ -0,0 +1,720 @@
+"""
+Local workflow interpreter
+
+Compiles a hospital's published workflow graph into an in-memory state
+machine and runs deterministic nodes (branches, field checks, routing)
+in-process. Only LLM nodes and side-effect nodes leave the process.
+Webhook and integration nodes post collected fields only to core-api or
+an allowlisted HTTPS host, in the background, so the caller's turn never
+waits on them.
+
+Waiting nodes advance on the caller's own words:
+- intent-detect: the intent is matched from cue phrases
+- collect-info: fields are asked for one at a time, and each answer is
+  recorded as that field
+- question and collect-info read a collected name back to the caller and
+  only mark it confirmed (and use it as the caller's name) on a yes
+- ai-agent: leaves by an edge for the detected intent, or by its
+  unconditional edge once the caller says they're done
+"""
+import math
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlsplit
+from loguru import logger
+
+from config import settings
+from call_context import CallContext, CallState, CollectedField, IntentType
+from caller_cache import NAME_FIELDS
+from core_api_client import api_client
+from resilience import CircuitBreaker
+from task_runtime import runtime
+
+
+# Node types the interpreter resolves without leaving the process
+LOCAL_NODE_TYPES = {
+    "start", "emergency-screen", "conditional", "route", "safety-check", "end",
+}
+
+# Node types that wait for the caller and hand the turn to the LLM
+LLM_NODE_TYPES = {"ai-agent", "collect-info", "intent-detect"}
+
+# Node types that call out to other systems
+SIDE_EFFECT_NODE_TYPES = {
+    "webhook", "integration", "human-agent-queue", "human-agent-direct",
+}
+
+# Guard against cycles in malformed graphs
+MAX_STEPS_PER_TURN = 50
+
+# Compiled versions kept; calls on an evicted version recompile it
+MAX_COMPILED_WORKFLOWS = 256
+
+# Caller turns an intent-detect node asks before settling on a general inquiry
+INTENT_DETECT_MAX_TURNS = 2
+
+# Phrases that mark an intent; checked in order, first match wins
+INTENT_CUES: List[Tuple[IntentType, Tuple[str, ...]]] = [
+    (IntentType.TRANSFER_TO_HUMAN, (
+        "real person", "human", "representative", "operator", "speak to someone",
+        "talk to someone", "live agent",
+    )),
+    (IntentType.PRESCRIPTION_REFILL, ("refill", "prescription", "pharmacy", "medication")),
+    (IntentType.SCHEDULING, (
+        "appointment", "schedule", "reschedule", "book", "cancel", "see the doctor",
+        "see a doctor", "availability",
+    )),
+    (IntentType.INSURANCE, ("insurance", "coverage", "covered", "in network", "in-network")),
+    (IntentType.BILLING, ("bill", "payment", "pay my", "charge", "invoice", "balance", "statement")),
+    (IntentType.MEDICAL_RECORDS, ("records", "test results", "lab results", "forms", "paperwork")),
+    (IntentType.CLINICAL_TRIAGE, (
+        "symptom", "pain", "fever", "sick", "hurts", "cough", "nurse", "rash",
+    )),
+    (IntentType.DEPARTMENT_ROUTING, ("department", "transfer me", "connect me", "extension")),
+]
+
+# Phrases that end the caller's business with an ai-agent node
+DONE_PHRASES = (
+    "that's all", "that is all", "that's it", "that's everything", "nothing else",
+    "no thank you", "no thanks", "i'm all set", "all set", "i'm done", "goodbye",
+)
+
+
+class StepKind(Enum):
+    """What the server should do with the current turn"""
+    LLM = "llm"              # Generate the response with the LLM
+    SAY = "say"              # Speak a fixed prompt (question node)
+    ESCALATE = "escalate"    # Hand the call to a human
+    END = "end"              # Workflow finished
+
+
+@dataclass
+class CompiledNode:
+    """A workflow node with its outgoing edges resolved"""
+    id: str
+    type: str
+    config: Dict[str, Any]
+    edges: List[Tuple[Optional[str], str]] = field(default_factory=list)  # (condition, to_node_id)
+
+    def next_node_id(self, *conditions: Optional[str]) -> Optional[str]:
+        """Pick the outgoing edge matching one of the conditions, else the unconditional one"""
+        wanted = [c for c in conditions if c]
+        for condition in wanted:
+            for edge_condition, to_node_id in self.edges:
+                if edge_condition == condition:
+                    return to_node_id
+        return self.unconditional_next_id()
+
+    def unconditional_next_id(self) -> Optional[str]:
+        return next((to_node_id for condition, to_node_id in self.edges if not condition), None)
+
+    def intent_next_id(self, intent: IntentType) -> Optional[str]:
+        """The edge taken for an intent: `scheduling`, `intent:scheduling` or `intent:clinical`"""
+        for edge_condition, to_node_id in self.edges:
+            if edge_condition and _intent_matches(edge_condition, intent):
+                return to_node_id
+        return None
+
+
+@dataclass
+class CompiledWorkflow:
+    """In-memory state machine for one workflow version"""
+    workflow_id: str
+    version: int
+    start_node_id: Optional[str]
+    nodes: Dict[str, CompiledNode]
+
+
+@dataclass
+class StepResult:
+    """Outcome of advancing a call's workflow for one turn"""
+    kind: StepKind
+    node_id: Optional[str] = None
+    text: Optional[str] = None
+    instructions: Optional[str] = None
+    reason: Optional[str] = None
+
+
+def compile_workflow(workflow_id: str, version: int, graph: Dict[str, Any]) -> CompiledWorkflow:
+    """Compile a WorkflowGraph ({nodes, edges}) into a node lookup table"""
+    nodes: Dict[str, CompiledNode] = {}
+    start_node_id = None
+
+    for node in graph.get("nodes", []):
+        compiled = CompiledNode(
+            id=node["id"],
+            type=node.get("type", ""),
+            config=node.get("config") or {},
+        )
+        nodes[compiled.id] = compiled
+        if compiled.type == "start" and start_node_id is None:
+            start_node_id = compiled.id
+
+    for edge in graph.get("edges", []):
+        source = nodes.get(edge.get("fromNodeId"))
+        if source and edge.get("toNodeId") in nodes:
+            source.edges.append((edge.get("condition"), edge["toNodeId"]))
+
+    return CompiledWorkflow(
+        workflow_id=workflow_id,
+        version=version,
+        start_node_id=start_node_id,
+        nodes=nodes,
+    )
+
+
+def _field_values(context: CallContext) -> Dict[str, Any]:
+    """Values that conditions and routing rules can reference"""
+    values = {key: f.value for key, f in context.collected_fields.items()}
+    if context.detected_intent:
+        values.setdefault("intent", context.detected_intent.value)
+    values.setdefault("isEmergency", context.is_emergency)
+    return values
+
+
+def _js_string(value: Any) -> str:
+    """String(value) as core-api's JavaScript renders it"""
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _js_number(value: Any) -> float:
+    """Number(value) as core-api's JavaScript converts it; NaN when it can't"""
+    if value is None:
+        return 0.0
+    if isinstance(value, (bool, int, float)):
+        return float(value)
+    text = str(value).strip()
+    if not text:
+        return 0.0
+    try:
+        number = float(text)
+    except ValueError:
+        return math.nan
+    # float() also takes "inf" and "nan", which Number() doesn't
+    return number if math.isfinite(number) or text.lstrip("+-") == "Infinity" else math.nan
+
+
+def _strict_equals(actual: Any, expected: Any) -> bool:
+    """JavaScript ===: no coercion between strings, numbers and booleans"""
+    if isinstance(actual, bool) or isinstance(expected, bool):
+        return isinstance(actual, bool) and isinstance(expected, bool) and actual == expected
+    if isinstance(actual, (int, float)) and isinstance(expected, (int, float)):
+        return actual == expected
+    return type(actual) is type(expected) and actual == expected
+
+
+def _compare(actual: Any, operator: str, expected: Any) -> bool:
+    """
+    Evaluate a condition operator the same way core-api does: strict
+    equality, case-sensitive substring, and numeric comparison where
+    anything non-numeric is false
+    """
+    if operator == "equals":
+        return _strict_equals(actual, expected)
+    if operator == "contains":
+        return _js_string(expected) in _js_string(actual)
+    if operator == "greater_than":
+        return _js_number(actual) > _js_number(expected)
+    if operator == "less_than":
+        return _js_number(actual) < _js_number(expected)
+    return False
+
+
+def _intent_matches(condition: str, intent: IntentType) -> bool:
+    """Whether an edge condition names an intent, with or without an `intent:` prefix"""
+    name = condition.removeprefix("intent:")
+    return name == intent.value or name == intent.value.split("-")[0]
+
+# Replies that confirm a name read back to the caller, unless negated
+YES_WORDS = {"yes", "yeah", "yep", "yup", "correct", "right", "exactly"}
+NO_WORDS = {"no", "nope", "not", "wrong", "incorrect"}
+
+# Lead-ins stripped from a name answer before it is read back
+NAME_PREFIX = re.compile(r"^(?:my name is|my name's|the name is|this is|it's|it is|i'm|i am)\s+", re.I)
+
+
+def detect_intent(text: str) -> Optional[IntentType]:
+    """Match a caller utterance against the intent cue phrases"""
+    lowered = text.lower()
+    for intent, cues in INTENT_CUES:
+        if any(cue in lowered for cue in cues):
+            return intent
+    return None
+
+
+def _is_done(text: str) -> bool:
+    lowered = text.lower()
+    return any(phrase in lowered for phrase in DONE_PHRASES)
+
+
+def _is_yes(text: str) -> bool:
+    words = set(re.findall(r"[a-z']+", text.lower()))
+    return bool(words & YES_WORDS) and not words & NO_WORDS
+
+
+def _pending_name(context: CallContext, field_key: Optional[str]) -> Optional[CollectedField]:
+    """A name read back to the caller last turn and not yet confirmed"""
+    if field_key not in NAME_FIELDS:
+        return None
+    collected = context.collected_fields.get(field_key)
+    return collected if collected and not collected.confirmed else None
+
+
+def _collect(context: CallContext, node_id: str, field_key: str, answer: str) -> Optional["StepResult"]:
+    """Record an answer; a name is read back for the caller to confirm"""
+    if field_key not in NAME_FIELDS:
+        context.collect_field(field_key, answer)
+        return None
+    name = NAME_PREFIX.sub("", answer.strip()).strip(" .")
+    context.collect_field(field_key, name)
+    return StepResult(
+        kind=StepKind.SAY,
+        node_id=node_id,
+        text=f"Just to confirm, I have your name as {name}. Is that right?",
+    )
+
+
+def _settle_name(context: CallContext, pending: CollectedField, reply: str) -> bool:
+    """Apply the caller's reply to a read-back name; True if they confirmed it"""
+    if _is_yes(reply):
+        pending.confirmed = True
+        context.caller_name = str(pending.value)
+        return True
+    del context.collected_fields[pending.key]
+    return False
+
+
+def _field_name(field_config: Dict[str, Any]) -> Optional[str]:
+    """collect-info fields use `name`; intent required fields use `key`"""
+    return field_config.get("name") or field_config.get("key")
+
+
+def _transcript(context: CallContext) -> str:
+    return " ".join(
+        turn.content for turn in context.conversation_history if turn.role == "user"
+    ).lower()
+
+
+class WorkflowEngine:
+    """Fetches, compiles and runs hospital workflows"""
+
+    def __init__(self):
+        self._refresh_seconds = settings.workflow_refresh_seconds
+        # (workflow_id, version) -> compiled state machine, least recently used first
+        self._compiled: "OrderedDict[Tuple[str, int], CompiledWorkflow]" = OrderedDict()
+        # workflow_id -> (fetched_at, published version dict)
+        self._versions: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._webhook_hosts = {
+            h.strip().lower() for h in settings.workflow_webhook_hosts.split(",") if h.strip()
+        }
+        # Webhook host -> breaker, so one dead integration fails fast
+        self._webhook_breakers: Dict[str, CircuitBreaker] = {}
+
+    # -------------------------------------------------------------------------
+    # Loading
+    # -------------------------------------------------------------------------
+
+    @staticmethod
+    def find_workflow_id(hospital: Dict[str, Any], phone_number: str) -> Optional[str]:
+        """Find the workflow attached to the dialed phone number"""
+        digits = ''.join(filter(str.isdigit, phone_number))[-10:]
+        for pn in hospital.get("phoneNumbers", []):
+            stored = ''.join(filter(str.isdigit, pn.get("twilioPhoneNumber", "")))
+            if digits and stored.endswith(digits):
+                return pn.get("workflowId")
+        return None
+
+    async def load(self, hospital_id: str, workflow_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Get the published version of a workflow, refetching at most once per
+        refresh interval. The returned dict is what goes in CallContext.workflow.
+        """
+        if not workflow_id:
+            return None
+        cached = self._versions.get(workflow_id)
+        if cached and time.monotonic() - cached[0] < self._refresh_seconds:
+            return cached[1]
+
+        workflow = await api_client.get_workflow(hospital_id, workflow_id)
+        if not workflow:
+            return cached[1] if cached else None
+
+        versions = workflow.get("versions", [])
+        published = next((v for v in versions if v.get("status") == "PUBLISHED"), None)
+        if not published:
+            logger.warning(f"Workflow {workflow_id} has no published version")
+            return cached[1] if cached else None
+
+        self._versions[workflow_id] = (time.monotonic(), published)
+        self.compile(published)
+        return published
+
+    def compile(self, version: Dict[str, Any]) -> CompiledWorkflow:
+        """Compile a workflow version, reusing the cached machine if present"""
+        key = (version.get("workflowId", ""), int(version.get("versionNumber", 0)))
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            compiled = compile_workflow(key[0], key[1], version.get("graphJson") or {})
+            self._compiled[key] = compiled
+            logger.info(
+                f"Compiled workflow {key[0]} v{key[1]} ({len(compiled.nodes)} nodes)"
+            )
+            # Republished versions would otherwise pile up
+            while len(self._compiled) > MAX_COMPILED_WORKFLOWS:
+                self._compiled.popitem(last=False)
+        else:
+            self._compiled.move_to_end(key)
+        return compiled
+
+    def invalidate(self, workflow_id: str):
+        """Drop a workflow's fetched version so the next load refetches it"""
+        self._versions.pop(workflow_id, None)
+
+    # -------------------------------------------------------------------------
+    # Execution
+    # -------------------------------------------------------------------------
+
+    async def advance(self, context: CallContext, user_message: str) -> StepResult:
+        """
+        Feed one caller utterance into the workflow and run local nodes until
+        the turn needs the LLM, the caller, a human, or the workflow ends.
+        """
+        if not context.workflow:
+            return StepResult(kind=StepKind.LLM)
+
+        workflow = self.compile(context.workflow)
+        node_id = context.workflow_node_id or workflow.start_node_id
+        resuming = context.workflow_node_id is not None
+        if context.detected_intent is None and user_message:
+            context.detected_intent = detect_intent(user_message)
+
+        for _ in range(MAX_STEPS_PER_TURN):
+            node = workflow.nodes.get(node_id) if node_id else None
+            if node is None:
+                return StepResult(kind=StepKind.LLM)
+
+            if node_id != context.workflow_node_id:
+                context.workflow_node_id = node_id
+                context.workflow_node_turns = 0
+
+            if node.type in LLM_NODE_TYPES or node.type == "question":
+                result, next_id = self._run_waiting_node(context, node, user_message, resuming)
+                resuming = False
+            elif node.type in SIDE_EFFECT_NODE_TYPES:
+                result, next_id = await self._run_side_effect_node(context, node)
+            else:
+                result, next_id = self._run_local_node(context, node)
+
+            if result is not None:
+                return result
+            if next_id is None:
+                return StepResult(kind=StepKind.END, node_id=node.id)
+            node_id = next_id
+
+        logger.error(f"Workflow step limit reached for call {context.call_sid}")
+        return StepResult(kind=StepKind.LLM)
+
+    def _run_local_node(
+        self,
+        context: CallContext,
+        node: CompiledNode,
+    ) -> Tuple[Optional[StepResult], Optional[str]]:
+        """Deterministic nodes: resolve and move on within the same turn"""
+        config = node.config
+
+        if node.type == "start":
+            return None, node.next_node_id()
+
+        if node.type == "end":
+            context.state = CallState.ENDING
+            return StepResult(kind=StepKind.END, node_id=node.id), None
+
+        if node.type == "emergency-screen":
+            if context.is_emergency:
+                return StepResult(
+                    kind=StepKind.ESCALATE, node_id=node.id, reason="Emergency detected"
+                ), None
+            return None, node.next_node_id("not_emergency")
+
+        if node.type == "conditional":
+            condition = config.get("condition") or {}
+            value = _field_values(context).get(condition.get("field"))
+            met = value is not None and _compare(
+                value, condition.get("operator", "equals"), condition.get("value")
+            )
+            next_id = config.get("trueNodeId") if met else config.get("falseNodeId")
+            return None, next_id or node.next_node_id("true" if met else "false")
+
+        if node.type == "safety-check":
+            transcript = _transcript(context)
+            triggered = [
+                kw for kw in config.get("keywords", []) if kw.lower() in transcript
+            ]
+            if triggered and config.get("action") == "escalate":
+                return StepResult(
+                    kind=StepKind.ESCALATE,
+                    node_id=node.id,
+                    reason=f"Medical keywords detected: {', '.join(triggered)}",
+                ), None
+            return None, node.next_node_id()
+
+        if node.type == "route":
+            values = _field_values(context)
+            rules = sorted(
+                config.get("routingRules", []),
+                key=lambda r: r.get("priority", 0),
+                reverse=True,
+            )
+            for rule in rules:
+                conditions = rule.get("conditions", [])
+                if all(
+                    c.get("field") in values
+                    and _compare(values[c["field"]], c.get("operator", "equals"), c.get("value"))
+                    for c in conditions
+                ):
+                    target = rule.get("target") or {}
+                    context.transfer_target = target.get("value")
+                    logger.info(f"Workflow routed {context.call_sid} to {context.transfer_target}")
+                    return None, node.next_node_id(target.get("type"))
+            return None, node.next_node_id()
+
+        logger.warning(f"Unknown workflow node type: {node.type}")
+        return None, node.next_node_id()
+
+    def _run_waiting_node(
+        self,
+        context: CallContext,
+        node: CompiledNode,
+        user_message: str,
+        resuming: bool,
+    ) -> Tuple[Optional[StepResult], Optional[str]]:
+        """Nodes that hold the call until the caller has said something useful"""
+        config = node.config
+
+        if node.type == "question":
+            field_key = config.get("field")
+            if resuming and field_key and user_message:
+                pending = _pending_name(context, field_key)
+                if pending is None:
+                    confirm = _collect(context, node.id, field_key, user_message)
+                    if confirm:
+                        return confirm, None
+                    return None, node.next_node_id()
+                if _settle_name(context, pending, user_message):
+                    return None, node.next_node_id()
+            return StepResult(
+                kind=StepKind.SAY, node_id=node.id, text=config.get("question")
+            ), None
+
+        if node.type == "intent-detect":
+            if resuming:
+                context.workflow_node_turns += 1
+            if context.detected_intent is None and context.workflow_node_turns >= INTENT_DETECT_MAX_TURNS:
+                context.detected_intent = IntentType.GENERAL_INQUIRY
+            if context.detected_intent:
+                next_id = node.intent_next_id(context.detected_intent) or node.unconditional_next_id()
+                if next_id:
+                    return None, next_id
+                return StepResult(
+                    kind=StepKind.LLM,
+                    node_id=node.id,
+                    instructions="Help the caller with their request.",
+                ), None
+            return StepResult(
+                kind=StepKind.LLM,
+                node_id=node.id,
+                instructions="Find out what the caller needs help with today.",
+            ), None
+
+        if node.type == "collect-info":
+            fields = [f for f in config.get("fields", []) if _field_name(f)]
+            pending = next(
+                (p for p in (_pending_name(context, _field_name(f)) for f in fields) if p), None
+            )
+            if resuming and pending and user_message:
+                # The caller is answering a name read back last turn
+                _settle_name(context, pending, user_message)
+            elif resuming and user_message:
+                missing = [f for f in fields if _field_name(f) not in context.collected_fields]
+                if missing:
+                    # The caller is answering the field asked for last turn
+                    confirm = _collect(context, node.id, _field_name(missing[0]), user_message.strip())
+                    if confirm:
+                        return confirm, None
+            missing = [f for f in fields if _field_name(f) not in context.collected_fields]
+            if not missing:
+                return None, node.next_node_id()
+            label = missing[0].get("label") or _field_name(missing[0])
+            return StepResult(
+                kind=StepKind.LLM,
+                node_id=node.id,
+                instructions=f"Ask the caller for their {label}. Ask for nothing else this turn.",
+            ), None
+
+        # ai-agent
+        if resuming:
+            context.workflow_node_turns += 1
+        max_interactions = config.get("maxInteractions")
+        if max_interactions and context.workflow_node_turns >= int(max_interactions):
+            return StepResult(
+                kind=StepKind.ESCALATE, node_id=node.id, reason="Interaction limit reached"
+            ), None
+        rule = self._matching_escalation_rule(context, config.get("escalationRules", []))
+        if rule:
+            context.transfer_target = (rule.get("action") or {}).get("target")
+            return StepResult(
+                kind=StepKind.ESCALATE, node_id=node.id, reason="Escalation rule matched"
+            ), None
+        if resuming:
+            # Hand over to the step for what the caller just asked about, or
+            # move on once they're done
+            turn_intent = detect_intent(user_message) if user_message else None
+            if turn_intent:
+                context.detected_intent = turn_intent
+            next_id = node.intent_next_id(turn_intent) if turn_intent else None
+            if next_id is None and user_message and _is_done(user_message):
+                next_id = node.unconditional_next_id()
+            if next_id:
+                return None, next_id
+        return StepResult(
+            kind=StepKind.LLM,
+            node_id=node.id,
+            instructions=config.get("systemPrompt") or config.get("persona"),
+        ), None
+
+    async def _run_side_effect_node(
+        self,
+        context: CallContext,
+        node: CompiledNode,
+    ) -> Tuple[Optional[StepResult], Optional[str]]:
+        """Nodes that touch other systems; these are the only network hops"""
+        config = node.config
+
+        if node.type == "human-agent-queue":
+            specialization = config.get("specialization")
+            context.transfer_target = specialization
+            if context.call_id and context.hospital_id and specialization:
+                assignment = await api_client.queue_call_for_agent(
+                    context.hospital_id, context.call_id, specialization, config.get("priority")
+                )
+                if assignment:
+                    logger.info(
+                        f"Workflow queued {context.call_sid} for {specialization} "
+                        f"({assignment.get('status')})"
+                    )
+            else:
+                logger.warning(f"Cannot queue {context.call_sid} for an agent without a call session")
+            return StepResult(
+                kind=StepKind.ESCALATE, node_id=node.id, reason="Workflow queued for human agent"
+            ), None
+
+        if node.type == "human-agent-direct":
+            agent_id = config.get("agentId")
+            context.transfer_target = agent_id
+            if context.call_id and context.hospital_id and agent_id:
+                if await api_client.assign_call_to_agent(context.hospital_id, context.call_id, agent_id):
+                    logger.info(f"Workflow assigned {context.call_sid} to agent {agent_id}")
+            else:
+                logger.warning(f"Cannot assign {context.call_sid} to an agent without a call session")
+            return StepResult(
+                kind=StepKind.ESCALATE, node_id=node.id, reason="Workflow assigned to human agent"
+            ), None
+
+        target = self._webhook_target(config.get("url") or "")
+        if target:
+            url, breaker = target
+            # Built now so the request carries this turn's fields
+            payload = {
+                "callId": context.call_id,
+                "hospitalId": context.hospital_id,
+                "intent": context.detected_intent.value if context.detected_intent else None,
+                "fields": _field_values(context),
+            }
+            runtime.spawn("workflow_webhook", self._post_webhook(
+                node, url, breaker, config.get("method", "POST"), config.get("headers"), payload
+            ))
+        else:
+            logger.warning(f"Workflow {node.type} node {node.id} has no allowed URL, skipping")
+        return None, node.next_node_id()
+
+    def _webhook_target(self, url: str) -> Optional[Tuple[str, CircuitBreaker]]:
+        """Full URL and breaker for a node's URL, or None if it isn't allowed"""
+        if url.startswith("/"):
+            return f"{api_client.base_url}{url}", api_client.breaker
+        parts = urlsplit(url)
+        host = (parts.hostname or "").lower()
+        if parts.scheme != "https" or host not in self._webhook_hosts:
+            return None
+        breaker = self._webhook_breakers.get(host)
+        if breaker is None:
+            breaker = self._webhook_breakers[host] = CircuitBreaker(
+                f"webhook:{host}",
+                failure_threshold=settings.breaker_failure_threshold,
+                reset_timeout=settings.breaker_reset_seconds,
+            )
+        return url, breaker
+
+    @staticmethod
+    async def _post_webhook(
+        node: CompiledNode,
+        url: str,
+        breaker: CircuitBreaker,
+        method: str,
+        headers: Optional[Dict[str, str]],
+        payload: Dict[str, Any],
+    ):
+        """Send a side-effect node's request; 5xx responses count against the breaker"""
+        async def send():
+            response = await api_client.client.request(
+                method, url, headers=headers, json=payload,
+                timeout=settings.workflow_webhook_timeout_seconds,
+            )
+            if response.status_code >= 500:
+                response.raise_for_status()
+            return response
+
+        try:
+            response = await breaker.call(send)
+            logger.info(f"Workflow {node.type} {node.id} returned {response.status_code}")
+        except Exception as e:
+            logger.error(f"Workflow {node.type} {node.id} failed: {e}")
+
+    @staticmethod
+    def _matching_escalation_rule(
+        context: CallContext,
+        rules: List[Dict[str, Any]],
+    ) -> Optional[Dict[str, Any]]:
+        """Evaluate an ai-agent node's escalation rules locally"""
+        transcript = _transcript(context)
+        for rule in sorted(rules, key=lambda r: r.get("priority", 0), reverse=True):
+            condition = rule.get("condition") or {}
+            kind = condition.get("type")
+            value = condition.get("value")
+            if kind == "keyword" and str(value).lower() in transcript:
+                return rule
+            if kind == "intent" and context.detected_intent and \
+                    context.detected_intent.value == str(value):
+                return rule
+            if kind == "sentiment" and _compare(
+                context.sentiment.overall_score, condition.get("operator", "less_than"), value
+            ):
+                return rule
+            if kind == "interaction_count" and _compare(
+                context.workflow_node_turns, condition.get("operator", "greater_than"), value
+            ):
+                return rule
+        return None
+
+
+# Global workflow engine
+workflow_engine = WorkflowEngine()
@@ -1,5 +1,6 @@
 import { useEffect, useRef, useState } from 'react';
 import { io, Socket } from 'socket.io-client';
+import { useAuth } from '@clerk/nextjs';
 
 interface WebSocketOptions {
   agentId?: string;
@@ -15,14 +16,20 @@ interface WebSocketOptions {
 export function useWebSocket(options: WebSocketOptions = {}) {
   const socketRef = useRef<Socket>();
   const [isConnected, setIsConnected] = useState(false);
+  const { getToken } = useAuth();
 
   useEffect(() => {
     const apiUrl = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:4000';
 
     socketRef.current = io(apiUrl, {
-      auth: {
-        agentId: options.agentId,
-        userId: options.userId,
+      // The gateway only accepts signed-in users; fetch a fresh session
+      // token on every (re)connect
+      auth: (cb) => {
+        getToken().then((token) => cb({
+          token,
+          agentId: options.agentId,
+          userId: options.userId,
+        }));
       },
       reconnectionDelay: 1000,
       reconnectionAttempts: 5,